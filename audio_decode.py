@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+audio_decode.py - Decode call audio straight to 16kHz mono float32 samples
+Asks ffmpeg for raw f32le output on a pipe and reads it into a numpy buffer
+"""
+
+import re
+import subprocess
+import threading
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 4  # f32le
+
+# Lines of interest in ffmpeg's info-level stderr
+DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+AUDIO_STREAM_PATTERN = re.compile(r'Stream #\S+.*?: Audio: (\w+)')
+DECODE_ERROR_PATTERN = re.compile(r'error|invalid|corrupt|truncat|overread', re.IGNORECASE)
+
+class AudioDecodeError(Exception):
+    """Raised when ffmpeg cannot decode the audio"""
+
+def _drain_stderr(pipe, lines) -> None:
+    """Collect ffmpeg's stderr so a chatty decoder can never block on a full pipe"""
+    for raw_line in pipe:
+        lines.append(raw_line.decode('utf-8', 'replace').rstrip())
+
+def _parse_report(lines, report: Dict[str, Any]) -> None:
+    """Fill a decode report from ffmpeg's stderr: header duration, codec and decoder errors"""
+    report['header_duration'] = None
+    report['codec'] = None
+    report['decode_errors'] = 0
+    for line in lines:
+        duration = DURATION_PATTERN.search(line)
+        if duration and report['header_duration'] is None:
+            hours, minutes, seconds = duration.groups()
+            report['header_duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            continue
+        stream = AUDIO_STREAM_PATTERN.search(line)
+        if stream and report['codec'] is None:
+            report['codec'] = stream.group(1)
+            continue
+        if DECODE_ERROR_PATTERN.search(line):
+            report['decode_errors'] += 1
+
+def _feed_stdin(pipe, data) -> None:
+    """Write encoded audio to ffmpeg's stdin (runs beside the stdout reader to avoid pipe deadlock)"""
+    try:
+        pipe.write(data)
+    except (BrokenPipeError, OSError):
+        pass  # ffmpeg stopped reading - its exit code reports why
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+def decode_to_float32(source: Union[str, bytes, memoryview], sample_rate: int = SAMPLE_RATE,
+                      size_hint: int = 0, report: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, max_seconds: Optional[float] = None) -> np.ndarray:
+    """
+    Decode an audio file or in-memory encoded audio to mono float32 samples
+
+    ffmpeg does the resampling, down-mixing and int->float conversion in one
+    pass; its output is read directly into a preallocated array that only grows
+    (by doubling) if the initial estimate was too small.
+
+    Args:
+        source: Path to an audio file, or the encoded file contents
+        sample_rate: Output sample rate in Hz
+        size_hint: Encoded size in bytes, used to size the initial buffer
+        report: Optional dict filled with what the decode revealed about the
+            file (header_duration, codec, decode_errors, duration), so callers
+            can validate it without a separate ffprobe run
+        timeout: Optional seconds after which ffmpeg is killed (a damaged
+            file can stall it indefinitely)
+        max_seconds: Optional limit; only this much audio from the start is
+            decoded, and ffmpeg stops reading its input once it has it
+
+    Returns:
+        1-D float32 array of samples in [-1.0, 1.0]
+
+    Raises:
+        AudioDecodeError: If ffmpeg fails, times out or the file contains no decodable audio
+    """
+    from_memory = not isinstance(source, str)
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-nostats', '-v', 'info',
+        '-i', 'pipe:0' if from_memory else source,
+        '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', '1', '-ar', str(sample_rate),
+        'pipe:1'
+    ]
+    if max_seconds is not None:
+        cmd[-1:-1] = ['-t', f"{max_seconds:.3f}"]
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if from_memory else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+    stderr_lines = []
+    stderr_reader = threading.Thread(target=_drain_stderr, args=(process.stderr, stderr_lines), daemon=True)
+    stderr_reader.start()
+
+    feeder = None
+    if from_memory:
+        feeder = threading.Thread(target=_feed_stdin, args=(process.stdin, source), daemon=True)
+        feeder.start()
+        size_hint = size_hint or len(source)
+
+    timed_out = threading.Event()
+    watchdog = None
+    if timeout is not None:
+        def kill_stalled():
+            timed_out.set()
+            process.kill()
+        watchdog = threading.Timer(max(0.0, timeout), kill_stalled)
+        watchdog.daemon = True
+        watchdog.start()
+
+    # Scanner audio is mostly low-bitrate; 16x the encoded size (at least 60 s) covers typical calls
+    capacity = max(sample_rate * 60, size_hint * 16 // BYTES_PER_SAMPLE)
+    if max_seconds is not None:
+        capacity = min(capacity, int(sample_rate * max_seconds) + sample_rate)
+    samples = np.empty(capacity, dtype=np.float32)
+    filled = 0  # bytes written into samples
+    try:
+        while True:
+            view = memoryview(samples).cast('B')
+            if filled == len(view):
+                grown = np.empty(len(samples) * 2, dtype=np.float32)
+                grown[:len(samples)] = samples
+                samples = grown
+                continue
+            read = process.stdout.readinto(view[filled:])
+            if not read:
+                break
+            filled += read
+        process.wait()
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        if process.poll() is None:
+            process.kill()  # Reader failed part-way - don't leave ffmpeg behind
+            process.wait()
+        process.stdout.close()
+        stderr_reader.join()
+        process.stderr.close()
+        if feeder:
+            feeder.join()
+
+    if timed_out.is_set():
+        raise AudioDecodeError(f"ffmpeg did not finish within {timeout:.1f}s")
+    if process.returncode != 0:
+        raise AudioDecodeError(stderr_lines[-1] if stderr_lines else f"ffmpeg exited with code {process.returncode}")
+
+    samples = samples[:filled // BYTES_PER_SAMPLE]
+    if report is not None:
+        _parse_report(stderr_lines, report)
+        report['duration'] = len(samples) / sample_rate
+    if not len(samples):
+        raise AudioDecodeError("No decodable audio stream")
+    return samples
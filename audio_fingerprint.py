@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+audio_fingerprint.py - Compact spectral fingerprints for simulcast duplicate detection
+The same transmission received by several sites differs in codec, level and start
+time; its band-energy contour does not, so matching fingerprints identify copies
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 2048  # 128 ms analysis frames
+HOP_SIZE = 256     # 16 ms between fingerprint frames (heavy overlap tolerates misaligned starts)
+NUM_BANDS = 33     # 33 bands -> 32 sub-fingerprint bits per frame
+BAND_LOW_HZ = 300
+BAND_HIGH_HZ = 3400  # Voice band of narrowband radio audio
+
+_WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+_BIT_WEIGHTS = (1 << np.arange(NUM_BANDS - 1, dtype=np.uint64))
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+_FREQS = np.fft.rfftfreq(FRAME_SIZE, 1.0 / SAMPLE_RATE)
+_BAND_STARTS = np.searchsorted(_FREQS, np.geomspace(BAND_LOW_HZ, BAND_HIGH_HZ, NUM_BANDS + 1))
+
+class Fingerprint:
+    """32-bit sub-fingerprints per frame plus a mask of frames that carry signal"""
+
+    def __init__(self, bits: np.ndarray, voiced: np.ndarray, duration: float):
+        self.bits = bits
+        self.voiced = voiced
+        self.duration = duration
+
+def compute_fingerprint(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Fingerprint:
+    """
+    Compute a Haitsma-Kalker style fingerprint of 16kHz mono audio
+
+    Each bit is the sign of the change, between consecutive frames, of the
+    energy difference of two adjacent bands; log energies make it independent
+    of the receiving site's level.
+    """
+    duration = len(audio) / sample_rate
+    if len(audio) < FRAME_SIZE + HOP_SIZE:
+        return Fingerprint(np.empty(0, dtype=np.uint32), np.empty(0, dtype=bool), duration)
+
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME_SIZE)[::HOP_SIZE]
+    power = np.abs(np.fft.rfft(frames * _WINDOW, axis=1)) ** 2
+    band_power = np.add.reduceat(power[:, _BAND_STARTS[0]:_BAND_STARTS[-1]], _BAND_STARTS[:-1] - _BAND_STARTS[0], axis=1)
+    log_energy = np.log10(band_power + 1e-10)
+
+    band_diff = log_energy[:, :-1] - log_energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    packed = (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1).astype(np.uint32)
+
+    # Frames near the noise floor give random bits on every site - leave them out of comparisons
+    frame_energy = band_power.sum(axis=1)[1:]
+    voiced = frame_energy > np.percentile(frame_energy, 90) * 1e-3
+    return Fingerprint(packed, voiced, duration)
+
+def bit_error_rate(a: Fingerprint, b: Fingerprint, max_offset_frames: int, min_frames: int = 30) -> float:
+    """
+    Lowest bit error rate between two fingerprints over the allowed time offsets
+
+    Returns:
+        Fraction of differing bits (about 0.5 for unrelated audio), or 1.0 if
+        the fingerprints never overlap on enough voiced frames
+    """
+    best = 1.0
+    for offset in range(-max_offset_frames, max_offset_frames + 1):
+        if offset >= 0:
+            bits_a, voiced_a = a.bits[offset:], a.voiced[offset:]
+            bits_b, voiced_b = b.bits, b.voiced
+        else:
+            bits_a, voiced_a = a.bits, a.voiced
+            bits_b, voiced_b = b.bits[-offset:], b.voiced[-offset:]
+        overlap = min(len(bits_a), len(bits_b))
+        mask = voiced_a[:overlap] & voiced_b[:overlap]
+        compared = int(mask.sum())
+        if compared < min_frames:
+            continue
+        differing = _POPCOUNT[(bits_a[:overlap][mask] ^ bits_b[:overlap][mask]).view(np.uint8)].sum()
+        best = min(best, differing / (compared * (NUM_BANDS - 1)))
+    return best
+
+class SimulcastEntry:
+    """A recent call in the index; copies wait on it for the original's transcription"""
+
+    def __init__(self, request_id: str, fingerprint: Fingerprint):
+        self.request_id = request_id
+        self.fingerprint = fingerprint
+        self.created = time.monotonic()
+        self.transcription = None
+        self.error = None  # Why the original produced no transcription, if it failed
+        self.done = threading.Event()
+
+    def resolve(self, transcription: Optional[str], error: Optional[str] = None) -> None:
+        """Publish the original's transcription (None if it failed, with the error if known)"""
+        self.transcription = transcription
+        self.error = error
+        self.done.set()
+
+class SimulcastIndex:
+    """Short, per-talkgroup window of recent call fingerprints"""
+
+    def __init__(self, window_seconds: float = 15.0, max_bit_error_rate: float = 0.3,
+                 max_offset_seconds: float = 2.0):
+        self.window_seconds = window_seconds
+        self.max_bit_error_rate = max_bit_error_rate
+        self.max_offset_frames = int(max_offset_seconds * SAMPLE_RATE / HOP_SIZE)
+        self._entries: Dict[str, List[SimulcastEntry]] = {}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def _is_copy(self, a: Fingerprint, b: Fingerprint) -> bool:
+        """Copies have near-equal length and a low bit error rate at some small offset"""
+        if abs(a.duration - b.duration) > max(1.0, 0.2 * max(a.duration, b.duration)):
+            return False
+        return bit_error_rate(a, b, self.max_offset_frames) <= self.max_bit_error_rate
+
+    def match_or_register(self, talkgroup: str, request_id: str,
+                          fingerprint: Fingerprint) -> Tuple[SimulcastEntry, bool]:
+        """
+        Find a recent copy of this call on the same talkgroup, or register it as an original
+
+        Returns:
+            Tuple of (entry, is_original); for a copy the entry is the earlier call's
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            recent = [entry for entry in self._entries.get(talkgroup, []) if now - entry.created <= self.window_seconds]
+            for entry in reversed(recent):
+                if self._is_copy(fingerprint, entry.fingerprint):
+                    self._entries[talkgroup] = recent
+                    self.duplicates += 1
+                    return entry, False
+
+            entry = SimulcastEntry(request_id, fingerprint)
+            recent.append(entry)
+            self._entries[talkgroup] = recent
+            # Drop talkgroups that have gone quiet
+            for other in [tg for tg, entries in self._entries.items() if tg != talkgroup and
+                          all(now - e.created > self.window_seconds for e in entries)]:
+                del self._entries[other]
+            return entry, True
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for the heartbeat"""
+        with self._lock:
+            return {'checked': self.checked, 'duplicates': self.duplicates}
@@ -33,6 +33,20 @@ const {
   PYTHON_COMMAND,
   // --- NEW: Auto-update Control ---
   AUTO_UPDATE_PYTHON_PACKAGES = 'true',
+  // --- Local transcription wire protocol ---
+  TRANSCRIPTION_BINARY_AUDIO = 'true',
+  TRANSCRIPTION_SHARED_MEMORY = 'false',
+  TRANSCRIPTION_SHM_DIR = '/dev/shm',
+  TRANSCRIPTION_SERVER_SOCKET,
+  TRANSCRIPTION_SERVER_HOST = '127.0.0.1',
+  TRANSCRIPTION_SERVER_PORT,
+  TRANSCRIPTION_DETAILS = 'false',
+  TRANSCRIPTION_STREAMING = 'false',
+  TRANSCRIPTION_DEADLINE_MS = '60000',
+  TRANSCRIPTION_PRIORITY_GROUPS = 'fire,ems,medical,rescue',
+  TONE_DETECTION_DAEMON = 'true',
+  TRANSCRIPTION_JUNK_MIN_LOGPROB = '-1.0',
+  TRANSCRIPTION_JUNK_MAX_NO_SPEECH = '0.6',
   // --- NEW: ICAD Transcription Env Vars ---
   ICAD_URL,
   ICAD_PROFILE,
@@ -200,7 +214,21 @@ const MAX_CONCURRENT_TRANSCRIPTIONS_VALUE = !isNaN(parsedMaxConcurrent) && parse
 // High-volume system optimizations
 const MAX_QUEUE_SIZE = 50; // Limit queue size to prevent memory issues
 const QUEUE_DRAIN_THRESHOLD = 40; // Start warning when queue gets large
-const PRIORITY_QUEUE_THRESHOLD = 30; // Start prioritizing newer items
+const PRIORITY_QUEUE_THRESHOLD = 30; // Queue length kept when overflowing items are dropped
+const TRANSCRIPTION_PRIORITY_RANK = { emergency: 0, high: 1, normal: 2, low: 3 }; // Same classes as the worker's scheduler
+const transcriptionPriorityGroups = TRANSCRIPTION_PRIORITY_GROUPS.split(',').map(group => group.trim().toLowerCase()).filter(Boolean);
+
+// Priority class of a call: emergency-flagged calls first, then talk group groups such as fire/EMS
+function transcriptionPriority(emergency, talkGroupGroup) {
+  if (emergency === true || emergency === 1 || ['true', '1'].includes(String(emergency).toLowerCase())) {
+    return 'emergency';
+  }
+  const group = (talkGroupGroup || '').toLowerCase();
+  if (transcriptionPriorityGroups.some(priorityGroup => group.includes(priorityGroup))) {
+    return 'high';
+  }
+  return 'normal';
+}
 
 // NOTE: For very busy systems with lots of concurrent calls, consider:
 // 1. Increasing MAX_CONCURRENT_TRANSCRIPTIONS in .env (default is 3, try 5-8 for busy systems)
@@ -211,6 +239,10 @@ const PRIORITY_QUEUE_THRESHOLD = 30; // Start prioritizing newer items
 // Two-Tone Detection System
 let twoToneQueue = []; // Queue to track calls after two-tone detection
 let pendingToneDetections = new Map(); // Track ongoing tone detections
+let toneDaemon = null; // Persistent tone_detect.py --serve process for non-local modes
+const toneDaemonRequests = new Map(); // Daemon request ID -> { daemon, transcriptionId, callback }, oldest first
+let toneDaemonTimer = null; // Timeout of the request the daemon is working on
+const TONE_DAEMON_TIMEOUT_MS = 30000; // Same per-request limit the one-shot process had
 let lastTwoToneTime = 0; // Timestamp of last detected two-tone
 let lastDetectedToneGroup = null; // Talk group where last tone was detected
 
@@ -475,23 +507,9 @@ function processNextToneDetection() {
   });
 }
 
-function detectTwoToneStandalone(audioFilePath, transcriptionId, talkGroupID, callback) {
-  const { spawn } = require('child_process');
-  
-  logger.info(`Starting standalone tone detection for ID ${transcriptionId}`);
-  
-  // Create the Python command to run tone detection
-  const pythonCommand = PYTHON_COMMAND || 'python';
-  
-  logger.info(`Using Python command: ${pythonCommand}`);
-  logger.info(`Running: ${pythonCommand} tone_detect.py "${audioFilePath}"`);
-  const toneArgs = [
-    'tone_detect.py',
-    audioFilePath
-  ];
-  
-  // Set environment variables for the Python process
-  const env = {
+// Environment handing the bot's tone settings to tone_detect.py
+function toneDetectionEnv() {
+  return {
     ...process.env,
     TONE_DETECTION_TYPE: TWO_TONE_CONFIG.detectionType,
     TWO_TONE_MIN_TONE_LENGTH: TWO_TONE_CONFIG.minToneLength.toString(),
@@ -508,6 +526,200 @@ function detectTwoToneStandalone(audioFilePath, transcriptionId, talkGroupID, ca
     TONE_FREQUENCY_BAND: TWO_TONE_CONFIG.frequencyBand,
     TONE_TIME_RESOLUTION_MS: TWO_TONE_CONFIG.timeResolutionMs.toString()
   };
+}
+
+// Tone result carried by an 'analyze' transcription response as [hasTwoTone, detectedTones, detectedType],
+// or null when the response has none (other modes, or the worker's tone detection failed)
+function analyzedToneResult(response) {
+  if (!response || response.has_two_tone === undefined || response.tone_error) {
+    return null;
+  }
+  return [response.has_two_tone, response.detected_tones || [], response.detected_type || 'unknown'];
+}
+
+// Turn tone_detect.py output (one-shot JSON or a daemon response) into [hasTwoTone, detectedTones, detectedType]
+function parseStandaloneToneResult(result) {
+  const hasTwoTone = result.has_two_tone || false;
+  
+  // Extract tones from the CLI output JSON
+  let detectedTones = [];
+  const detectedType = result.detected_type || 'unknown';
+  if (result.detection_result && result.detection_result.cli_output) {
+    try {
+      const cliResult = JSON.parse(result.detection_result.cli_output);
+      // Combine all detected tone types into one array
+      detectedTones = [
+        ...(cliResult.long_tone || []),
+        ...(cliResult.two_tone || []),
+        ...(cliResult.pulsed || [])
+      ];
+    } catch (cliParseError) {
+      logger.warn(`Error parsing CLI output: ${cliParseError.message}`);
+    }
+  } else if (Array.isArray(result.detected_tones)) {
+    detectedTones = result.detected_tones; // Python API detector
+  }
+  return [hasTwoTone, detectedTones, detectedType];
+}
+
+// Tone detection for non-local modes: requests go to one warm `tone_detect.py --serve` process,
+// so each call skips interpreter start-up, library imports and detector set-up
+function detectTwoToneStandalone(audioFilePath, transcriptionId, talkGroupID, callback) {
+  const daemon = TONE_DETECTION_DAEMON.toLowerCase() === 'true' ? getToneDaemon() : null;
+  if (!daemon) {
+    return detectTwoToneOneShot(audioFilePath, transcriptionId, talkGroupID, callback);
+  }
+
+  const requestId = uuidv4();
+  toneDaemonRequests.set(requestId, { daemon, transcriptionId, callback });
+  if (toneDaemonRequests.size === 1) {
+    armToneDaemonTimer(); // Nothing ahead of it - the daemon starts on it right away
+  }
+
+  logger.info(`Sending tone detection for ID ${transcriptionId} to daemon (request: ${requestId})`);
+  try {
+    daemon.stdin.write(JSON.stringify({ command: 'detect_tones', id: requestId, path: audioFilePath }) + '\n');
+  } catch (error) {
+    logger.error(`Error writing to tone detection daemon: ${error.message}`);
+    finishToneDaemonRequest(requestId, null);
+  }
+}
+
+// The daemon answers one request at a time, in order, so only the oldest outstanding request is
+// timed, from when the daemon starts on it; calls queued behind a slow one are not failed for waiting
+function armToneDaemonTimer() {
+  clearTimeout(toneDaemonTimer);
+  toneDaemonTimer = null;
+  const oldest = toneDaemonRequests.values().next().value;
+  if (!oldest) {
+    return;
+  }
+  toneDaemonTimer = setTimeout(() => {
+    logger.error(`Tone detection daemon timed out on ID ${oldest.transcriptionId}, restarting it`);
+    oldest.daemon.kill('SIGKILL'); // Its 'close' handler fails every request it still held
+  }, TONE_DAEMON_TIMEOUT_MS);
+}
+
+// Start the tone detection daemon if it is not running; null if it cannot be spawned
+function getToneDaemon() {
+  if (toneDaemon) {
+    return toneDaemon;
+  }
+  const { spawn } = require('child_process');
+  const pythonCommand = PYTHON_COMMAND || 'python';
+  logger.info(`Starting tone detection daemon: ${pythonCommand} tone_detect.py --serve`);
+
+  let daemon;
+  try {
+    daemon = spawn(pythonCommand, ['tone_detect.py', '--serve'], {
+      stdio: ['pipe', 'pipe', 'pipe'],
+      env: toneDetectionEnv()
+    });
+  } catch (error) {
+    logger.error(`Error starting tone detection daemon: ${error.message}`);
+    return null;
+  }
+  toneDaemon = daemon;
+
+  const rl = readline.createInterface({ input: daemon.stdout, crlfDelay: Infinity });
+  rl.on('line', handleToneDaemonLine);
+  daemon.stderr.on('data', (data) => {
+    logger.debug(`Tone detection daemon: ${data.toString().trim()}`);
+  });
+  daemon.stdin.on('error', (error) => {
+    logger.error(`Tone detection daemon stdin error: ${error.message}`);
+  });
+  // 'error' covers a failed spawn, 'close' an exit; either way its requests can no longer be answered
+  const retire = (reason) => {
+    if (toneDaemon === daemon) {
+      toneDaemon = null;
+    }
+    for (const [requestId, request] of toneDaemonRequests) {
+      if (request.daemon === daemon) {
+        logger.warn(`Tone detection for ID ${request.transcriptionId} lost: ${reason}`);
+        finishToneDaemonRequest(requestId, null);
+      }
+    }
+  };
+  daemon.on('error', (error) => {
+    logger.error(`Tone detection daemon error: ${error.message}`);
+    retire(error.message);
+  });
+  daemon.on('close', (code, signal) => {
+    logger.warn(`Tone detection daemon exited with code ${code}, signal: ${signal}`);
+    retire('daemon exited');
+  });
+  return daemon;
+}
+
+function handleToneDaemonLine(line) {
+  if (!line || !line.trim()) {
+    return;
+  }
+  let response;
+  try {
+    response = JSON.parse(line);
+  } catch (parseError) {
+    logger.warn(`Unrecognized tone detection daemon output: ${line}`);
+    return;
+  }
+  if (response.ready) {
+    logger.info('Tone detection daemon ready');
+    return;
+  }
+  if (!toneDaemonRequests.has(response.id)) {
+    logger.warn(`Tone detection daemon answered unknown request: ${response.id}`);
+    return;
+  }
+  finishToneDaemonRequest(response.id, response);
+}
+
+// Settle a daemon request; a null response reports failure to the caller
+function finishToneDaemonRequest(requestId, response) {
+  const request = toneDaemonRequests.get(requestId);
+  if (!request) {
+    return;
+  }
+  const wasOldest = toneDaemonRequests.keys().next().value === requestId;
+  toneDaemonRequests.delete(requestId);
+  if (wasOldest) {
+    armToneDaemonTimer(); // The daemon moves on to the next request
+  }
+
+  let result = [false, null, 'unknown'];
+  if (response) {
+    if (response.error) {
+      logger.warn(`Tone detection error for ID ${request.transcriptionId}: ${response.error}`);
+    }
+    result = parseStandaloneToneResult(response);
+    logger.info(`Standalone tone detection result for ID ${request.transcriptionId}: ${result[0]} (${result[1].length} tones)`);
+  }
+  if (request.callback) {
+    try {
+      request.callback(...result);
+    } catch (callbackError) {
+      logger.error(`Error executing tone detection callback for ID ${request.transcriptionId}: ${callbackError.message}`);
+    }
+  }
+}
+
+// One-shot fallback: a fresh `python tone_detect.py <file>` per call (TONE_DETECTION_DAEMON=false)
+function detectTwoToneOneShot(audioFilePath, transcriptionId, talkGroupID, callback) {
+  const { spawn } = require('child_process');
+  
+  logger.info(`Starting standalone tone detection for ID ${transcriptionId}`);
+  
+  // Create the Python command to run tone detection
+  const pythonCommand = PYTHON_COMMAND || 'python';
+  
+  logger.info(`Using Python command: ${pythonCommand}`);
+  logger.info(`Running: ${pythonCommand} tone_detect.py "${audioFilePath}"`);
+  const toneArgs = [
+    'tone_detect.py',
+    audioFilePath
+  ];
+  
+  const env = toneDetectionEnv();
   
   try {
     const toneProcess = spawn(pythonCommand, toneArgs, {
@@ -531,24 +743,7 @@ function detectTwoToneStandalone(audioFilePath, transcriptionId, talkGroupID, ca
       if (code === 0) {
         try {
           const result = JSON.parse(output);
-          const hasTwoTone = result.has_two_tone || false;
-          
-          // Extract tones from the CLI output JSON
-          let detectedTones = [];
-          let detectedType = result.detected_type || 'unknown';
-          if (result.detection_result && result.detection_result.cli_output) {
-            try {
-              const cliResult = JSON.parse(result.detection_result.cli_output);
-              // Combine all detected tone types into one array
-              detectedTones = [
-                ...(cliResult.long_tone || []),
-                ...(cliResult.two_tone || []),
-                ...(cliResult.pulsed || [])
-              ];
-            } catch (cliParseError) {
-              logger.warn(`Error parsing CLI output: ${cliParseError.message}`);
-            }
-          }
+          const [hasTwoTone, detectedTones, detectedType] = parseStandaloneToneResult(result);
           
           logger.info(`Standalone tone detection result for ID ${transcriptionId}: ${hasTwoTone} (${detectedTones.length} tones)`);
           
@@ -1222,10 +1417,10 @@ let isBootComplete = false;
 const messageCache = new Map(); // Stores the latest message for each channel
 const MESSAGE_COOLDOWN = 15000; // 15 seconds in milliseconds
 let transcriptionProcess = null;
-let isProcessingTranscription = false;
-let currentTranscriptionId = null; // Track current transcription for timeout
-let transcriptionTimeout = null; // Timeout for current transcription
-const TRANSCRIPTION_TIMEOUT_MS = 90000; // 1.5 minutes timeout per transcription (reduced for busy systems)
+let transcriptionWindow = 1; // Requests the worker lets us keep in flight; raised once it advertises credits
+const TRANSCRIPTION_TIMEOUT_MS = 90000; // 1.5 minutes timeout per transcription, from when the worker starts it
+const pendingRevisions = new Map(); // Local request ID -> DB transcription ID for drafts the large model is re-decoding
+const REVISION_WAIT_MS = 10 * 60 * 1000; // Forget a pending revision after 10 minutes
 let processHealthCheck = null; // Health check interval
 let lastProcessActivity = Date.now(); // Track when we last heard from Python process
 let queueWarningLogged = false; // Prevent spam logging of queue warnings
@@ -1876,18 +2071,18 @@ async function startTranscriptionProcess() {
   logger.info('⏳ Checking Python environment and packages...'); // Updated log message
 
   // Reset state variables
-  isProcessingTranscription = false;
-  currentTranscriptionId = null;
-  if (transcriptionTimeout) {
-    clearTimeout(transcriptionTimeout);
-    transcriptionTimeout = null;
-  }
+  resetProcessingState();
 
   // Spawn the Python process with better error handling and version detection
   let pythonCommand = PYTHON_COMMAND || 'python';
   
-  // If user specified a custom Python command, use it directly
-  if (PYTHON_COMMAND) {
+  const useTranscriptionServer = Boolean(TRANSCRIPTION_SERVER_SOCKET || TRANSCRIPTION_SERVER_PORT);
+
+  // A shared transcribe.py server already has its model loaded - no local Python needed
+  if (useTranscriptionServer) {
+    logger.info('Using shared transcription server instead of spawning a Python process');
+  } else if (PYTHON_COMMAND) {
+    // If user specified a custom Python command, use it directly
     logger.info(`Using user-specified Python command: ${PYTHON_COMMAND}`);
   } else {
     // Try different Python commands to find the right version
@@ -2193,13 +2388,18 @@ async function startTranscriptionProcess() {
   }
   
   try {
-    transcriptionProcess = spawn(pythonCommand, ['transcribe.py'], {
-      stdio: ['pipe', 'pipe', 'pipe'],
-      detached: false,
-      cwd: __dirname // Ensure we're in the right directory
-    });
-    
-    logger.info(`Spawned Python process with PID: ${transcriptionProcess.pid} using command: ${pythonCommand}`);
+    if (useTranscriptionServer) {
+      transcriptionProcess = connectTranscriptionServer();
+      logger.info(`Connecting to transcription server at ${transcriptionProcess.pid}`);
+    } else {
+      transcriptionProcess = spawn(pythonCommand, ['transcribe.py'], {
+        stdio: ['pipe', 'pipe', 'pipe'],
+        detached: false,
+        cwd: __dirname // Ensure we're in the right directory
+      });
+      
+      logger.info(`Spawned Python process with PID: ${transcriptionProcess.pid} using command: ${pythonCommand}`);
+    }
   } catch (err) {
     logger.error(`Failed to spawn transcription process: ${err.message}`);
     transcriptionProcess = null;
@@ -2238,37 +2438,72 @@ async function startTranscriptionProcess() {
 
       if (response.ready) {
         logger.info('Local transcription service ready');
+        if (response.credits !== undefined) {
+          updateTranscriptionWindow(response);
+        }
         // Start health check monitoring after ready signal
         startProcessHealthCheck();
         processNextTranscription(); // Process queue on ready
       } else if (response.heartbeat) {
         // Heartbeat received - process is alive during radio silence
         logger.debug(`Transcription process heartbeat received (${new Date(response.timestamp * 1000).toLocaleTimeString()})`);
-        // Activity is already updated above, no need to do anything else
-      } else if (response.id && response.has_two_tone !== undefined) {
-        // Handle tone detection result
+        // Activity is already updated above; the heartbeat also refreshes the worker's credits
+        if (response.credits !== undefined) {
+          updateTranscriptionWindow(response);
+          processNextTranscription();
+        }
+      } else if (response.id && response.has_two_tone !== undefined && response.transcription === undefined) {
+        // Handle tone detection result (an 'analyze' response carries one beside its transcription)
         logger.info(`Received tone detection result for ID: ${response.id}`);
         handleLocalToneDetectionResult(response);
+      } else if (response.id && response.started) {
+        // The worker took the call off its queues - time it from now
+        const startedItem = transcriptionQueue.find(item => item.id === response.id && item.sentAt);
+        if (startedItem) {
+          armTranscriptionTimeout(startedItem);
+        }
+      } else if (response.id && response.partial) {
+        // Streaming mode: a segment decoded ahead of the final transcription
+        const pendingItem = transcriptionQueue.find(item => item.id === response.id);
+        if (pendingItem && pendingItem.onPartial) {
+          try {
+            pendingItem.onPartial(response.segment);
+          } catch (partialError) {
+            logger.error(`Error handling partial segment for ID ${response.id}: ${partialError.message}`);
+          }
+        }
+      } else if (response.id && response.revision !== undefined) {
+        // Model cascade: the large model re-decoded an uncertain draft - replace the stored text
+        const dbTranscriptionId = pendingRevisions.get(response.id);
+        pendingRevisions.delete(response.id);
+        if (dbTranscriptionId !== undefined) {
+          logger.info(`Received revision ${response.revision} for local transcription ID: ${response.id} (DB ID ${dbTranscriptionId})`);
+          updateTranscription(dbTranscriptionId, response.transcription);
+        } else {
+          logger.warn(`Received revision for unknown local transcription ID: ${response.id}`);
+        }
       } else if (response.id && response.transcription !== undefined) {
         logger.info(`Received local transcription for ID: ${response.id}`);
 
-        // Clear timeout if this is the current transcription
-        if (currentTranscriptionId === response.id) {
-          clearTranscriptionTimeout();
-        }
-
         // Find the item and its callback in the queue
         const pendingItemIndex = transcriptionQueue.findIndex(item => item.id === response.id);
 
         if (pendingItemIndex !== -1) {
             const pendingItem = transcriptionQueue[pendingItemIndex];
+            clearTranscriptionTimeout(pendingItem);
             logger.info(`Found callback for local transcription ID: ${response.id}, executing`);
 
+            // A revision from the large model may follow this draft
+            if (response.refining) {
+              pendingRevisions.set(response.id, pendingItem.dbTranscriptionId);
+              setTimeout(() => pendingRevisions.delete(response.id), REVISION_WAIT_MS);
+            }
+
             // Execute the callback defined in handleNewAudio
             // Pass both transcription text and segments (if available) for source matching
             if (pendingItem.callback) {
                 try {
-                  pendingItem.callback(response.transcription, response.segments);
+                  pendingItem.callback(response.transcription, response.segments, response);
                 } catch (callbackError) {
                   logger.error(`Error executing callback for ID ${response.id}: ${callbackError.message}`);
                 }
@@ -2279,26 +2514,20 @@ async function startTranscriptionProcess() {
             // Remove this item from the queue
             transcriptionQueue.splice(pendingItemIndex, 1);
 
-            // Reset processing state and process next item
-            resetProcessingState();
+            // Send the next waiting item into the freed slot
             processNextTranscription();
         } else {
           logger.error(`No pending item found for local transcription ID: ${response.id}`);
           // Still allow queue to continue if an unexpected ID comes back
-          resetProcessingState();
           processNextTranscription();
         }
       } else if (response.error) {
          logger.error(`Local transcription error for ID ${response.id}: ${response.error}`);
 
-         // Clear timeout if this is the current transcription
-         if (currentTranscriptionId === response.id) {
-           clearTranscriptionTimeout();
-         }
-
          const pendingItemIndex = transcriptionQueue.findIndex(item => item.id === response.id);
          if (pendingItemIndex !== -1) {
              const pendingItem = transcriptionQueue[pendingItemIndex];
+             clearTranscriptionTimeout(pendingItem);
              // Execute callback with empty string on error
              if (pendingItem.callback) {
                  try {
@@ -2314,20 +2543,20 @@ async function startTranscriptionProcess() {
               logger.error(`Received error for unknown local transcription ID: ${response.id}`);
          }
 
-         // Reset processing state and allow queue to continue
-         resetProcessingState();
+         // Allow queue to continue
          processNextTranscription();
 
+      } else if (response.credits !== undefined) {
+        // Backpressure: the worker finished a request and says how much more it can take
+        updateTranscriptionWindow(response);
+        processNextTranscription();
       } else {
         logger.warn(`Unrecognized response from local transcription process: ${line}`);
-        // Reset processing state just in case to prevent stall
-        resetProcessingState();
         processNextTranscription();
       }
     } catch (err) {
       logger.error(`Error parsing local transcription process output: ${err.message}, line: ${line}`);
-      // Reset processing state and allow queue to continue on parsing error
-      resetProcessingState();
+      // Allow queue to continue on parsing error
       processNextTranscription();
     }
   });
@@ -2437,6 +2666,33 @@ async function startTranscriptionProcess() {
   }
 }
 
+// Connect to a shared transcribe.py server (TRANSCRIPTION_SERVER_SOCKET or TRANSCRIPTION_SERVER_PORT)
+// and expose it with the same stdin/stdout/kill/close surface as a spawned process
+function connectTranscriptionServer() {
+  const net = require('net');
+  const { EventEmitter } = require('events');
+  const { PassThrough } = require('stream');
+
+  const connectOptions = TRANSCRIPTION_SERVER_SOCKET
+    ? { path: TRANSCRIPTION_SERVER_SOCKET }
+    : { host: TRANSCRIPTION_SERVER_HOST, port: parseInt(TRANSCRIPTION_SERVER_PORT, 10) };
+  const socket = net.createConnection(connectOptions);
+
+  const connection = new EventEmitter();
+  connection.stdin = socket;
+  connection.stdout = socket;
+  connection.stderr = new PassThrough(); // Server logs stay with the server process
+  connection.pid = TRANSCRIPTION_SERVER_SOCKET || `${TRANSCRIPTION_SERVER_HOST}:${TRANSCRIPTION_SERVER_PORT}`;
+  connection.kill = () => socket.destroy(); // Drops only this connection, the server keeps its model
+
+  // 'close' always follows 'error' on a socket, so report errors and let 'close' drive reconnects
+  socket.on('error', (err) => {
+    logger.error(`Transcription server connection error: ${err.message}`);
+  });
+  socket.on('close', () => connection.emit('close', 0, null));
+  return connection;
+}
+
 // Helper function to cleanup transcription process and state
 function cleanupTranscriptionProcess() {
   // Stop health check
@@ -2445,8 +2701,8 @@ function cleanupTranscriptionProcess() {
     processHealthCheck = null;
   }
 
-  // Clear current transcription timeout
-  clearTranscriptionTimeout();
+  // Clear the restart timers of requests in flight
+  transcriptionQueue.forEach(clearTranscriptionTimeout);
 
   // Handle any pending items (call callbacks with empty string)
   if (transcriptionQueue.length > 0) {
@@ -2479,19 +2735,44 @@ function cleanupTranscriptionProcess() {
 
 // Helper function to reset processing state
 function resetProcessingState() {
-  isProcessingTranscription = false;
-  currentTranscriptionId = null;
-  clearTranscriptionTimeout();
+  transcriptionQueue.forEach(clearTranscriptionTimeout);
+  transcriptionWindow = 1; // Until the (new) worker advertises its credits
 }
 
-// Helper function to clear transcription timeout
-function clearTranscriptionTimeout() {
-  if (transcriptionTimeout) {
-    clearTimeout(transcriptionTimeout);
-    transcriptionTimeout = null;
+// Helper function to start the restart timeout of a request the worker has started on;
+// queued calls are not timed, so a backlog in the window never looks like a hung worker
+function armTranscriptionTimeout(item) {
+  clearTranscriptionTimeout(item);
+  item.timeout = setTimeout(() => {
+    logger.error(`Transcription timeout for ID ${item.id}. Restarting process...`);
+    // Force restart the process on timeout
+    cleanupTranscriptionProcess();
+    if (effectiveTranscriptionMode === 'local') {
+      setTimeout(startTranscriptionProcess, 5000);
+    }
+  }, TRANSCRIPTION_TIMEOUT_MS);
+}
+
+// Helper function to clear the restart timeout of a request that has been answered
+function clearTranscriptionTimeout(item) {
+  if (item && item.timeout) {
+    clearTimeout(item.timeout);
+    item.timeout = null;
   }
 }
 
+// Items sent to the worker and still awaiting their final response (always the front of transcriptionQueue)
+function transcriptionsInFlight() {
+  return transcriptionQueue.filter(item => item.sentAt).length;
+}
+
+// Apply a credit advertisement: keep at most the worker's in-flight count plus its free credits outstanding
+function updateTranscriptionWindow(response) {
+  const window = (response.in_flight || 0) + response.credits;
+  // Always allow one request so a worker short on memory still drains the queue
+  transcriptionWindow = Math.max(1, window);
+}
+
 // Helper function to start process health check
 function startProcessHealthCheck() {
   if (processHealthCheck) {
@@ -2532,12 +2813,12 @@ function startProcessHealthCheck() {
     if (queueSize > 0 && Math.abs(queueSize - lastQueueSizeLog) >= 5) {
       const oldestItem = transcriptionQueue[0];
       const queueAge = oldestItem ? Math.round((Date.now() - oldestItem.queuedAt) / 1000) : 0;
-      logger.info(`Transcription queue: ${queueSize} items pending, processing: ${isProcessingTranscription}, oldest item: ${queueAge}s`);
+      logger.info(`Transcription queue: ${queueSize} items pending, in flight: ${transcriptionsInFlight()}/${transcriptionWindow}, oldest item: ${queueAge}s`);
       lastQueueSizeLog = queueSize;
     }
     
     // Force restart if queue is definitely stuck (more conservative)
-    if (queueSize > 15 && !isProcessingTranscription && timeSinceActivity > 300000) { // 5 minutes + 15+ items = real stuck
+    if (queueSize > 15 && transcriptionsInFlight() === 0 && timeSinceActivity > 300000) { // 5 minutes + 15+ items = real stuck
       logger.error(`Queue definitely stuck with ${queueSize} items and no processing for 5 minutes. Force restarting transcription process...`);
       cleanupTranscriptionProcess();
       if (effectiveTranscriptionMode === 'local') {
@@ -2547,7 +2828,16 @@ function startProcessHealthCheck() {
   }, 60000); // Check every 60 seconds (less frequent)
 }
 
-// Function to process the next transcription in the queue
+// Helper function to remove a shared-memory audio segment once the worker is done with it
+function releaseSharedAudio(segmentPath) {
+  fs.unlink(segmentPath, (err) => {
+    if (err && err.code !== 'ENOENT') {
+      logger.warn(`Error removing shared memory segment ${segmentPath}: ${err.message}`);
+    }
+  });
+}
+
+// Function to process the next transcriptions in the queue
 function processNextTranscription() {
   // Add a check for the process existence early
   if (!transcriptionProcess) {
@@ -2555,87 +2845,83 @@ function processNextTranscription() {
       return;
   }
 
-  if (isProcessingTranscription || transcriptionQueue.length === 0) {
-    return;
+  // Keep as many requests in flight as the worker's credits allow, so it never idles between calls
+  while (transcriptionProcess && transcriptionsInFlight() < transcriptionWindow) {
+    // Get the next waiting item but don't remove it from the queue yet
+    const nextItem = transcriptionQueue.find(item => !item.sentAt);
+    if (!nextItem) {
+      return;
+    }
+    sendTranscriptionRequest(nextItem);
   }
+}
 
-  // Get the next item but don't remove it from the queue yet
-  const nextItem = transcriptionQueue[0];
+// Remove a queue item that will never be sent and fail its callback
+function dropTranscriptionItem(item, reason) {
+  const index = transcriptionQueue.indexOf(item);
+  if (index !== -1) {
+    transcriptionQueue.splice(index, 1);
+  }
+  if (item.callback) {
+    try {
+      item.callback(""); // Indicate failure
+    } catch (callbackError) {
+      logger.error(`Error executing callback for ${reason}: ${callbackError.message}`);
+    }
+  }
+}
+
+// Send one queued item to the worker; it stays in the queue until its final response arrives
+function sendTranscriptionRequest(nextItem) {
 
   // Additional validation for file-based transcriptions
   if (nextItem.payload && nextItem.payload.path) {
     if (!fs.existsSync(nextItem.payload.path)) {
       logger.error(`Audio file missing when processing queue: ${nextItem.payload.path}. Skipping item.`);
-      // Remove the item and try next
-      transcriptionQueue.shift();
-      if (nextItem.callback) {
-        try {
-          nextItem.callback(""); // Indicate failure
-        } catch (callbackError) {
-          logger.error(`Error executing callback for missing file: ${callbackError.message}`);
-        }
-      }
-      processNextTranscription(); // Try next item
+      dropTranscriptionItem(nextItem, 'missing file');
       return;
     }
   }
 
   // Validate payload size for buffer-based transcriptions  
-  if (nextItem.payload && nextItem.payload.audio_data_base64) {
-    const estimatedSize = nextItem.payload.audio_data_base64.length * 0.75; // Rough base64 to binary size
+  if (nextItem.payload && (nextItem.payload.audio_data_base64 || nextItem.audioBuffer)) {
+    const estimatedSize = nextItem.audioBuffer
+      ? nextItem.audioBuffer.length
+      : nextItem.payload.audio_data_base64.length * 0.75; // Rough base64 to binary size
     if (estimatedSize > 50 * 1024 * 1024) { // 50MB limit
       logger.error(`Audio buffer too large for transcription: ${Math.round(estimatedSize / 1024 / 1024)}MB. Skipping item.`);
-      transcriptionQueue.shift();
-      if (nextItem.callback) {
-        try {
-          nextItem.callback(""); // Indicate failure
-        } catch (callbackError) {
-          logger.error(`Error executing callback for oversized file: ${callbackError.message}`);
-        }
-      }
-      processNextTranscription(); // Try next item
+      dropTranscriptionItem(nextItem, 'oversized file');
       return;
     }
   }
 
-  // Mark as processing and set timeout
-  isProcessingTranscription = true;
-  currentTranscriptionId = nextItem.id;
-  
-  // Set timeout for this transcription
-  transcriptionTimeout = setTimeout(() => {
-    logger.error(`Transcription timeout for ID ${currentTranscriptionId}. Restarting process...`);
-    // Force restart the process on timeout
-    cleanupTranscriptionProcess();
-    if (effectiveTranscriptionMode === 'local') {
-      setTimeout(startTranscriptionProcess, 5000);
-    }
-  }, TRANSCRIPTION_TIMEOUT_MS);
+  // Calls already in flight ahead of this one; the worker may work through them first
+  const callsAhead = transcriptionsInFlight();
+  // Mark as in flight; the restart timeout is armed once the worker reports it started the call
+  nextItem.sentAt = Date.now();
 
   // Send the pre-constructed payload to the python process
   try {
+    // The worker abandons the call with a 'timeout' error once this passes. The deadline counts from
+    // when the worker reads the request, so it grows with the calls queued ahead in the window
+    const deadlineMs = parseInt(TRANSCRIPTION_DEADLINE_MS, 10);
+    if (deadlineMs > 0) {
+      nextItem.payload.deadline_ms = deadlineMs * (callsAhead + 1);
+    }
     const payload = JSON.stringify(nextItem.payload) + '\n';
     transcriptionProcess.stdin.write(payload);
-    logger.info(`Sent payload to local transcription process for ID: ${nextItem.id} (payload size: ${payload.length} chars)`);
+    if (nextItem.audioBuffer) {
+      // Binary protocol: the raw frame must directly follow its header line
+      transcriptionProcess.stdin.write(nextItem.audioBuffer);
+    }
+    const frameSize = nextItem.audioBuffer ? ` + ${nextItem.audioBuffer.length} byte audio frame` : '';
+    logger.info(`Sent payload to local transcription process for ID: ${nextItem.id} (payload size: ${payload.length} chars${frameSize})`);
     lastProcessActivity = Date.now(); // Update activity timestamp
   } catch (error) {
       logger.error(`Error writing to local transcription process stdin for ID ${nextItem.id}: ${error.message}`);
-      // Clear timeout and reset state
-      clearTranscriptionTimeout();
-      resetProcessingState();
-      
-      // Remove the failed item from queue
-      transcriptionQueue.shift();
-      if (nextItem.callback) {
-        try {
-          nextItem.callback(""); // Indicate failure
-        } catch (callbackError) {
-          logger.error(`Error executing callback for stdin error: ${callbackError.message}`);
-        }
-      }
-      
-      // Try next item
-      processNextTranscription();
+      // Clear timeout and remove the failed item from queue; the caller tries the next item
+      clearTranscriptionTimeout(nextItem);
+      dropTranscriptionItem(nextItem, 'stdin error');
   }
 }
 
@@ -3201,7 +3487,7 @@ function handleNewAudio(audioData) {
             
             // Normal processing for non-merged calls (or fallback)
             // Define the common callback for processing transcription results
-            const processingCallback = async (transcriptionText) => {
+            const processingCallback = async (transcriptionText, segments, response) => {
                 if (!transcriptionText) {
                   // Check if this might be a tone file by looking at the talk group
                   const possibleToneFile = IS_TWO_TONE_MODE_ENABLED && TWO_TONE_TALK_GROUPS.includes(talkGroupID);
@@ -3224,12 +3510,17 @@ function handleNewAudio(audioData) {
                         (finalPathIfLocal || path.join(__dirname, 'audio', filename));
                       
                       // Wait for tone detection to complete before continuing
-                      await new Promise((resolve) => {
-                        detectTwoToneQueued(audioPathForTones, transcriptionId, talkGroupID, (hasTwoTone, detectedTones, detectedType) => {
-                          handleToneDetectionResult(hasTwoTone, detectedTones, transcriptionId, talkGroupID, detectedType);
-                          resolve();
+                      const analyzedTones = analyzedToneResult(response);
+                      if (analyzedTones) {
+                        handleToneDetectionResult(analyzedTones[0], analyzedTones[1], transcriptionId, talkGroupID, analyzedTones[2]);
+                      } else {
+                        await new Promise((resolve) => {
+                          detectTwoToneQueued(audioPathForTones, transcriptionId, talkGroupID, (hasTwoTone, detectedTones, detectedType) => {
+                            handleToneDetectionResult(hasTwoTone, detectedTones, transcriptionId, talkGroupID, detectedType);
+                            resolve();
+                          });
                         });
-                      });
+                      }
                       
                       logger.info(`Tone detection completed for ID ${transcriptionId} (empty transcription)`);
                     }
@@ -3254,6 +3545,10 @@ function handleNewAudio(audioData) {
                 // Format talker alias for display - use talkerAlias if available, otherwise use source, fallback to talkgroup
                 const displayAlias = talkerAlias || (source && source !== 'Unknown' ? `Unit-${source}` : `TG-${talkGroupID}`);
                 logger.info(`Transcription Text: (${displayAlias}) ${transcriptionText}`);
+                const lowConfidence = isLowConfidenceTranscription(response);
+                if (lowConfidence) {
+                  logger.info(`Low-confidence transcription for ID ${transcriptionId} (${JSON.stringify(response.confidence)}), address extraction will be skipped`);
+                }
                 // We got transcription text, update the database
                 updateTranscription(transcriptionId, transcriptionText, async () => {
                   logger.info(`Updated DB transcription for ID ${transcriptionId}`);
@@ -3266,7 +3561,9 @@ function handleNewAudio(audioData) {
                     emergency, priority, encrypted, call_length, // <-- Pass call metadata
                     freq_error, signalQuality, // <-- Pass signal quality
                     frequency, start_time, stop_time, // <-- Pass timing/frequency
-                    tdma_slot, phase2_tdma, color_code // <-- Pass TDMA/color code
+                    tdma_slot, phase2_tdma, color_code, // <-- Pass TDMA/color code
+                    lowConfidence, // <-- Skip geocoding/LLM work on junk transcripts
+                    analyzedToneResult(response) // <-- Tones from an 'analyze' request, if any
                   );
 
                   // Clean up temp file only if storage was S3
@@ -3305,6 +3602,8 @@ function handleNewAudio(audioData) {
             } else { // 'local' transcription mode
                 const localRequestId = uuidv4();
                 let payload;
+                let audioBuffer = null; // Raw audio frame sent after the payload (binary protocol)
+                let sharedAudioPath = null; // Shared-memory segment holding the audio (released after the result)
 
                 if (STORAGE_MODE === 's3') {
                     // S3 Storage + Local Transcription: Send buffer
@@ -3318,11 +3617,40 @@ function handleNewAudio(audioData) {
                       return;
                     }
                     
-                    payload = {
-                        command: 'transcribe',
-                        id: localRequestId,
-                        audio_data_base64: fileBuffer.toString('base64') // Send the buffer directly
-                    };
+                    if (TRANSCRIPTION_SHARED_MEMORY.toLowerCase() === 'true' && fs.existsSync(TRANSCRIPTION_SHM_DIR)) {
+                        // Shared-memory handoff: write the audio to tmpfs once and send only its name
+                        const shmName = `scanner-map-${localRequestId}`;
+                        try {
+                            fs.writeFileSync(path.join(TRANSCRIPTION_SHM_DIR, shmName), fileBuffer);
+                            sharedAudioPath = path.join(TRANSCRIPTION_SHM_DIR, shmName);
+                            payload = {
+                                command: 'transcribe',
+                                id: localRequestId,
+                                shm_name: shmName,
+                                shm_offset: 0,
+                                shm_length: fileBuffer.length
+                            };
+                        } catch (shmError) {
+                            logger.warn(`Could not write shared memory segment ${shmName}, sending audio inline: ${shmError.message}`);
+                        }
+                    }
+                    if (payload) {
+                        // Already handed off through shared memory
+                    } else if (TRANSCRIPTION_BINARY_AUDIO.toLowerCase() === 'true') {
+                        // Binary protocol: JSON header line followed by the raw audio bytes
+                        payload = {
+                            command: 'transcribe',
+                            id: localRequestId,
+                            audio_length: fileBuffer.length
+                        };
+                        audioBuffer = fileBuffer;
+                    } else {
+                        payload = {
+                            command: 'transcribe',
+                            id: localRequestId,
+                            audio_data_base64: fileBuffer.toString('base64') // Send the buffer directly
+                        };
+                    }
                     // NOTE: tempPath will be deleted later in processingCallback
                 } else {
                     // Local Storage + Local Transcription: Send path
@@ -3353,14 +3681,46 @@ function handleNewAudio(audioData) {
                     };
                 }
 
+                // Talk group lets the worker recognise the same transmission arriving from other simulcast sites
+                payload.talkgroup = talkGroupID;
+                // Scheduling hints: the worker runs urgent calls first and short calls first among those due together
+                payload.priority = transcriptionPriority(emergency, talkGroupGroup);
+                const callSeconds = parseFloat(call_length);
+                if (callSeconds > 0) {
+                    payload.duration = callSeconds;
+                }
+                if (TRANSCRIPTION_DETAILS.toLowerCase() === 'true') {
+                    payload.details = true; // Ask for segment timing and confidence
+                }
+                if (TRANSCRIPTION_STREAMING.toLowerCase() === 'true') {
+                    payload.stream = true; // Segments arrive as they decode, for early keyword alerts
+                }
+                if (IS_TWO_TONE_MODE_ENABLED && TWO_TONE_TALK_GROUPS.includes(talkGroupID)) {
+                    payload.command = 'analyze'; // Decode once: tones come back with the transcription
+                }
+
                 // Check if queue is getting too large (high-volume protection)
                 if (transcriptionQueue.length >= MAX_QUEUE_SIZE) {
-                  logger.error(`Transcription queue full (${MAX_QUEUE_SIZE} items). Dropping oldest items to prevent memory issues.`);
+                  logger.error(`Transcription queue full (${MAX_QUEUE_SIZE} items). Dropping least urgent items to prevent memory issues.`);
                   
-                  // Remove oldest items beyond threshold, keeping newer ones
+                  // Remove items beyond threshold: lowest priority class first, newest first within a class,
+                  // so fire/EMS/emergency calls (queued at the front) are the last to go
                   const itemsToRemove = transcriptionQueue.length - PRIORITY_QUEUE_THRESHOLD;
                   for (let i = 0; i < itemsToRemove; i++) {
-                    const droppedItem = transcriptionQueue.shift();
+                    // Calls already sent to the worker are kept - their answers are on the way
+                    let waitingIndex = -1;
+                    let waitingRank = -1;
+                    transcriptionQueue.forEach((item, index) => {
+                      const itemRank = TRANSCRIPTION_PRIORITY_RANK[item.priority || 'normal'];
+                      if (!item.sentAt && itemRank >= waitingRank) {
+                        waitingIndex = index;
+                        waitingRank = itemRank;
+                      }
+                    });
+                    if (waitingIndex === -1) {
+                      break;
+                    }
+                    const [droppedItem] = transcriptionQueue.splice(waitingIndex, 1);
                     if (droppedItem && droppedItem.callback) {
                       try {
                         droppedItem.callback(""); // Fail the dropped transcription
@@ -3375,19 +3735,32 @@ function handleNewAudio(audioData) {
                 // Add the job with its specific payload to the queue
                 const queueItem = {
                    id: localRequestId, // ID for matching response from Python
-                   payload: payload, // Contains either path or base64 data
-                   callback: processingCallback,
+                   payload: payload, // Contains either path, base64 data or a binary frame header
+                   audioBuffer: audioBuffer, // Raw audio frame for the binary protocol (null otherwise)
+                   callback: sharedAudioPath
+                     ? (...args) => {
+                         releaseSharedAudio(sharedAudioPath);
+                         processingCallback(...args);
+                       }
+                     : processingCallback,
                    dbTranscriptionId: transcriptionId,
+                   onPartial: payload.stream
+                     ? createEarlyKeywordAlerter(transcriptionId, talkGroupID, talkGroupName, systemName, source, talkerAlias)
+                     : null,
                    queuedAt: Date.now(), // Track when item was queued for debugging
-                   priority: Date.now() // Use timestamp as priority (newer = higher priority for busy systems)
+                   priority: payload.priority
                 };
                 
-                // For very busy systems, add to front if queue is large (prioritize recent calls)
-                if (transcriptionQueue.length > PRIORITY_QUEUE_THRESHOLD) {
-                  transcriptionQueue.unshift(queueItem); // Add to front
-                  logger.info(`HIGH VOLUME: Added transcription to front of queue (current size: ${transcriptionQueue.length})`);
+                // Urgent calls go ahead of less urgent ones but behind earlier calls of their own class,
+                // so older calls are never starved by newer arrivals; calls already sent stay first
+                const rank = TRANSCRIPTION_PRIORITY_RANK[queueItem.priority];
+                const insertAt = transcriptionQueue.findIndex(item =>
+                  !item.sentAt && TRANSCRIPTION_PRIORITY_RANK[item.priority || 'normal'] > rank);
+                if (insertAt === -1) {
+                  transcriptionQueue.push(queueItem);
                 } else {
-                  transcriptionQueue.push(queueItem); // Normal operation
+                  transcriptionQueue.splice(insertAt, 0, queueItem);
+                  logger.info(`Queued ${queueItem.priority} priority transcription ahead of ${transcriptionQueue.length - insertAt - 1} less urgent call(s)`);
                 }
                 
                 // Use setImmediate to avoid potential race conditions in queue processing
@@ -3498,6 +3871,16 @@ function validateAndAddFields(embed, fields) {
   return embed;
 }
 
+// Junk transcript check from the local worker's confidence metadata (TRANSCRIPTION_DETAILS=true)
+function isLowConfidenceTranscription(response) {
+  const confidence = response && response.confidence;
+  if (!confidence) {
+    return false; // No metadata (other transcription modes, cached results) - treat as normal
+  }
+  return confidence.avg_logprob < parseFloat(TRANSCRIPTION_JUNK_MIN_LOGPROB) ||
+    confidence.no_speech_prob > parseFloat(TRANSCRIPTION_JUNK_MAX_NO_SPEECH);
+}
+
 // Function to update transcription
 function updateTranscription(id, transcriptionText, callback) {
   logger.info(`Calling updateTranscription for ID ${id}`);
@@ -4006,7 +4389,9 @@ async function handleNewTranscription(
   stop_time,
   tdma_slot,
   phase2_tdma,
-  color_code
+  color_code,
+  lowConfidence = false,
+  analyzedTones = null
 ) {
   logger.info(`Starting handleNewTranscription for ID ${id}`);
   logger.info(`Transcription text length: ${transcriptionText.length} characters`);
@@ -4045,7 +4430,9 @@ async function handleNewTranscription(
 
   try {
     // Handle address extraction based on mode
-    if (transcriptionText.length >= 15 && shouldCheckForAddress(talkGroupID, id)) {
+    if (lowConfidence) {
+      logger.info(`Skipping address extraction for low-confidence transcription (ID ${id})`);
+    } else if (transcriptionText.length >= 15 && shouldCheckForAddress(talkGroupID, id)) {
       await extractAndProcessAddress(id, transcriptionText, talkGroupID);
     } else if (transcriptionText.length < 15) {
       logger.info(`Skipping address extraction for short transcription (ID ${id}): ${transcriptionText.length} characters`);
@@ -4063,12 +4450,17 @@ async function handleNewTranscription(
         path.join(__dirname, 'audio', audioFilePath); // Construct full local path
       
       // Wait for tone detection to complete before continuing
-      await new Promise((resolve) => {
-        detectTwoToneQueued(audioPathForTones, id, talkGroupID, (hasTwoTone, detectedTones, detectedType) => {
-          handleToneDetectionResult(hasTwoTone, detectedTones, id, talkGroupID, detectedType);
-          resolve();
+      if (analyzedTones) {
+        // Already detected by the worker from the audio it decoded for transcription
+        handleToneDetectionResult(analyzedTones[0], analyzedTones[1], id, talkGroupID, analyzedTones[2]);
+      } else {
+        await new Promise((resolve) => {
+          detectTwoToneQueued(audioPathForTones, id, talkGroupID, (hasTwoTone, detectedTones, detectedType) => {
+            handleToneDetectionResult(hasTwoTone, detectedTones, id, talkGroupID, detectedType);
+            resolve();
+          });
         });
-      });
+      }
       
       logger.info(`Tone detection completed for ID ${id}`);
     }
@@ -4120,7 +4512,12 @@ async function handleNewTranscription(
 
     logger.info(`Matched keywords for ID ${id}: ${matchedKeywords.join(', ') || 'None'}`);
 
-    if (matchedKeywords.length > 0 && alertChannel) {
+    // Keywords already alerted from streamed partial segments are not alerted again
+    const earlyAlerted = earlyKeywordAlerts.get(id);
+    earlyKeywordAlerts.delete(id);
+    const keywordsToAlert = earlyAlerted ? matchedKeywords.filter((keyword) => !earlyAlerted.has(keyword)) : matchedKeywords;
+
+    if (keywordsToAlert.length > 0 && alertChannel) {
       logger.info(`Sending alert message for ID ${id}`);
       await sendAlertMessage(
         talkGroupID,
@@ -4130,7 +4527,7 @@ async function handleNewTranscription(
         source,
         talkerAlias,
         id,  // Pass the numeric ID here too
-        matchedKeywords,
+        keywordsToAlert,
         messageUrl
       );
     }
@@ -4238,6 +4635,35 @@ async function updateTranscriptionWithLinkedText(id, linkedText) {
   });
 }
 
+// Streaming mode: keywords alerted from partial segments, so the final transcription doesn't repeat them
+const earlyKeywordAlerts = new Map(); // DB transcription ID -> Set of keywords already alerted
+const EARLY_ALERT_MEMORY_MS = 10 * 60 * 1000;
+
+// Returns a partial-segment handler that alerts on keywords as soon as they are transcribed
+function createEarlyKeywordAlerter(transcriptionId, talkGroupID, talkGroupName, systemName, source, talkerAlias) {
+  const partialSegments = [];
+  return (segment) => {
+    partialSegments[segment.index] = segment.text;
+    const partialText = partialSegments.filter(Boolean).join(' ');
+    logger.info(`Partial segment ${segment.index} for ID ${transcriptionId}: ${segment.text}`);
+
+    checkForKeywords(talkGroupID, partialText, (keywords) => {
+      const alerted = earlyKeywordAlerts.get(transcriptionId) || new Set();
+      const newKeywords = keywords.filter((keyword) => !alerted.has(keyword));
+      if (newKeywords.length === 0 || !alertChannel) {
+        return;
+      }
+      newKeywords.forEach((keyword) => alerted.add(keyword));
+      if (!earlyKeywordAlerts.has(transcriptionId)) {
+        earlyKeywordAlerts.set(transcriptionId, alerted);
+        setTimeout(() => earlyKeywordAlerts.delete(transcriptionId), EARLY_ALERT_MEMORY_MS);
+      }
+      logger.info(`Early keyword alert for ID ${transcriptionId} from partial transcription: ${newKeywords.join(', ')}`);
+      sendAlertMessage(talkGroupID, talkGroupName, partialText, systemName, source, talkerAlias, transcriptionId, newKeywords, null);
+    });
+  };
+}
+
 function checkForKeywords(talkGroupID, transcriptionText, callback) {
   db.all(
     `SELECT keyword FROM global_keywords WHERE talk_group_id = ? OR talk_group_id IS NULL`,
@@ -4310,7 +4736,10 @@ function sendAlertMessage(
       { name: 'System', value: systemName || 'Unknown', inline: true },
       { 
         name: 'Links', 
-        value: `[🔊 Listen to Audio](${audioUrl})\n[↗️ Jump to Message](${messageUrl})`, 
+        // Early (streamed) alerts go out before the transcription message exists
+        value: messageUrl
+          ? `[🔊 Listen to Audio](${audioUrl})\n[↗️ Jump to Message](${messageUrl})`
+          : `[🔊 Listen to Audio](${audioUrl})`,
         inline: false
       }
     ];
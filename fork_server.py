@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+fork_server.py - Supervisor that keeps transcription workers replaceable without a cold restart
+The parent does the expensive startup once (imports, validation, model download/resolution) and
+forks workers from that state; an optional warm spare worker stands by so a hung one is swapped in milliseconds
+"""
+
+import io
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Replays a request gets after the worker died while running it; a call that crashes the
+# worker again is answered with an error rather than crash-looping every replacement
+MAX_CRASH_REPLAYS = 1
+
+def _frame_length(value) -> Optional[int]:
+    """Byte count of a binary audio frame, or None if the header's audio_length is unusable"""
+    try:
+        length = int(value)
+    except (TypeError, ValueError):
+        return None
+    return length if length >= 0 else None
+
+class ForkedWorker:
+    """A forked worker process and the parent's end of its socketpair"""
+
+    def __init__(self, pid: int, sock: socket.socket, role: str):
+        self.pid = pid
+        self.sock = sock
+        self.role = role  # 'active' or 'spare'
+        self.ready = threading.Event()
+        self.send_lock = threading.Lock()
+
+    def send(self, data: bytes) -> bool:
+        """Write request bytes to the worker; False if it has gone away"""
+        with self.send_lock:
+            try:
+                self.sock.sendall(data)
+                return True
+            except OSError:
+                return False
+
+    def kill(self) -> None:
+        """Kill the worker outright - a hung inference call cannot be interrupted any other way"""
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+class PendingRequest:
+    """A forwarded request awaiting its final response"""
+
+    def __init__(self, data: bytes):
+        self.data = data  # Raw request bytes, binary audio frame included, for replay
+        self.started_at: Optional[float] = None  # When the active worker started it; None while queued
+        self.crash_replays = 0
+
+class ForkServer:
+    """
+    Relay the parent's stdin/stdout protocol to one active forked worker
+
+    Requests are forwarded unchanged and remembered until their final
+    response. The worker reports when it starts each request, and only
+    started requests are timed: one queued behind slow calls is not overdue.
+    If a started request gets no answer within `request_timeout` seconds,
+    or the worker dies, the worker is killed, the spare is promoted, the
+    overdue request is answered with an error and every other unanswered
+    request is replayed to the new worker. A request that was running when
+    the worker died is replayed at most MAX_CRASH_REPLAYS times, then
+    answered with an error. With `keep_spare` a new spare is then forked;
+    without it the replacement is forked on demand.
+
+    CTranslate2's thread pools and CUDA contexts do not survive fork(), so the
+    model itself is loaded in each worker after the fork; the spare is what
+    takes model loading off the recovery path, at the cost of holding a
+    second copy of the model in RAM/VRAM, hence off by default.
+    """
+
+    def __init__(self, request_timeout: float, keep_spare: bool = False):
+        self.request_timeout = request_timeout
+        self.keep_spare = keep_spare
+        self.active: Optional[ForkedWorker] = None
+        self.spare: Optional[ForkedWorker] = None
+        self.workers: Dict[int, ForkedWorker] = {}
+        self.in_flight: Dict[str, PendingRequest] = {}
+        self.lock = threading.Lock()
+        self.stdout_lock = threading.Lock()
+        self.spawn_requests = queue.Queue()
+        self.ready_sent = False
+        self.shutting_down = False
+        self.replacements = 0
+
+    def run(self) -> None:
+        """
+        Serve as the supervisor until stdin closes, then exit
+
+        Workers are forked from this (main) thread; in a freshly forked worker
+        this method returns, and the caller carries on with normal startup
+        using the socketpair as its stdin/stdout.
+        """
+        self.spawn_requests.put('active')
+        if self.keep_spare:
+            self.spawn_requests.put('spare')
+        threading.Thread(target=self._read_stdin, name="fork-server-stdin", daemon=True).start()
+        threading.Thread(target=self._watchdog, name="fork-server-watchdog", daemon=True).start()
+
+        while True:
+            role = self.spawn_requests.get()
+            if role is None:
+                break
+            if self._spawn(role):
+                return  # Inside the new worker
+
+        self._wait_for_workers()
+        logger.info("Fork server exiting")
+        # os._exit: relay/stdin threads may still hold stream locks that interpreter shutdown would wait on
+        sys.stderr.flush()
+        os._exit(0)
+
+    def _spawn(self, role: str) -> bool:
+        """Fork a worker; returns True in the child"""
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        with self.lock:
+            inherited = [worker.sock for worker in self.workers.values()]
+        pid = os.fork()
+        if pid == 0:
+            # Worker: drop the supervisor's sockets and serve the socketpair as stdin/stdout
+            parent_sock.close()
+            for sock in inherited:
+                sock.close()
+            os.dup2(child_sock.fileno(), 0)
+            os.dup2(child_sock.fileno(), 1)
+            child_sock.close()
+            sys.stdin = os.fdopen(0, 'r', closefd=False)
+            sys.stdout = os.fdopen(1, 'w', closefd=False)
+            return True
+
+        child_sock.close()
+        worker = ForkedWorker(pid, parent_sock, role)
+        replay = []
+        with self.lock:
+            self.workers[pid] = worker
+            if role == 'active':
+                replay = self._activate(worker)
+            else:
+                self.spare = worker
+        threading.Thread(target=self._relay, args=(worker,), name=f"fork-server-relay-{pid}", daemon=True).start()
+        logger.info(f"Forked {role} transcription worker (PID: {pid})")
+        for data in replay:
+            worker.send(data)
+        return False
+
+    def _activate(self, worker: ForkedWorker) -> list:
+        """
+        Make a worker the active one (lock held)
+
+        Returns:
+            Unanswered requests to replay to it; sent by the caller after
+            releasing the lock, since a worker still loading its model reads slowly
+        """
+        worker.role = 'active'
+        self.active = worker
+        replay = []
+        for request in self.in_flight.values():
+            request.started_at = None  # Queued again in the new worker
+            replay.append(request.data)
+        return replay
+
+    def _write_stdout(self, data: bytes) -> None:
+        """Write a response line to the real stdout"""
+        # Unbuffered os.write: a sys.stdout buffer lock held by this thread at fork time
+        # would stay locked forever in the forked worker's copy
+        with self.stdout_lock:
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(1, view):]
+            except OSError:
+                pass  # Parent process gone - stdin EOF will shut us down
+
+    def _read_stdin(self) -> None:
+        """Forward requests from stdin to the active worker, remembering them until answered"""
+        # A private reader rather than sys.stdin: its lock is held while blocked in readline, and
+        # workers forked meanwhile must not inherit a locked sys.stdin (fatal at their shutdown)
+        stream = io.BufferedReader(io.FileIO(0, 'rb', closefd=False))
+        while True:
+            line = stream.readline()
+            if not line:
+                break
+            data = line
+            request_id = None
+            try:
+                command = json.loads(line)
+                # A cancel is never answered, so it is not tracked for replay (nor may it overwrite its target's bytes)
+                if command.get('command') != 'cancel':
+                    request_id = command.get('id')
+                if 'audio_length' in command:
+                    # Binary frame follows the header line - keep it with the request for replay
+                    audio_length = _frame_length(command['audio_length'])
+                    if audio_length is None:
+                        # The frame's extent is unknown, so the stream cannot be resynchronised
+                        logger.error(f"Invalid audio_length {command['audio_length']!r}, closing stdin")
+                        error = {"id": command.get('id'), "error": f"Invalid audio_length: {command['audio_length']!r}"}
+                        self._write_stdout((json.dumps(error) + "\n").encode('utf-8'))
+                        break
+                    data += stream.read(audio_length)
+            except (ValueError, AttributeError):
+                pass  # Not valid JSON - the worker logs and skips it
+
+            with self.lock:
+                if request_id:
+                    self.in_flight[request_id] = PendingRequest(data)
+                active = self.active
+            if active:
+                active.send(data)  # Without an active worker the request is replayed on activation
+
+        logger.info("stdin closed, shutting down fork server")
+        with self.lock:
+            self.shutting_down = True
+            workers = list(self.workers.values())
+        for worker in workers:
+            try:
+                worker.sock.shutdown(socket.SHUT_WR)  # Workers see EOF, drain and exit
+            except OSError:
+                pass
+        self.spawn_requests.put(None)
+
+    def _relay(self, worker: ForkedWorker) -> None:
+        """Pass an active worker's responses to stdout and settle answered requests"""
+        try:
+            self._relay_lines(worker)
+        except OSError as e:
+            logger.warning(f"Lost connection to transcription worker (PID: {worker.pid}): {e}")
+        try:
+            os.waitpid(worker.pid, 0)
+        except ChildProcessError:
+            pass
+        worker.sock.close()
+        with self.lock:
+            self.workers.pop(worker.pid, None)
+            was_active = worker is self.active
+            if self.spare is worker:
+                self.spare = None
+                if not self.shutting_down:
+                    self.spawn_requests.put('spare')
+        if was_active and not self.shutting_down:
+            logger.error(f"Active transcription worker (PID: {worker.pid}) exited unexpectedly")
+            self._replace_active(None)
+
+    def _relay_lines(self, worker: ForkedWorker) -> None:
+        """Read a worker's response lines until it exits"""
+        for line in worker.sock.makefile('rb'):
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            if response.get('ready'):
+                worker.ready.set()
+                with self.lock:
+                    if worker is not self.active or self.ready_sent:
+                        continue
+                    self.ready_sent = True
+            elif worker is not self.active:
+                continue  # Spare or replaced worker - nothing it says concerns the client
+            elif response.get('started'):
+                with self.lock:
+                    request = self.in_flight.get(response.get('id'))
+                    if request:
+                        request.started_at = time.monotonic()
+            elif self._is_final(response):
+                with self.lock:
+                    self.in_flight.pop(response['id'], None)
+            self._write_stdout(line)
+
+    @staticmethod
+    def _is_final(response: dict) -> bool:
+        """Whether a response settles its request (partials and late revisions do not)"""
+        if not response.get('id') or response.get('partial') or 'revision' in response:
+            return False
+        return 'transcription' in response or 'error' in response or 'has_two_tone' in response
+
+    def _watchdog(self) -> None:
+        """Replace the active worker when a started request has gone unanswered for too long"""
+        while not self.shutting_down:
+            time.sleep(1)
+            with self.lock:
+                started = [(request.started_at, request_id) for request_id, request in self.in_flight.items()
+                           if request.started_at is not None]
+                if not self.active or not started:
+                    continue
+                started_at, request_id = min(started)
+            if time.monotonic() - started_at > self.request_timeout:
+                logger.error(f"Request {request_id} unanswered after {self.request_timeout:.0f}s, replacing hung worker")
+                self._replace_active(request_id)
+
+    def _replace_active(self, hung_request_id: Optional[str]) -> None:
+        """Kill the active worker, promote the spare and replay unanswered requests"""
+        start = time.perf_counter()
+        replay = []
+        with self.lock:
+            old = self.active
+            self.active = None
+            if old:
+                old.kill()
+            if hung_request_id:
+                self.in_flight.pop(hung_request_id, None)
+            # Requests the old worker was running may be what killed it
+            crashed_request_ids = []
+            for request_id, request in list(self.in_flight.items()):
+                if request.started_at is None:
+                    continue
+                if request.crash_replays >= MAX_CRASH_REPLAYS:
+                    del self.in_flight[request_id]
+                    crashed_request_ids.append(request_id)
+                else:
+                    request.crash_replays += 1
+            self.replacements += 1
+            replacement_number = self.replacements
+            promoted = self.spare
+            if promoted:
+                self.spare = None
+                replay = self._activate(promoted)
+            else:
+                self.spawn_requests.put('active')
+            if self.keep_spare:
+                self.spawn_requests.put('spare')
+
+        if hung_request_id:
+            error = {"id": hung_request_id, "error": f"Transcription worker timed out after {self.request_timeout:.0f}s and was replaced."}
+            self._write_stdout((json.dumps(error) + "\n").encode('utf-8'))
+        for request_id in crashed_request_ids:
+            logger.error(f"Request {request_id} was running when {MAX_CRASH_REPLAYS + 1} workers died, not replaying it again")
+            error = {"id": request_id, "error": "Transcription worker died while processing this request; not retrying."}
+            self._write_stdout((json.dumps(error) + "\n").encode('utf-8'))
+        if promoted:
+            for data in replay:
+                promoted.send(data)
+            logger.info(f"Replacement {replacement_number}: promoted spare worker (PID: {promoted.pid}) in {(time.perf_counter() - start) * 1000:.1f}ms"
+                        f"{'' if promoted.ready.is_set() else ' (still loading its model)'}, replayed {len(replay)} request(s)")
+        else:
+            logger.warning("No spare worker available, forking a new active worker")
+
+    def _wait_for_workers(self) -> None:
+        """Give workers time to finish queued requests after stdin closes"""
+        deadline = time.monotonic() + self.request_timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if not self.workers:
+                    return
+            time.sleep(0.2)
+        with self.lock:
+            for worker in self.workers.values():
+                worker.kill()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+quality_control.py - Backlog-aware quality tiers for transcription
+Trades decoding quality for throughput while the worker falls behind, instead of calls being dropped
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+class QualityTier:
+    """One set of decoding settings, from full quality down to the cheapest usable"""
+
+    def __init__(self, name: str, beam_size: int, vad_parameters: Dict[str, Any], no_speech_fallback: bool):
+        self.name = name
+        self.beam_size = beam_size
+        self.vad_parameters = vad_parameters
+        self.no_speech_fallback = no_speech_fallback
+
+def build_tiers(beam_size: int, vad_parameters: Dict[str, Any]) -> List[QualityTier]:
+    """
+    Quality tiers derived from the configured (full quality) settings
+
+    Args:
+        beam_size: Beam width used when the worker keeps up
+        vad_parameters: VAD settings used when the worker keeps up
+
+    Returns:
+        Tiers ordered from best quality to cheapest
+    """
+    # Tighter VAD: stricter speech threshold and shorter silences split off, so less audio reaches the model
+    tight_vad = {**vad_parameters, 'threshold': 0.6,
+                 'min_silence_duration_ms': min(400, vad_parameters.get('min_silence_duration_ms', 2000))}
+    return [
+        QualityTier('full', beam_size, vad_parameters, True),
+        QualityTier('reduced', 1, vad_parameters, True),  # Greedy decoding
+        QualityTier('minimal', 1, tight_vad, False),      # Greedy, tight VAD, no no-VAD retry
+    ]
+
+class AdaptiveQualityController:
+    """
+    Picks a quality tier from the backlog and the recent real-time factor
+
+    The expected wait for the last queued call is estimated as
+    backlog x recent seconds-per-call / workers. The tier steps down when that
+    wait passes a threshold, and steps back up one tier at a time once it has
+    fallen below half the threshold for at least `hold_seconds`.
+    """
+
+    def __init__(self, tiers: List[QualityTier], thresholds_seconds: List[float], workers: int = 1,
+                 hold_seconds: float = 10.0, smoothing: float = 0.2, enabled: bool = True):
+        """
+        Args:
+            tiers: Tiers from best to cheapest
+            thresholds_seconds: Expected wait at which to drop to tiers[1], tiers[2], ...
+            workers: Inference workers draining the backlog in parallel
+            hold_seconds: Minimum time between tier changes
+            smoothing: Weight of the newest observation in the moving averages
+            enabled: False pins the first (full quality) tier
+        """
+        self.tiers = tiers
+        self.thresholds = thresholds_seconds
+        self.workers = max(1, workers)
+        self.hold_seconds = hold_seconds
+        self.smoothing = smoothing
+        self.enabled = enabled
+        self._level = 0
+        self._changed_at = time.monotonic()
+        self._seconds_per_call: Optional[float] = None
+        self._rtf: Optional[float] = None
+        self._expected_wait = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, audio_seconds: float, processing_seconds: float) -> None:
+        """Record how long a finished call took to transcribe"""
+        with self._lock:
+            if self._seconds_per_call is None:
+                self._seconds_per_call = processing_seconds
+            else:
+                self._seconds_per_call += self.smoothing * (processing_seconds - self._seconds_per_call)
+            if audio_seconds > 0:
+                rtf = processing_seconds / audio_seconds
+                self._rtf = rtf if self._rtf is None else self._rtf + self.smoothing * (rtf - self._rtf)
+
+    def select(self, backlog: int) -> QualityTier:
+        """Tier to use for the next call, given the number of calls still waiting"""
+        with self._lock:
+            if not self.enabled:
+                return self.tiers[0]
+            self._expected_wait = backlog * (self._seconds_per_call or 0.0) / self.workers
+            target = sum(1 for threshold in self.thresholds if self._expected_wait >= threshold)
+            now = time.monotonic()
+            if target > self._level:
+                # Downshift straight to the tier the pressure calls for
+                self._level = target
+                self._changed_at = now
+            elif (target < self._level and now - self._changed_at >= self.hold_seconds
+                  and self._expected_wait < self.thresholds[self._level - 1] / 2):
+                # Recover one tier at a time once the backlog has clearly drained
+                self._level -= 1
+                self._changed_at = now
+            return self.tiers[self._level]
+
+    def stats(self) -> Dict[str, Any]:
+        """Current tier and load estimate, for the heartbeat"""
+        with self._lock:
+            return {
+                'tier': self.tiers[self._level].name,
+                'expected_wait_s': round(self._expected_wait, 1),
+                'seconds_per_call': round(self._seconds_per_call, 2) if self._seconds_per_call is not None else None,
+                'rtf': round(self._rtf, 3) if self._rtf is not None else None
+            }
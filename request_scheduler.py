@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+request_scheduler.py - Priority and deadline-aware ordering of queued transcription work
+Emergency and priority-talkgroup calls go first under backlog; within a class the earliest
+deadline, then the shortest call, instead of plain arrival order
+"""
+
+import heapq
+import itertools
+import queue
+from typing import Any, Callable, Collection, Optional, Tuple
+
+# Lower runs first; requests name a class or give its number
+PRIORITY_CLASSES = {'emergency': 0, 'high': 1, 'normal': 2, 'low': 3}
+DEFAULT_PRIORITY = PRIORITY_CLASSES['normal']
+
+def priority_class(priority: Any = None, emergency: Any = False, talkgroup: Any = None,
+                   priority_talkgroups: Collection[str] = ()) -> int:
+    """
+    Scheduling class of a request
+
+    Args:
+        priority: Class name ('emergency', 'high', 'normal', 'low') or number 0-3
+        emergency: Emergency flag of the call; forces the 'emergency' class
+        talkgroup: Talk group of the call
+        priority_talkgroups: Talk groups (fire, EMS...) always given at least the 'high' class
+
+    Returns:
+        Class number, 0 (most urgent) to 3
+    """
+    if emergency in (True, 1) or str(emergency).lower() in ('true', '1'):
+        return PRIORITY_CLASSES['emergency']
+
+    if isinstance(priority, str) and priority.lower() in PRIORITY_CLASSES:
+        level = PRIORITY_CLASSES[priority.lower()]
+    else:
+        try:
+            level = min(max(int(priority), 0), len(PRIORITY_CLASSES) - 1)
+        except (TypeError, ValueError):
+            level = DEFAULT_PRIORITY
+
+    if talkgroup is not None and str(talkgroup) in priority_talkgroups:
+        level = min(level, PRIORITY_CLASSES['high'])
+    return level
+
+class SchedulingQueue(queue.Queue):
+    """
+    queue.Queue that hands out the item with the smallest scheduling key
+
+    Built the way queue.PriorityQueue is (a heap behind the Queue locking),
+    but the key is computed on put, so callers keep putting plain items.
+    Ties keep arrival order, and None (the shutdown signal) sorts after
+    everything, so queued work drains before the workers stop.
+    """
+
+    def __init__(self, key: Callable[[Any], Tuple[float, ...]], maxsize: int = 0):
+        self.key = key
+        super().__init__(maxsize)
+
+    def _init(self, maxsize: int) -> None:
+        self.queue = []
+        self._arrivals = itertools.count()
+
+    def _qsize(self) -> int:
+        return len(self.queue)
+
+    def _put(self, item: Any) -> None:
+        key = (float('inf'),) if item is None else self.key(item)
+        heapq.heappush(self.queue, (key, next(self._arrivals), item))
+
+    def _get(self) -> Any:
+        return heapq.heappop(self.queue)[-1]
+
+def schedule_key(priority: int, deadline: float, expected_seconds: Optional[float],
+                 slot_seconds: float) -> Tuple[float, ...]:
+    """
+    Order requests by class, then deadline, then length
+
+    Deadlines are compared in slots of `slot_seconds`, so calls due at about
+    the same time run shortest first rather than strictly in deadline order.
+
+    Args:
+        priority: Class number from priority_class()
+        deadline: Monotonic time the request should be answered by
+        expected_seconds: Audio duration, measured or estimated (None sorts last in its slot)
+        slot_seconds: Width of the deadline slots (0 = strict earliest-deadline-first)
+
+    Returns:
+        Tuple key; smaller runs first
+    """
+    slot = deadline // slot_seconds if slot_seconds > 0 else deadline
+    return (priority, slot, expected_seconds if expected_seconds is not None else float('inf'))
@@ -0,0 +1,127 @@
+"""
+Native tone engine (tone_engine.py) and the results tone_detect.py builds from it
+
+Synthetic fixtures stand in for scanner audio: a two-tone page, a pulsed
+tone, a long tone, white noise and a speech-like signal. bot.js matches on
+the detected_type strings, so the combined ones are pinned here as well.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import tone_engine  # noqa: E402
+from tone_detect import ToneDetector  # noqa: E402
+
+SAMPLE_RATE = tone_engine.SAMPLE_RATE
+
+def tone(frequency, seconds, amplitude=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+def noise(seconds, amplitude, seed=0):
+    return (amplitude * np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+def two_tone_page():
+    """853 Hz for 1s then 1063 Hz for 3s, over a faint noise floor"""
+    return np.concatenate([silence(0.5), tone(853, 1.0), tone(1063, 3.0), silence(0.5)]) + noise(5.0, 0.01)
+
+def pulsed_tone():
+    """1000 Hz keyed 200ms on / 200ms off, 8 times"""
+    cycle = np.concatenate([tone(1000, 0.2), silence(0.2)])
+    return np.concatenate([silence(0.5), *[cycle] * 8, silence(0.5)])
+
+def long_tone(trailing_silence=0.5):
+    return np.concatenate([silence(0.5), tone(1500, 2.0), silence(trailing_silence)])
+
+def speech_like(seconds=5.0):
+    """Harmonic-rich voice with a wandering pitch and a syllable-rate envelope"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 40 * np.sin(2 * np.pi * 1.3 * t) + 20 * np.sin(2 * np.pi * 3.1 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None) ** 2
+    voice = sum(np.sin(k * phase) / k for k in range(1, 20))
+    return (0.3 * envelope * voice).astype(np.float32) + noise(seconds, 0.005)
+
+@pytest.fixture(params=['auto', 'both'])
+def detector(request, monkeypatch):
+    """Native ToneDetector with one of the detection presets, unaffected by the caller's tone settings"""
+    for name in list(os.environ):
+        if name.startswith(('TONE_', 'TWO_TONE_', 'PULSED_', 'LONG_TONE_')):
+            monkeypatch.delenv(name)
+    return ToneDetector({'detection_type': request.param})
+
+@pytest.mark.parametrize('make_audio, detected_type', [
+    (two_tone_page, 'two-tone'),
+    (pulsed_tone, 'pulsed'),
+    (long_tone, 'long'),
+    (lambda: noise(5.0, 0.3), None),
+    (speech_like, None)
+], ids=['two-tone', 'pulsed', 'long', 'white-noise', 'speech'])
+def test_detected_type(detector, make_audio, detected_type):
+    result = detector.detect_tones_in_audio(make_audio())
+    assert result['method'] == 'native'
+    assert result['detected_type'] == detected_type
+    assert result['has_two_tone'] == (detected_type is not None)
+
+def test_two_tone_frequencies(detector):
+    tones = detector.get_detected_tones(detector.detect_tones_in_audio(two_tone_page()))
+    assert len(tones) == 1
+    assert tones[0]['tone_a'] == pytest.approx(853, abs=5)
+    assert tones[0]['tone_b'] == pytest.approx(1063, abs=5)
+    assert tones[0]['duration_a'] == pytest.approx(1.0, abs=0.1)
+    assert tones[0]['duration_b'] == pytest.approx(3.0, abs=0.1)
+
+def test_pulsed_cycles(detector):
+    tones = detector.get_detected_tones(detector.detect_tones_in_audio(pulsed_tone()))
+    assert len(tones) == 1
+    assert tones[0]['detected'] == pytest.approx(1000, abs=5)
+    assert tones[0]['cycles'] == 8
+
+def test_long_tone_length(detector):
+    tones = detector.get_detected_tones(detector.detect_tones_in_audio(long_tone()))
+    assert len(tones) == 1
+    assert tones[0]['detected'] == pytest.approx(1500, abs=5)
+    assert tones[0]['length'] == pytest.approx(2.0, abs=0.1)
+    assert 'cycles' not in tones[0]
+
+@pytest.mark.parametrize('audio, tone_at_end', [
+    (long_tone(trailing_silence=0.5), False),
+    (long_tone(trailing_silence=0.0), True),
+    (two_tone_page(), False)
+], ids=['tone-then-silence', 'tone-to-the-end', 'two-tone-then-silence'])
+def test_tone_at_end(detector, audio, tone_at_end):
+    assert detector.detect_tones_in_audio(audio)['detection_result'].tone_at_end is tone_at_end
+
+def test_combined_detection(detector):
+    audio = np.concatenate([two_tone_page(), silence(1.0), tone(1500, 2.0), silence(0.5)])
+    result = detector.detect_tones_in_audio(audio)
+    assert result['detected_type'] == 'two-tone+long'
+    tones = detector.get_detected_tones(result)
+    assert [sorted(t) for t in tones] == [['duration_a', 'duration_b', 'tone_a', 'tone_b'], ['detected', 'length']]
+
+@pytest.mark.parametrize('two_tone, pulsed, long, detected_type', [
+    (True, False, False, 'two-tone'),
+    (False, True, False, 'pulsed'),
+    (False, False, True, 'long'),
+    (True, True, False, 'two-tone+pulsed'),
+    (True, False, True, 'two-tone+long'),
+    (False, True, True, 'pulsed+long'),
+    (True, True, True, 'two-tone+pulsed+long'),
+    (False, False, False, None)
+])
+def test_detected_type_strings(two_tone, pulsed, long, detected_type):
+    result = tone_engine.ToneDetectionResult(
+        [tone_engine.TwoToneCall(853.0, 1063.0, 1.0, 3.0, 0.0, 4.0)] if two_tone else [],
+        [tone_engine.LongToneCall(1500.0, 2.0, 5.0, 7.0)] if long else [],
+        [tone_engine.PulsedCall(1000.0, 8, 3.0, 8.0, 11.0)] if pulsed else []
+    )
+    assert result.detected_type == detected_type
@@ -0,0 +1,108 @@
+"""
+End-to-end check of 'details': true requests against a real transcribe.py worker
+
+Runs the worker over stdin/stdout the way bot.js does, once with single-call
+inference and once with cross-request batching, and expects every request
+(with and without details) to get a transcription rather than an error.
+Needs faster-whisper and a model (WHISPER_MODEL, default 'tiny'); skipped otherwise.
+"""
+
+import json
+import math
+import os
+import subprocess
+import sys
+import wave
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("faster_whisper")
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_RATE = 16000
+STARTUP_TIMEOUT_S = 600  # First run may download the model
+
+def write_call(path, seconds):
+    """A short synthetic call: a warbling tone, enough for the decoder to emit segments"""
+    frames = bytearray()
+    for i in range(int(seconds * SAMPLE_RATE)):
+        t = i / SAMPLE_RATE
+        value = 0.3 * math.sin(2 * math.pi * (300 + 200 * math.sin(2 * math.pi * 3 * t)) * t)
+        frames += int(value * 32767).to_bytes(2, 'little', signed=True)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(bytes(frames))
+
+def run_worker(env_overrides, commands):
+    """Start transcribe.py, send the commands once it is ready and collect one final response per id"""
+    env = {
+        **os.environ,
+        'WHISPER_MODEL': os.getenv('WHISPER_MODEL', 'tiny'),
+        'TRANSCRIPTION_DEVICE': 'cpu',
+        'TRANSCRIPTION_FORK_SERVER': 'false',
+        'TRANSCRIPTION_DRAFT_MODEL': '',
+        'TRANSCRIPTION_CACHE_SIZE': '0',  # Every call must go through inference, not the cache
+        'TRANSCRIPTION_CACHE_DB': '',
+        'TRANSCRIPTION_SERVER_SOCKET': '',
+        'TRANSCRIPTION_SERVER_PORT': '0',
+        **env_overrides
+    }
+    process = subprocess.Popen(
+        [sys.executable, 'transcribe.py'], cwd=REPO_ROOT, env=env, text=True,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        for line in process.stdout:
+            if json.loads(line).get('ready'):
+                break
+        else:
+            pytest.fail("transcribe.py exited before it was ready")
+
+        for command in commands:
+            process.stdin.write(json.dumps(command) + "\n")
+        process.stdin.flush()
+
+        pending = {command['id'] for command in commands}
+        responses = {}
+        for line in process.stdout:
+            response = json.loads(line)
+            request_id = response.get('id')
+            if request_id in pending and not response.get('partial') and 'revision' not in response:
+                responses[request_id] = response
+                pending.discard(request_id)
+                if not pending:
+                    break
+        return responses
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=STARTUP_TIMEOUT_S)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+@pytest.mark.parametrize('env_overrides', [
+    {'TRANSCRIPTION_BATCH_SIZE': '1'},
+    {'TRANSCRIPTION_BATCH_SIZE': '4', 'TRANSCRIPTION_BATCH_WINDOW_MS': '500'}
+], ids=['single', 'batched'])
+def test_details_requests_are_answered(tmp_path, env_overrides):
+    commands = []
+    for i in range(4):
+        path = tmp_path / f"call-{i}.wav"
+        write_call(path, 2 + i)
+        command = {'command': 'transcribe', 'id': f"call-{i}", 'path': str(path)}
+        if i % 2 == 0:
+            command['details'] = True  # Mixed batch: details requests must not fail their neighbours
+        commands.append(command)
+
+    responses = run_worker(env_overrides, commands)
+
+    assert set(responses) == {command['id'] for command in commands}
+    for command in commands:
+        response = responses[command['id']]
+        assert 'error' not in response, response
+        assert 'transcription' in response
+        if command.get('details'):
+            assert 'segments' in response and 'audio_duration' in response
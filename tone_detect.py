@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 tone_detect.py - Two-tone and paging tone detection module
-Integrates with icad-tone-detection library for scanner audio analysis
+Detects in-process with the NumPy engine in tone_engine.py, falling back to the
+icad-tone-detection CLI/library for scanner audio analysis
 """
 
 import sys
@@ -9,6 +10,7 @@ import json
 import logging
 import os
 import tempfile
+import time
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 from urllib.parse import urlparse
@@ -30,14 +32,27 @@ logger = logging.getLogger(__name__)
 
 try:
     from icad_tone_detection import tone_detect
+    ICAD_AVAILABLE = True
     logger.info("✓ icad-tone-detection library loaded successfully")
 except ImportError as e:
-    logger.error(f"ERROR: icad-tone-detection not available: {e}")
-    logger.error("Run: pip install icad-tone-detection")
+    ICAD_AVAILABLE = False
+    logger.warning(f"icad-tone-detection not available ({e}), using the native tone engine only")
+
+try:
+    from audio_decode import AudioDecodeError, decode_to_float32
+    import tone_engine
+    NATIVE_ENGINE_AVAILABLE = True
+except ImportError as e:
+    NATIVE_ENGINE_AVAILABLE = False
+    logger.warning(f"Native tone engine not available: {e}")
+
+if not ICAD_AVAILABLE and not NATIVE_ENGINE_AVAILABLE:
+    logger.error("ERROR: no tone detection engine available")
+    logger.error("Run: pip install numpy (native engine) or pip install icad-tone-detection")
     sys.exit(1)
 
-def download_s3_file(s3_url: str) -> str:
-    """Download file from S3 using credentials from environment"""
+def _s3_location(s3_url: str):
+    """S3 client, bucket and key for an S3 URL, using credentials from environment"""
     if not BOTO3_AVAILABLE:
         raise ImportError("boto3 not available for S3 downloads")
     
@@ -50,21 +65,23 @@ def download_s3_file(s3_url: str) -> str:
     if len(path_parts) < 2:
         raise ValueError(f"Invalid S3 URL format: {s3_url}")
     
-    bucket_name = path_parts[0]
-    key = path_parts[1]
+    # Get S3 credentials from environment
+    s3_client = boto3.client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=os.getenv('S3_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('S3_SECRET_ACCESS_KEY'),
+        region_name=os.getenv('S3_REGION', 'us-east-1')
+    )
+    return s3_client, path_parts[0], path_parts[1]
+
+def download_s3_file(s3_url: str) -> str:
+    """Download file from S3 using credentials from environment"""
+    s3_client, bucket_name, key = _s3_location(s3_url)
     
     logger.info(f"Downloading from S3: bucket={bucket_name}, key={key}")
     
     try:
-        # Get S3 credentials from environment
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=os.getenv('S3_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('S3_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('S3_REGION', 'us-east-1')
-        )
-        
         # Create temporary file
         file_extension = Path(key).suffix or '.wav'
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
@@ -82,6 +99,18 @@ def download_s3_file(s3_url: str) -> str:
         logger.error(f"Failed to download from S3: {e}")
         raise
 
+def presign_s3_url(s3_url: str, expires_in: int = 300) -> str:
+    """
+    Short-lived presigned URL for an S3 object
+    
+    ffmpeg reads it over HTTP with range requests, so decoding only the start
+    of a call fetches only the start of the object instead of downloading it all.
+    """
+    s3_client, bucket_name, key = _s3_location(s3_url)
+    return s3_client.generate_presigned_url(
+        'get_object', Params={'Bucket': bucket_name, 'Key': key}, ExpiresIn=expires_in
+    )
+
 class ToneDetector:
     """Two-tone detection wrapper for icad-tone-detection library"""
     
@@ -266,6 +295,19 @@ class ToneDetector:
         # Apply user config over defaults
         self.detection_config = {**self.default_config, **self.config}
         
+        # 'native' detects in-process (milliseconds per call); 'icad' uses the CLI/library only
+        self.engine = os.getenv('TONE_DETECTION_ENGINE', self.config.get('engine', 'native')).lower()
+        if self.engine == 'native' and not NATIVE_ENGINE_AVAILABLE:
+            logger.warning("Native tone engine requested but not available, using icad-tone-detection")
+            self.engine = 'icad'
+        
+        # Prefix mode (native engine): analyse only the first seconds of a call, where paging tones are,
+        # widening the window while a tone is still sounding at its edge (0 = whole file)
+        self.prefix_window_s = float(os.getenv('TONE_PREFIX_WINDOW_S', self.config.get('prefix_window_s', 0)))
+        self.prefix_max_s = max(self.prefix_window_s, float(os.getenv('TONE_PREFIX_MAX_S', self.config.get('prefix_max_s', 30))))
+        if self.prefix_window_s > 0 and self.engine != 'native':
+            logger.warning("TONE_PREFIX_WINDOW_S needs the native tone engine, analysing whole files")
+        
         logger.info(f"ToneDetector initialized with config: {self.detection_config}")
     
     def detect_tones_in_file(self, audio_file_path: str) -> Dict[str, Any]:
@@ -283,10 +325,15 @@ class ToneDetector:
         # Handle S3 URLs by downloading them first
         local_file_path = audio_file_path
         temp_file_created = False
+        is_s3_url = audio_file_path.startswith('https://') and 's3' in audio_file_path
+        prefix_mode = self.engine == 'native' and self.prefix_window_s > 0
         
         try:
+            if is_s3_url and prefix_mode:
+                # ffmpeg streams the object and stops after the prefix window - no full download
+                local_file_path = presign_s3_url(audio_file_path)
             # Check if this is an S3 URL that needs downloading
-            if audio_file_path.startswith('https://') and 's3' in audio_file_path:
+            elif is_s3_url:
                 local_file_path = download_s3_file(audio_file_path)
                 temp_file_created = True
                 logger.info(f"Downloaded S3 file to: {local_file_path}")
@@ -300,6 +347,24 @@ class ToneDetector:
                     }
             # For non-S3 URLs, pass directly to icad-tone-detection
             
+            if self.engine == 'native':
+                try:
+                    if prefix_mode:
+                        return self._detect_prefix(
+                            lambda window: decode_to_float32(local_file_path, tone_engine.SAMPLE_RATE, max_seconds=window),
+                            audio_file_path
+                        )
+                    audio = decode_to_float32(local_file_path, tone_engine.SAMPLE_RATE)
+                    result = self._detect_samples(audio, audio_file_path)
+                    if temp_file_created and os.path.exists(local_file_path):
+                        os.unlink(local_file_path)
+                    return result
+                except (AudioDecodeError, OSError) as native_error:
+                    logger.warning(f"Native tone detection failed ({native_error}), falling back to icad-tone-detection")
+                    if is_s3_url and not temp_file_created:
+                        local_file_path = download_s3_file(audio_file_path)
+                        temp_file_created = True
+            
             logger.info(f"Analyzing audio file for two-tone: {audio_file_path}")
             
             # Try CLI approach first (more reliable)
@@ -313,6 +378,8 @@ class ToneDetector:
             
             # Fallback to Python API
             try:
+                if not ICAD_AVAILABLE:
+                    raise RuntimeError("icad-tone-detection is not installed")
                 # Call icad-tone-detection with our configuration
                 result = tone_detect(
                     local_file_path,
@@ -428,6 +495,70 @@ class ToneDetector:
                 'file_path': audio_file_path
             }
     
+    def detect_tones_in_audio(self, audio, file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Detect tones in already-decoded audio with the native engine
+        
+        Lets a caller that decoded the call for another purpose (transcription)
+        reuse its samples; prefix mode applies as it does to files.
+        
+        Args:
+            audio: Mono float32 samples at tone_engine.SAMPLE_RATE
+            file_path: Source of the audio, echoed in the result
+            
+        Returns:
+            Dictionary in the same shape as detect_tones_in_file(); detection_result
+            holds every call found, whatever its type
+        """
+        if self.prefix_window_s > 0:
+            return self._detect_prefix(lambda window: audio[:int(window * tone_engine.SAMPLE_RATE)], file_path)
+        return self._detect_samples(audio, file_path)
+    
+    def _detect_samples(self, audio, file_path: Optional[str]) -> Dict[str, Any]:
+        """Run the native engine over all of `audio` and build the detection result"""
+        start_time = time.perf_counter()
+        tones = tone_engine.detect_tones(audio, self.detection_config, tone_engine.SAMPLE_RATE)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        
+        for i, call in enumerate(tones.calls):
+            if isinstance(call, tone_engine.TwoToneCall):
+                logger.info(f"  Call {i+1}: Tone A = {call.tone_a:.1f}Hz, Tone B = {call.tone_b:.1f}Hz")
+            else:
+                logger.info(f"  Call {i+1}: Frequency = {call.frequency:.1f}Hz, Duration = {call.duration:.2f}s")
+        logger.info(f"Native tone detection completed in {elapsed_ms:.1f}ms: {tones.detected_type or 'none'}")
+        
+        return {
+            'has_two_tone': bool(tones.calls),  # Keep same name for compatibility
+            'detection_result': tones,
+            'detected_type': tones.detected_type,
+            'file_path': file_path,
+            'method': 'native',
+            'elapsed_ms': round(elapsed_ms, 1),
+            'analyzed_seconds': round(len(audio) / tone_engine.SAMPLE_RATE, 2)
+        }
+    
+    def _detect_prefix(self, read_prefix, file_path: Optional[str]) -> Dict[str, Any]:
+        """
+        Native detection over the start of a call only
+        
+        The window doubles (up to prefix_max_s) while a tone is still sounding
+        at its edge, so a sequence straddling the edge is measured in full.
+        
+        Args:
+            read_prefix: Returns the samples of the first `window` seconds (fewer if the call is shorter)
+            file_path: Original path, echoed in the result
+        """
+        window = self.prefix_window_s
+        while True:
+            audio = read_prefix(window)
+            result = self._detect_samples(audio, file_path)
+            # A short tail tolerance: ffmpeg may stop a few milliseconds short of -t
+            whole_call = len(audio) < (window - 0.1) * tone_engine.SAMPLE_RATE
+            if whole_call or not result['detection_result'].tone_at_end or window >= self.prefix_max_s:
+                return result
+            window = min(window * 2, self.prefix_max_s)
+            logger.info(f"Tone still sounding at the prefix window edge, widening to {window:.0f}s")
+    
     def _detect_with_cli(self, audio_file_path: str) -> Optional[Dict[str, Any]]:
         """Try detection using CLI interface (more reliable)"""
         import subprocess
@@ -557,7 +688,8 @@ class ToneDetector:
             detection_result: Result from detect_tones_in_file()
             
         Returns:
-            List of detected tone pairs [{'tone_a': freq1, 'tone_b': freq2}, ...]
+            List of detected tone pairs [{'tone_a': freq1, 'tone_b': freq2}, ...], followed by
+            single tones [{'detected': freq, 'length': seconds}, ...] (pulsed ones with 'cycles')
         """
         tones = []
         
@@ -576,6 +708,14 @@ class ToneDetector:
                     'duration_a': getattr(call, 'duration_a', 0.0),
                     'duration_b': getattr(call, 'duration_b', 0.0)
                 })
+            elif hasattr(call, 'frequency'):
+                tone = {
+                    'detected': float(call.frequency),
+                    'length': float(getattr(call, 'duration', 0.0) or 0.0)
+                }
+                if getattr(call, 'cycles', None) is not None:
+                    tone['cycles'] = call.cycles
+                tones.append(tone)
         
         return tones
 
@@ -588,12 +728,85 @@ def create_detector_from_env() -> ToneDetector:
     # We'll receive configuration from the parent process
     return ToneDetector(config)
 
+def detection_response(detector: ToneDetector, request_id: str, audio_file_path: str) -> Dict[str, Any]:
+    """
+    Run detection for one daemon request and build its JSON-safe response
+    
+    Args:
+        detector: Warm detector shared by all requests
+        request_id: Id echoed back so the client can match the response
+        audio_file_path: Local path or S3 URL of the call audio
+        
+    Returns:
+        Response with has_two_tone, detected_type, detected_tones and, for the
+        CLI detector, detection_result.cli_output (same shape as the one-shot output)
+    """
+    result = detector.detect_tones_in_file(audio_file_path)
+    response = {
+        'id': request_id,
+        'has_two_tone': result.get('has_two_tone', False),
+        'detected_type': result.get('detected_type'),
+        'detected_tones': detector.get_detected_tones(result),
+        'file_path': audio_file_path
+    }
+    detection_result = result.get('detection_result')
+    if isinstance(detection_result, dict) and 'cli_output' in detection_result:
+        response['detection_result'] = {'cli_output': detection_result['cli_output']}
+    elif NATIVE_ENGINE_AVAILABLE and isinstance(detection_result, tone_engine.ToneDetectionResult):
+        response['detection_result'] = {'cli_output': json.dumps(detection_result.to_cli_json())}
+    if 'error' in result:
+        response['error'] = result['error']
+    return response
+
+def serve(detector: ToneDetector) -> None:
+    """
+    Serve 'detect_tones' requests as JSON lines on stdin/stdout until stdin closes
+    
+    Each request is {"command": "detect_tones", "id": ..., "path": ...}; the
+    detector (and the icad/boto3 imports) stay warm between calls, so a call
+    costs only its own detection rather than a new interpreter.
+    """
+    # Responses own stdout; anything a library prints goes to stderr with the logs
+    responses = sys.stdout
+    sys.stdout = sys.stderr
+    
+    def send(payload: Dict[str, Any]) -> None:
+        responses.write(json.dumps(payload, default=str) + "\n")
+        responses.flush()
+    
+    send({'ready': True})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            command = json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to decode JSON command: {line[:200]} - Error: {e}")
+            continue
+        
+        request_id = command.get('id')
+        if command.get('command', 'detect_tones') != 'detect_tones':
+            send({'id': request_id, 'error': f"Invalid command: {command.get('command')}"})
+        elif not command.get('path'):
+            send({'id': request_id, 'error': "Tone detection requires 'path' parameter."})
+        else:
+            try:
+                send(detection_response(detector, request_id, command['path']))
+            except Exception as e:
+                send({'id': request_id, 'error': f"Error during tone detection: {str(e)}"})
+    logger.info("stdin closed, tone detection daemon exiting")
+
 def main():
-    """Main function for standalone testing"""
+    """Main function for standalone testing, or a long-running daemon with --serve"""
     if len(sys.argv) < 2:
-        print("Usage: python tone_detect.py <audio_file_path>", file=sys.stderr)
+        print("Usage: python tone_detect.py <audio_file_path> | --serve", file=sys.stderr)
         sys.exit(1)
     
+    if sys.argv[1] == '--serve':
+        serve(ToneDetector())
+        return
+    
     audio_file = sys.argv[1]
     
     # Create detector with default configuration
@@ -602,11 +815,14 @@ def main():
     # Detect tones
     result = detector.detect_tones_in_file(audio_file)
     
-    # Print results as JSON
-    print(json.dumps(result, indent=2))
+    # Print results as JSON (native results in the CLI's layout, which bot.js parses)
+    printable = result
+    if result.get('method') == 'native':
+        printable = {**result, 'detection_result': {'cli_output': json.dumps(result['detection_result'].to_cli_json())}}
+    print(json.dumps(printable, indent=2, default=str))
     
     # Get detected tone frequencies
-    tones = detector.get_detected_tones(result)
+    tones = [tone for tone in detector.get_detected_tones(result) if 'tone_a' in tone]
     if tones:
         print(f"\nDetected {len(tones)} two-tone sequence(s):", file=sys.stderr)
         for i, tone_pair in enumerate(tones):
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+tone_engine.py - In-process two-tone, long and pulsed tone detection
+A chunked NumPy STFT finds each frame's dominant in-band peak; runs of pure, steady
+peaks become tone segments, which the paging-tone rules then classify
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+MIN_FFT_SIZE = 2048         # Zero-padded FFT size; peaks are refined by interpolation anyway
+CHUNK_FRAMES = 512          # Frames transformed at once, bounding memory on long calls
+TONE_PURITY = 0.6           # Share of in-band energy within the tone bandwidth of the peak
+TWO_TONE_MAX_GAP_S = 0.5    # Longest silence allowed between tone A and tone B
+
+class TwoToneCall:
+    """A tone A / tone B paging sequence (attributes as icad-tone-detection's calls)"""
+
+    def __init__(self, tone_a: float, tone_b: float, duration_a: float, duration_b: float, start: float, end: float):
+        self.tone_a = tone_a
+        self.tone_b = tone_b
+        self.duration_a = duration_a
+        self.duration_b = duration_b
+        self.start = start
+        self.end = end
+
+class LongToneCall:
+    """A single steady tone"""
+
+    def __init__(self, frequency: float, duration: float, start: float, end: float):
+        self.frequency = frequency
+        self.duration = duration
+        self.start = start
+        self.end = end
+
+class PulsedCall:
+    """A tone keyed on and off repeatedly at one frequency"""
+
+    def __init__(self, frequency: float, cycles: int, duration: float, start: float, end: float):
+        self.frequency = frequency
+        self.cycles = cycles
+        self.duration = duration
+        self.start = start
+        self.end = end
+
+class ToneDetectionResult:
+    """Calls found in one clip, by type"""
+
+    def __init__(self, two_tone: List[TwoToneCall], long_tone: List[LongToneCall], pulsed: List[PulsedCall],
+                 tone_at_end: bool = False):
+        self.two_tone = two_tone
+        self.long_tone = long_tone
+        self.pulsed = pulsed
+        self.tone_at_end = tone_at_end  # A tone was still sounding in the last frame analysed
+
+    @property
+    def calls(self) -> List[Any]:
+        """Every call, two-tone sequences first"""
+        return [*self.two_tone, *self.pulsed, *self.long_tone]
+
+    @property
+    def detected_type(self) -> Optional[str]:
+        """'two-tone', 'pulsed', 'long', several joined with '+', or None"""
+        types = [name for name, calls in (('two-tone', self.two_tone), ('pulsed', self.pulsed), ('long', self.long_tone)) if calls]
+        return "+".join(types) if types else None
+
+    def to_cli_json(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The same result in icad-tone-detect's JSON output layout"""
+        return {
+            'two_tone': [{'tone_id': i + 1, 'detected': [round(c.tone_a, 1), round(c.tone_b, 1)],
+                          'tone_a_length': round(c.duration_a, 2), 'tone_b_length': round(c.duration_b, 2),
+                          'start': round(c.start, 2), 'end': round(c.end, 2)} for i, c in enumerate(self.two_tone)],
+            'long_tone': [{'tone_id': i + 1, 'detected': round(c.frequency, 1), 'length': round(c.duration, 2),
+                           'start': round(c.start, 2), 'end': round(c.end, 2)} for i, c in enumerate(self.long_tone)],
+            'pulsed': [{'tone_id': i + 1, 'detected': round(c.frequency, 1), 'cycles': c.cycles, 'length': round(c.duration, 2),
+                        'start': round(c.start, 2), 'end': round(c.end, 2)} for i, c in enumerate(self.pulsed)]
+        }
+
+class ToneSegment:
+    """A run of consecutive tonal frames at one frequency"""
+
+    def __init__(self, start: float, end: float, frequency: float):
+        self.start = start
+        self.end = end
+        self.frequency = frequency
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+def frame_peaks(audio: np.ndarray, sample_rate: int, hop_ms: float, band: List[float], bw_hz: float,
+                snr_db: float, silence_db: float):
+    """
+    Dominant in-band frequency of each STFT frame, and whether the frame holds a tone
+
+    A frame is tonal when most of its in-band energy sits within `bw_hz` of
+    the peak, the peak stands `snr_db` above the band's median bin and the
+    frame is no more than `silence_db` below the loudest frame.
+
+    Returns:
+        Tuple of (frequencies, tonal mask, hop in seconds)
+    """
+    hop = max(1, int(sample_rate * hop_ms / 1000))
+    window_size = 2 * hop
+    if len(audio) < window_size:
+        return np.empty(0), np.empty(0, dtype=bool), hop / sample_rate
+
+    n_fft = max(MIN_FFT_SIZE, 1 << (window_size - 1).bit_length())
+    bin_hz = sample_rate / n_fft
+    low = max(1, int(np.ceil(band[0] / bin_hz)))
+    high = min(n_fft // 2 - 1, int(band[1] / bin_hz))
+    half_width = max(1, int(np.ceil(bw_hz / bin_hz)))
+    window = np.hanning(window_size).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, window_size)[::hop]
+
+    frequencies = np.empty(len(frames))
+    purity = np.empty(len(frames))
+    snr = np.empty(len(frames))
+    level = np.empty(len(frames))
+    for chunk_start in range(0, len(frames), CHUNK_FRAMES):
+        chunk = slice(chunk_start, chunk_start + CHUNK_FRAMES)
+        power = np.abs(np.fft.rfft(frames[chunk] * window, n=n_fft, axis=1)) ** 2
+        band_power = power[:, low - 1:high + 2]  # One guard bin each side for interpolation
+        inner = band_power[:, 1:-1]
+        rows = np.arange(len(inner))
+        peak = inner.argmax(axis=1)
+
+        # Parabolic interpolation on log power refines the peak to a fraction of a bin
+        left, centre, right = (np.log(band_power[rows, peak + offset] + 1e-20) for offset in (0, 1, 2))
+        denominator = left - 2 * centre + right
+        shift = np.where(np.abs(denominator) > 1e-12, 0.5 * (left - right) / np.where(denominator == 0, 1, denominator), 0.0)
+        frequencies[chunk] = (low + peak + np.clip(shift, -0.5, 0.5)) * bin_hz
+
+        # Energy within the tone bandwidth of the peak, from a running sum across the band
+        total = inner.sum(axis=1) + 1e-20
+        cumulative = np.concatenate([np.zeros((len(inner), 1)), np.cumsum(inner, axis=1)], axis=1)
+        upper = np.minimum(peak + half_width + 1, inner.shape[1])
+        lower = np.maximum(peak - half_width, 0)
+        purity[chunk] = (cumulative[rows, upper] - cumulative[rows, lower]) / total
+        snr[chunk] = 10 * np.log10(inner[rows, peak] / (np.median(inner, axis=1) + 1e-20) + 1e-20)
+        level[chunk] = 10 * np.log10(total)
+
+    tonal = (purity >= TONE_PURITY) & (snr >= snr_db) & (level >= level.max() + silence_db)
+    return frequencies, tonal, hop / sample_rate
+
+def tone_segments(frequencies: np.ndarray, tonal: np.ndarray, hop_s: float, tolerance_pct: float,
+                  tolerance_hz: float, merge_gap_s: float = 0.0) -> List[ToneSegment]:
+    """
+    Group consecutive tonal frames that stay on one frequency into segments
+
+    A frame continues the current segment while it is within the larger of
+    `tolerance_hz` and `tolerance_pct` percent of the segment's running mean.
+    Segments on the same frequency separated by at most `merge_gap_s` are joined.
+    """
+    segments = []
+    start = None
+    total = 0.0
+    count = 0
+    for index, (frequency, is_tonal) in enumerate(zip(frequencies, tonal)):
+        if start is not None:
+            mean = total / count
+            if is_tonal and abs(frequency - mean) <= max(tolerance_hz, mean * tolerance_pct / 100):
+                total += frequency
+                count += 1
+                continue
+            segments.append(ToneSegment(start * hop_s, index * hop_s, mean))
+            start = None
+        if is_tonal:
+            start, total, count = index, frequency, 1
+    if start is not None:
+        segments.append(ToneSegment(start * hop_s, len(frequencies) * hop_s, total / count))
+
+    if merge_gap_s <= 0:
+        return segments
+    merged = []
+    for segment in segments:
+        previous = merged[-1] if merged else None
+        if (previous and segment.start - previous.end <= merge_gap_s
+                and abs(segment.frequency - previous.frequency) <= max(tolerance_hz, previous.frequency * tolerance_pct / 100)):
+            weight = previous.duration / (previous.duration + segment.duration)
+            previous.frequency = previous.frequency * weight + segment.frequency * (1 - weight)
+            previous.end = segment.end
+        else:
+            merged.append(segment)
+    return merged
+
+def find_two_tone(segments: List[ToneSegment], config: Dict[str, Any]) -> List[TwoToneCall]:
+    """Tone A directly followed by a different, longer-held tone B"""
+    calls = []
+    used = set()
+    for index in range(len(segments) - 1):
+        tone_a, tone_b = segments[index], segments[index + 1]
+        if (index in used or tone_b.start - tone_a.end > TWO_TONE_MAX_GAP_S
+                or tone_a.duration < config.get('tone_a_min_length', 0.85)
+                or tone_b.duration < config.get('tone_b_min_length', 2.6)
+                or abs(tone_b.frequency - tone_a.frequency) < config.get('two_tone_min_pair_separation_hz', 40)):
+            continue
+        calls.append(TwoToneCall(tone_a.frequency, tone_b.frequency, tone_a.duration, tone_b.duration, tone_a.start, tone_b.end))
+        used.update((index, index + 1))
+    for index in sorted(used, reverse=True):
+        del segments[index]  # Their tones are accounted for - not long tones as well
+    return calls
+
+def find_pulsed(segments: List[ToneSegment], config: Dict[str, Any]) -> List[PulsedCall]:
+    """Runs of short tone bursts on one frequency with regular gaps"""
+    min_on, max_on = config.get('pulsed_min_on_ms', 50) / 1000, config.get('pulsed_max_on_ms', 500) / 1000
+    min_off, max_off = config.get('pulsed_min_off_ms', 25) / 1000, config.get('pulsed_max_off_ms', 800) / 1000
+    bw_hz = config.get('pulsed_bw_hz', 50)
+    min_cycles = config.get('pulsed_min_cycles', 3)
+
+    calls = []
+    used = []
+    run = []
+    for index, segment in enumerate(segments + [None]):
+        burst = segment is not None and min_on <= segment.duration <= max_on
+        if burst and run:
+            previous = segments[run[-1]]
+            burst_continues = (min_off <= segment.start - previous.end <= max_off
+                               and abs(segment.frequency - previous.frequency) <= bw_hz)
+            if burst_continues:
+                run.append(index)
+                continue
+        if len(run) >= min_cycles:
+            bursts = [segments[i] for i in run]
+            frequency = float(np.median([b.frequency for b in bursts]))
+            calls.append(PulsedCall(frequency, len(run), bursts[-1].end - bursts[0].start, bursts[0].start, bursts[-1].end))
+            used.extend(run)
+        run = [index] if burst else []
+    for index in sorted(used, reverse=True):
+        del segments[index]
+    return calls
+
+def find_long(segments: List[ToneSegment], config: Dict[str, Any]) -> List[LongToneCall]:
+    """Single tones held for at least long_tone_min_length seconds"""
+    min_length = config.get('long_tone_min_length', 0.5)
+    return [LongToneCall(s.frequency, s.duration, s.start, s.end) for s in segments if s.duration >= min_length]
+
+def detect_tones(audio: np.ndarray, config: Dict[str, Any], sample_rate: int = SAMPLE_RATE) -> ToneDetectionResult:
+    """
+    Detect paging tones in mono float samples using a ToneDetector detection_config
+
+    Args:
+        audio: Mono float32 samples
+        config: detect_two_tone / detect_pulsed / detect_long switches plus their
+            length, bandwidth and separation settings, time_resolution_ms,
+            matching_threshold (percent frequency tolerance) and the fe_* front-end settings
+        sample_rate: Sample rate of `audio`
+
+    Returns:
+        Calls found, by type
+    """
+    band = [float(f) for f in str(config.get('fe_freq_band', '200,3000')).split(',')]
+    enabled_bandwidths = [config.get(key, 25) for switch, key in (
+        ('detect_two_tone', 'two_tone_bw_hz'), ('detect_pulsed', 'pulsed_bw_hz'), ('detect_long', 'long_tone_bw_hz')
+    ) if config.get(switch)]
+    bw_hz = min(enabled_bandwidths) if enabled_bandwidths else 25
+
+    frequencies, tonal, hop_s = frame_peaks(
+        np.asarray(audio, dtype=np.float32), sample_rate, config.get('time_resolution_ms', 50), band, bw_hz,
+        config.get('fe_snr_above_noise_db', 6.0), -abs(config.get('fe_silence_below_global_db', -28.0))
+    )
+    segments = tone_segments(frequencies, tonal, hop_s, config.get('matching_threshold', 2.5), bw_hz / 2,
+                             config.get('fe_merge_short_gaps_ms', 0) / 1000)
+    tone_at_end = bool(segments) and segments[-1].end >= len(frequencies) * hop_s
+
+    # Two-tone first, then pulsed; each claims its segments so they are not reported again as long tones
+    two_tone = find_two_tone(segments, config) if config.get('detect_two_tone') else []
+    pulsed = find_pulsed(segments, config) if config.get('detect_pulsed') else []
+    long_tone = find_long(segments, config) if config.get('detect_long') else []
+    return ToneDetectionResult(two_tone, long_tone, pulsed, tone_at_end)
@@ -1,16 +1,29 @@
 # persistent_transcribe.py
 # Enhanced with OpenAI-style prompting support for better scanner audio transcription
+import time
+STARTUP_BEGIN = time.perf_counter()  # Start of the startup profile
 import sys
 import io
-import torch
 import warnings
 import os
 import json
 import logging
 import base64
+import gc
+import mmap
+import socket
+import queue
+import threading
+import concurrent.futures
+import shutil
+import zlib
 import numpy as np
-from pydub import AudioSegment
 from dotenv import load_dotenv
+from audio_decode import SAMPLE_RATE, AudioDecodeError, decode_to_float32
+from transcription_cache import TranscriptionCache, make_cache_key
+from audio_fingerprint import SimulcastIndex, compute_fingerprint
+from quality_control import AdaptiveQualityController, build_tiers
+from request_scheduler import DEFAULT_PRIORITY, SchedulingQueue, priority_class, schedule_key
 
 # Import tone detection module
 try:
@@ -22,6 +35,15 @@ except ImportError as e:
     TONE_DETECTION_AVAILABLE = False
     print(f"WARNING: Tone detection not available: {e}", file=sys.stderr)
 
+# Startup profile: stage name -> milliseconds, logged and sent with the ready signal
+startup_timings = {'imports_ms': round((time.perf_counter() - STARTUP_BEGIN) * 1000, 1)}
+
+def record_startup_stage(name, stage_start):
+    """Record a startup stage's duration and return the start time of the next one"""
+    now = time.perf_counter()
+    startup_timings[f'{name}_ms'] = round((now - stage_start) * 1000, 1)
+    return now
+
 # Suppress specific CUDA compatibility warnings for newer GPUs
 warnings.filterwarnings("ignore", message=".*CUDA capability.*not compatible.*")
 warnings.filterwarnings("ignore", message=".*with CUDA capability.*")
@@ -34,6 +56,90 @@ WHISPER_MODEL = os.getenv('WHISPER_MODEL')
 TRANSCRIPTION_DEVICE = os.getenv('TRANSCRIPTION_DEVICE')
 OPENAI_TRANSCRIPTION_PROMPT = os.getenv('OPENAI_TRANSCRIPTION_PROMPT')
 
+# Number of concurrent inference workers sharing the loaded model (1 = sequential)
+TRANSCRIPTION_WORKERS = max(1, int(os.getenv('TRANSCRIPTION_WORKERS', '1')))
+
+# Cross-request batching: collect up to N queued calls for a short window and decode them together (1 = off)
+TRANSCRIPTION_BATCH_SIZE = max(1, int(os.getenv('TRANSCRIPTION_BATCH_SIZE', '1')))
+TRANSCRIPTION_BATCH_WINDOW_MS = max(0, int(os.getenv('TRANSCRIPTION_BATCH_WINDOW_MS', '50')))
+
+# Decode stage: threads decoding upcoming calls, and how many decoded calls may wait for the inference workers
+TRANSCRIPTION_DECODE_WORKERS = max(1, int(os.getenv('TRANSCRIPTION_DECODE_WORKERS', '2')))
+TRANSCRIPTION_PREFETCH = max(1, int(os.getenv('TRANSCRIPTION_PREFETCH', '4')))
+
+# Tone detection threads, fed by their own queue so tone checks never wait behind queued transcriptions
+TONE_DETECTION_WORKERS = max(1, int(os.getenv('TONE_DETECTION_WORKERS', '1')))
+
+# Backpressure: clients are told how many more requests they may send ({"credits": n, "in_flight": m})
+# on ready, after every finished request and in the heartbeat. The pipeline holds decode workers +
+# prefetched calls + inference workers; each queued call is budgeted CALL_MEMORY_MB of RAM and
+# MEMORY_RESERVE_MB is always left free. In server mode each connected client gets an equal share of MAX_IN_FLIGHT
+TRANSCRIPTION_MAX_IN_FLIGHT = max(1, int(os.getenv(
+    'TRANSCRIPTION_MAX_IN_FLIGHT', str(TRANSCRIPTION_WORKERS + TRANSCRIPTION_DECODE_WORKERS + TRANSCRIPTION_PREFETCH))))
+TRANSCRIPTION_CALL_MEMORY_MB = max(1, int(os.getenv('TRANSCRIPTION_CALL_MEMORY_MB', '64')))
+TRANSCRIPTION_MEMORY_RESERVE_MB = max(0, int(os.getenv('TRANSCRIPTION_MEMORY_RESERVE_MB', '1024')))
+
+# Directory holding named shared-memory segments for the zero-copy audio handoff (tmpfs)
+TRANSCRIPTION_SHM_DIR = os.getenv('TRANSCRIPTION_SHM_DIR', '/dev/shm')
+
+# Server mode: listen on a Unix socket or localhost TCP port instead of serving a single parent over stdin
+TRANSCRIPTION_SERVER_SOCKET = os.getenv('TRANSCRIPTION_SERVER_SOCKET')
+TRANSCRIPTION_SERVER_HOST = os.getenv('TRANSCRIPTION_SERVER_HOST', '127.0.0.1')
+TRANSCRIPTION_SERVER_PORT = int(os.getenv('TRANSCRIPTION_SERVER_PORT', '0'))
+SERVER_MODE = bool(TRANSCRIPTION_SERVER_SOCKET or TRANSCRIPTION_SERVER_PORT)
+
+# Run the old per-call ffprobe integrity check before decoding (validation normally happens during decode)
+TRANSCRIPTION_FFPROBE_CHECK = os.getenv('TRANSCRIPTION_FFPROBE_CHECK', 'false').lower() == 'true'
+
+# Result cache for byte-identical calls: in-memory LRU entries (0 = off) and optional SQLite file
+TRANSCRIPTION_CACHE_SIZE = max(0, int(os.getenv('TRANSCRIPTION_CACHE_SIZE', '1000')))
+TRANSCRIPTION_CACHE_DB = os.getenv('TRANSCRIPTION_CACHE_DB')
+
+# Simulcast dedup: reuse the transcription of a near-identical call on the same talkgroup within the window
+TRANSCRIPTION_SIMULCAST_DEDUP = os.getenv('TRANSCRIPTION_SIMULCAST_DEDUP', 'false').lower() == 'true'
+TRANSCRIPTION_SIMULCAST_WINDOW_S = float(os.getenv('TRANSCRIPTION_SIMULCAST_WINDOW_S', '15'))
+TRANSCRIPTION_SIMULCAST_MAX_BER = float(os.getenv('TRANSCRIPTION_SIMULCAST_MAX_BER', '0.3'))
+
+# Seconds of audio given to the cheap no-VAD pass when VAD finds no speech (0 = return empty without a pass)
+TRANSCRIPTION_NO_SPEECH_WINDOW_S = max(0.0, float(os.getenv('TRANSCRIPTION_NO_SPEECH_WINDOW_S', '30')))
+
+# Adaptive quality: step down to greedy decoding / tight VAD when the expected wait for queued calls
+# passes these many seconds, and back up once the backlog drains
+TRANSCRIPTION_ADAPTIVE_QUALITY = os.getenv('TRANSCRIPTION_ADAPTIVE_QUALITY', 'false').lower() == 'true'
+TRANSCRIPTION_ADAPTIVE_REDUCED_S = float(os.getenv('TRANSCRIPTION_ADAPTIVE_REDUCED_S', '30'))
+TRANSCRIPTION_ADAPTIVE_MINIMAL_S = float(os.getenv('TRANSCRIPTION_ADAPTIVE_MINIMAL_S', '90'))
+
+# Model cascade: a small draft model answers every call and WHISPER_MODEL re-decodes only uncertain
+# results or priority talkgroups, sent later as a 'revision' under the same id
+TRANSCRIPTION_DRAFT_MODEL = os.getenv('TRANSCRIPTION_DRAFT_MODEL')
+TRANSCRIPTION_REFINE_MIN_LOGPROB = float(os.getenv('TRANSCRIPTION_REFINE_MIN_LOGPROB', '-0.7'))
+TRANSCRIPTION_REFINE_MAX_NO_SPEECH = float(os.getenv('TRANSCRIPTION_REFINE_MAX_NO_SPEECH', '0.4'))
+TRANSCRIPTION_REFINE_MAX_COMPRESSION = float(os.getenv('TRANSCRIPTION_REFINE_MAX_COMPRESSION', '2.0'))
+TRANSCRIPTION_REFINE_TALKGROUPS = {tg.strip() for tg in os.getenv('TRANSCRIPTION_REFINE_TALKGROUPS', '').split(',') if tg.strip()}
+TRANSCRIPTION_REFINE_QUEUE = max(1, int(os.getenv('TRANSCRIPTION_REFINE_QUEUE', '20')))
+
+# Scheduling: queued calls run by priority class (emergency flag, 'priority' field, these talk groups),
+# then by deadline in slots of SLOT_MS (shortest call first within a slot); calls without deadline_ms
+# are ordered as if due DEFAULT_DEADLINE_S after arrival
+TRANSCRIPTION_PRIORITY_TALKGROUPS = {tg.strip() for tg in os.getenv('TRANSCRIPTION_PRIORITY_TALKGROUPS', '').split(',') if tg.strip()}
+TRANSCRIPTION_SCHEDULER_SLOT_MS = max(0, int(os.getenv('TRANSCRIPTION_SCHEDULER_SLOT_MS', '5000')))
+TRANSCRIPTION_DEFAULT_DEADLINE_S = float(os.getenv('TRANSCRIPTION_DEFAULT_DEADLINE_S', '60'))
+
+# Run a short synthetic transcription before signalling ready, so the first real call runs at steady-state speed
+TRANSCRIPTION_WARMUP = os.getenv('TRANSCRIPTION_WARMUP', 'true').lower() == 'true'
+
+# Fork server: run the worker as a forked child of a supervisor, and replace it when a request goes
+# unanswered for TRANSCRIPTION_CHILD_TIMEOUT_S (kept under bot.js's 90s timeout). The optional warm
+# spare loads its own copy of the model, doubling RAM/VRAM use
+TRANSCRIPTION_FORK_SERVER = os.getenv('TRANSCRIPTION_FORK_SERVER', 'false').lower() == 'true'
+TRANSCRIPTION_CHILD_TIMEOUT_S = float(os.getenv('TRANSCRIPTION_CHILD_TIMEOUT_S', '75'))
+TRANSCRIPTION_FORK_SPARE = os.getenv('TRANSCRIPTION_FORK_SPARE', 'false').lower() == 'true'
+if TRANSCRIPTION_FORK_SERVER and TRANSCRIPTION_FORK_SPARE and TRANSCRIPTION_DEVICE == 'cuda':
+    print("WARNING: TRANSCRIPTION_FORK_SPARE keeps a second model on the GPU; make sure VRAM holds both", file=sys.stderr)
+if TRANSCRIPTION_FORK_SERVER:
+    # The supervisor must not initialize CUDA before forking; have torch query availability through NVML
+    os.environ.setdefault('PYTORCH_NVML_BASED_CUDA_CHECK', '1')
+
 # Validate required environment variables
 required_vars = ['WHISPER_MODEL', 'TRANSCRIPTION_DEVICE']
 missing_vars = [var for var in required_vars if os.getenv(var) is None]
@@ -58,13 +164,14 @@ def validate_startup_environment():
             print(f"ERROR: Python 3.8+ required, found {python_version.major}.{python_version.minor}", file=sys.stderr)
             return False
         
-        # Check critical imports
-        try:
-            import torch
-            print(f"✓ PyTorch {torch.__version__} available", file=sys.stderr)
-        except ImportError as e:
-            print(f"ERROR: PyTorch not available: {e}", file=sys.stderr)
-            return False
+        # Check critical imports; PyTorch is only used to query GPU devices, so CPU startup skips it
+        if TRANSCRIPTION_DEVICE in ('cuda', 'mps'):
+            try:
+                import torch
+                print(f"✓ PyTorch {torch.__version__} available", file=sys.stderr)
+            except ImportError as e:
+                print(f"ERROR: PyTorch not available: {e}", file=sys.stderr)
+                return False
             
         try:
             from faster_whisper import WhisperModel
@@ -73,12 +180,11 @@ def validate_startup_environment():
             print(f"ERROR: faster-whisper not available: {e}", file=sys.stderr)
             return False
             
-        try:
-            from pydub import AudioSegment
-            print("✓ pydub available", file=sys.stderr)
-        except ImportError as e:
-            print(f"ERROR: pydub not available: {e}", file=sys.stderr)
-            return False
+        # ffmpeg decodes every call; without it faster-whisper's slower PyAV decoder is used
+        if shutil.which('ffmpeg'):
+            print("✓ ffmpeg available", file=sys.stderr)
+        else:
+            print("WARNING: ffmpeg not found on PATH, falling back to PyAV decoding", file=sys.stderr)
             
         # Check device availability
         if TRANSCRIPTION_DEVICE == 'cuda':
@@ -90,6 +196,8 @@ def validate_startup_environment():
                 if hasattr(torch.backends, 'mps'):
                     print(f"  MPS: {torch.backends.mps.is_available()}", file=sys.stderr)
                 return False
+            elif TRANSCRIPTION_FORK_SERVER:
+                print("✓ CUDA available", file=sys.stderr)  # Naming the device would initialize CUDA before the fork
             else:
                 print(f"✓ CUDA available: {torch.cuda.get_device_name()}", file=sys.stderr)
         
@@ -105,9 +213,11 @@ def validate_startup_environment():
         return False
 
 # Run startup validation
+stage_start = time.perf_counter()
 if not validate_startup_environment():
     print("FATAL: Environment validation failed", file=sys.stderr)
     sys.exit(1)
+stage_start = record_startup_stage('validation', stage_start)
 
 # Configure logging to send INFO and above to stderr
 logging.basicConfig(
@@ -123,7 +233,9 @@ warnings.filterwarnings("ignore")
 
 # Import faster_whisper here
 try:
-    from faster_whisper import WhisperModel
+    from faster_whisper import WhisperModel, decode_audio
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.vad import SpeechTimestampsMap, VadOptions, get_speech_timestamps
 except ImportError:
     error_msg = "faster_whisper not installed. Run: pip install faster-whisper"
     print(error_msg, file=sys.stderr)
@@ -131,6 +243,8 @@ except ImportError:
 
 # Check device availability
 device = TRANSCRIPTION_DEVICE
+if device in ('mps', 'cuda'):
+    import torch  # Only needed to query GPU availability
 # Check for MPS availability on macOS ARM
 if device == "mps" and not torch.backends.mps.is_available():
     logger.warning("MPS requested but not available. Checking for CUDA...")
@@ -158,14 +272,40 @@ else:
     compute_type = "int8"
     logger.info("Using int8 compute type for CPU device.")
 
+# Where the models are loaded from; the fork server substitutes resolved local paths
+whisper_model_source = WHISPER_MODEL
+draft_model_source = TRANSCRIPTION_DRAFT_MODEL
+
+# Fork server: everything above ran once in the supervisor; the model is loaded below in each forked
+# worker, since CTranslate2's thread pools and CUDA contexts do not survive fork()
+if TRANSCRIPTION_FORK_SERVER and SERVER_MODE:
+    logger.warning("TRANSCRIPTION_FORK_SERVER is ignored in server mode")
+elif TRANSCRIPTION_FORK_SERVER and not hasattr(os, 'fork'):
+    logger.warning("TRANSCRIPTION_FORK_SERVER needs fork(), which this platform lacks; running a single worker")
+elif TRANSCRIPTION_FORK_SERVER:
+    from faster_whisper.utils import download_model
+    from fork_server import ForkServer
+    # Resolve (and if needed download) the models once, so workers only have to load them
+    try:
+        if not os.path.isdir(WHISPER_MODEL):
+            whisper_model_source = download_model(WHISPER_MODEL, cache_dir="./models")
+        if TRANSCRIPTION_DRAFT_MODEL and not os.path.isdir(TRANSCRIPTION_DRAFT_MODEL):
+            draft_model_source = download_model(TRANSCRIPTION_DRAFT_MODEL, cache_dir="./models")
+    except Exception as e:
+        logger.warning(f"Could not resolve model files before forking, workers will load by name: {e}")
+    stage_start = record_startup_stage('fork_server', stage_start)
+    ForkServer(TRANSCRIPTION_CHILD_TIMEOUT_S, keep_spare=TRANSCRIPTION_FORK_SPARE).run()  # Returns only inside a forked worker
+    logger.info(f"Transcription worker forked (PID: {os.getpid()})")
+    stage_start = time.perf_counter()
+
 # Load the Faster Whisper model with optimizations for high-volume systems
 try:
     model = WhisperModel(
-        WHISPER_MODEL,
+        whisper_model_source,
         device=device,
         compute_type=compute_type,
         download_root="./models",  # Cache models locally
-        num_workers=1,  # Single worker to avoid memory issues under high load
+        num_workers=TRANSCRIPTION_WORKERS,  # One CTranslate2 replica slot per inference worker thread
         cpu_threads=0  # Use default CPU threads (auto-detect)
     )
     logger.info(f"Loaded model: {WHISPER_MODEL} on {device} with compute_type: {compute_type}")
@@ -178,6 +318,24 @@ except Exception as e:
     print(error_msg, file=sys.stderr)
     sys.exit(1)
 
+# Load the draft model for the cascade; without it WHISPER_MODEL handles every call directly
+draft_model = None
+if TRANSCRIPTION_DRAFT_MODEL:
+    try:
+        draft_model = WhisperModel(
+            draft_model_source,
+            device=device,
+            compute_type=compute_type,
+            download_root="./models",
+            num_workers=TRANSCRIPTION_WORKERS,
+            cpu_threads=0
+        )
+        logger.info(f"Loaded draft model: {TRANSCRIPTION_DRAFT_MODEL}; {WHISPER_MODEL} re-decodes uncertain calls")
+    except Exception as e:
+        logger.warning(f"Could not load draft model {TRANSCRIPTION_DRAFT_MODEL}, using {WHISPER_MODEL} for every call: {e}")
+first_pass_model = draft_model or model
+stage_start = record_startup_stage('model_load', stage_start)
+
 # Initialize tone detector if available
 tone_detector = None
 if TONE_DETECTION_AVAILABLE:
@@ -197,253 +355,1637 @@ if TONE_DETECTION_AVAILABLE:
     except Exception as e:
         logger.warning(f"Failed to initialize tone detector: {e}")
         tone_detector = None
+stage_start = record_startup_stage('tone_detector', stage_start)
 
-# Signal that the model is loaded and ready
-print(json.dumps({"ready": True}))
-sys.stdout.flush()
+class ResponseChannel:
+    """JSON-lines writer for one client (stdout or a socket connection)"""
 
-# Track last heartbeat time
-import time
-last_heartbeat = time.time()
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.closed = False
+        self.in_flight = set()  # Ids of this client's unanswered requests, for its credits
+        # Serialise writes so responses from concurrent workers never interleave
+        self.lock = threading.Lock()
+
+    def send(self, payload):
+        """Write a single JSON response line, dropping it if the client has gone away"""
+        data = (json.dumps(payload) + "\n").encode('utf-8')
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.stream.write(data)
+                self.stream.flush()
+            except (OSError, ValueError) as e:
+                self.closed = True
+                logger.warning(f"Dropping responses for {self.name}: {e}")
+
+stdout_channel = ResponseChannel(sys.stdout.buffer, "stdout")
 
-# Main loop to process commands
-while True:
+# Request id -> channel of the client that sent it; unknown ids answer on stdout
+response_routes = {}
+# Socket clients currently connected in server mode
+client_channels = set()
+clients_lock = threading.Lock()
+
+def send_response(payload):
+    """Send a JSON response to the client that issued the request"""
+    response_routes.get(payload.get('id'), stdout_channel).send(payload)
+
+def broadcast(payload, with_credits=False):
+    """Send a message that is not tied to a request (heartbeat) to every client, with its own credits if asked"""
+    with clients_lock:
+        channels = [stdout_channel] + list(client_channels)
+    for channel in channels:
+        channel.send({**payload, **credit_message(channel)} if with_credits else payload)
+
+def send_started(request_ids):
+    """Tell clients their requests have left the queues and are being worked on, so timeouts can start then"""
+    for request_id in request_ids:
+        send_response({"id": request_id, "started": True})
+
+def send_error(request_id, error_detail, **extra):
+    """Send an error response for a request"""
+    send_response({"id": request_id, "error": error_detail, **extra})
+
+# Longest a finished 'analyze' transcription waits for its tone result before answering without it
+TONE_ANALYSIS_WAIT_S = 10
+
+def tone_fields(detection_result):
+    """Response fields describing a ToneDetector result"""
+    return {
+        "has_two_tone": detection_result.get('has_two_tone', False),
+        "detected_type": detection_result.get('detected_type'),
+        "detected_tones": tone_detector.get_detected_tones(detection_result)
+    }
+
+def handle_tone_detection(request_id, command):
+    """Run tone detection for a 'detect_tones' command and send the result"""
+    if not TONE_DETECTION_AVAILABLE or not tone_detector:
+        send_error(request_id, "Tone detection is not available. Please install icad-tone-detection.")
+        return
+    if 'path' not in command:
+        send_error(request_id, "Tone detection requires 'path' parameter.")
+        return
+
+    audio_file_path = command['path']
+    if not os.path.isfile(audio_file_path):
+        send_error(request_id, f"Audio file does not exist: {audio_file_path}")
+        return
+
+    logger.info(f"Processing tone detection request ID: {request_id} for file: {audio_file_path}")
     try:
-        # Send periodic heartbeat to show process is alive during quiet periods
-        current_time = time.time()
-        if current_time - last_heartbeat > 300:  # 5 minutes
-            print(json.dumps({"heartbeat": True, "timestamp": current_time}))
-            sys.stdout.flush()
-            last_heartbeat = current_time
-        
-        # Read command from stdin with timeout handling
-        line = sys.stdin.readline().strip()
+        detection_result = tone_detector.detect_tones_in_file(audio_file_path)
+        response = {"id": request_id, **tone_fields(detection_result), "file_path": audio_file_path}
+
+        if 'error' in detection_result:
+            response['error'] = detection_result['error']
+
+        logger.info(f"Tone detection completed for ID {request_id}: {response['has_two_tone']}")
+        send_response(response)
+    except Exception as e:
+        send_error(request_id, f"Error during tone detection: {str(e)}")
+
+# Decoding parameters shared by every transcription
+TRANSCRIPTION_PARAMS = {
+    'language': 'en',
+    'beam_size': 3,  # Reduced from 5 to 3 for faster processing
+    'vad_filter': True,
+    'vad_parameters': {"min_silence_duration_ms": 750},  # Increased threshold for busy systems
+    'word_timestamps': False,  # Disable word timestamps for speed
+    'condition_on_previous_text': False  # Disable for better performance
+}
+
+# Everything besides the audio that changes the result, so cached text is only reused when it would be identical
+CACHE_SETTINGS = json.dumps(
+    {'model': WHISPER_MODEL, 'draft_model': TRANSCRIPTION_DRAFT_MODEL if draft_model else None,
+     'prompt': OPENAI_TRANSCRIPTION_PROMPT, **TRANSCRIPTION_PARAMS}, sort_keys=True
+)
+transcription_cache = TranscriptionCache(TRANSCRIPTION_CACHE_SIZE, TRANSCRIPTION_CACHE_DB)
+
+simulcast_index = None
+if TRANSCRIPTION_SIMULCAST_DEDUP:
+    simulcast_index = SimulcastIndex(TRANSCRIPTION_SIMULCAST_WINDOW_S, TRANSCRIPTION_SIMULCAST_MAX_BER)
+    logger.info(f"Simulcast dedup enabled ({TRANSCRIPTION_SIMULCAST_WINDOW_S:.0f}s window, max BER {TRANSCRIPTION_SIMULCAST_MAX_BER})")
+
+# How long a simulcast copy waits for the original's transcription before transcribing itself
+SIMULCAST_WAIT_SECONDS = 60
+
+# Tier 'full' is TRANSCRIPTION_PARAMS; with adaptive quality off it is always used
+quality_controller = AdaptiveQualityController(
+    build_tiers(TRANSCRIPTION_PARAMS['beam_size'], TRANSCRIPTION_PARAMS['vad_parameters']),
+    [TRANSCRIPTION_ADAPTIVE_REDUCED_S, TRANSCRIPTION_ADAPTIVE_MINIMAL_S],
+    workers=TRANSCRIPTION_WORKERS,
+    enabled=TRANSCRIPTION_ADAPTIVE_QUALITY
+)
+if TRANSCRIPTION_ADAPTIVE_QUALITY:
+    logger.info(f"Adaptive quality enabled (reduced at {TRANSCRIPTION_ADAPTIVE_REDUCED_S:.0f}s expected wait, "
+                f"minimal at {TRANSCRIPTION_ADAPTIVE_MINIMAL_S:.0f}s)")
+
+# Raw PCM layouts accepted for binary frames and shared-memory segments (16kHz mono)
+PCM_FORMATS = {'pcm_f32le': '<f4', 'pcm_s16le': '<i2'}
+
+# Typical bitrate of compressed scanner audio (32 kbit/s), for guessing call length from file size
+ENCODED_BYTES_PER_SECOND = 4000
+
+def estimate_audio_seconds(command):
+    """Rough call length from the request alone, for shortest-job-first before decoding"""
+    if command.get('duration') is not None:
+        try:
+            return float(command['duration'])
+        except (TypeError, ValueError):
+            pass
+    try:
+        if 'audio_length' in command:
+            size = int(command['audio_length'])
+        elif 'shm_length' in command:
+            size = int(command['shm_length'])
+        elif 'path' in command:
+            size = os.path.getsize(command['path'])
+        elif 'audio_data_base64' in command:
+            size = len(command['audio_data_base64']) * 3 // 4
+        else:
+            return None
+    except (OSError, TypeError, ValueError):
+        return None
+    audio_format = command.get('audio_format', 'encoded')
+    if audio_format in PCM_FORMATS:
+        return size / (SAMPLE_RATE * np.dtype(PCM_FORMATS[audio_format]).itemsize)
+    return size / ENCODED_BYTES_PER_SECOND
+
+def elapsed_ms(start):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+class RequestControl:
+    """Scheduling, deadline and cancellation state of an in-flight request"""
+
+    def __init__(self, deadline_ms=None, priority=DEFAULT_PRIORITY, expected_seconds=None):
+        self.received_at = time.monotonic()
+        # deadline_ms counts from when the request was read, so client and worker clocks need not agree
+        self.deadline = self.received_at + float(deadline_ms) / 1000 if deadline_ms else None
+        self.cancelled = False
+        self.priority = priority
+        self.expected_seconds = expected_seconds  # Estimated call length until the audio is decoded
+        self.in_stage = False     # A pipeline stage is working on it (not waiting in a queue)
+        self.abort_sent = False   # Its cancelled/timeout error has been sent; later stages drop it silently
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_command(cls, command):
+        """Controls for a newly read command, classified for the scheduler"""
+        return cls(
+            command.get('deadline_ms'),
+            priority_class(command.get('priority'), command.get('emergency', False),
+                           command.get('talkgroup'), TRANSCRIPTION_PRIORITY_TALKGROUPS),
+            estimate_audio_seconds(command)
+        )
+
+    def scheduling_key(self, audio_seconds=None):
+        """Scheduler key; audio_seconds, once decoded, replaces the estimate"""
+        due = self.deadline if self.deadline is not None else self.received_at + TRANSCRIPTION_DEFAULT_DEADLINE_S
+        seconds = audio_seconds if audio_seconds is not None else self.expected_seconds
+        return schedule_key(self.priority, due, seconds, TRANSCRIPTION_SCHEDULER_SLOT_MS / 1000)
+
+    def abort_reason(self):
+        """'cancelled', 'timeout' or None if the request should still be worked on"""
+        if self.cancelled:
+            return 'cancelled'
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return 'timeout'
+        return None
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without one"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def enter_stage(self):
+        """
+        Checkpoint at the start of a pipeline stage
+
+        Returns:
+            Tuple of (skip the request, abort reason to answer it with or None if already answered)
+        """
+        with self.lock:
+            if self.abort_sent:
+                return True, None
+            reason = self.abort_reason()
+            if reason:
+                self.abort_sent = True
+                return True, reason
+            self.in_stage = True
+            return False, None
+
+    def leave_stage(self):
+        """The request is handed on to the next queue"""
+        with self.lock:
+            self.in_stage = False
+
+    def claim_queued_abort(self):
+        """Abort reason of a request waiting in a queue, claimed so only the caller answers it; None otherwise"""
+        with self.lock:
+            if self.in_stage or self.abort_sent:
+                return None
+            reason = self.abort_reason()
+            if reason:
+                self.abort_sent = True
+            return reason
+
+class RequestAborted(Exception):
+    """Raised between decoded segments once a request is cancelled or past its deadline"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+# Request id -> RequestControl, from the time a command is read until its request is finished
+request_controls = {}
+abort_stats = {'cancelled': 0, 'timeout': 0}
+
+def send_aborted(request_id, reason):
+    """Answer a cancelled or overdue request with an error carrying the reason"""
+    abort_stats[reason] += 1
+    if reason == 'timeout':
+        logger.warning(f"Request ID {request_id} passed its deadline, abandoning it")
+        send_error(request_id, f"Request {request_id} passed its deadline_ms before completing.", reason='timeout')
+    else:
+        logger.info(f"Request ID {request_id} was cancelled")
+        send_error(request_id, f"Request {request_id} was cancelled.", reason='cancelled')
+
+def skip_if_aborted(request_id):
+    """
+    Check a request before starting a stage of work on it
+
+    Returns:
+        True if the request was cancelled or is past its deadline (an error response was sent,
+        now or while it was queued)
+    """
+    control = request_controls.get(request_id)
+    if control is None:
+        return False
+    skip, reason = control.enter_stage()
+    if reason:
+        send_aborted(request_id, reason)
+    return skip
+
+def answer_aborted_queued_requests():
+    """
+    Answer queued requests as soon as they are cancelled or pass their deadline
+
+    Without this a client only learns its request timed out once a worker
+    dequeues it, after every call ahead of it. The request stays queued and
+    is dropped silently (and finished) when a stage reaches it.
+    """
+    for request_id, control in list(request_controls.items()):
+        reason = control.claim_queued_abort()
+        if reason:
+            send_aborted(request_id, reason)
+
+def cancel_request(request_id):
+    """Flag an in-flight request as cancelled; it is dropped at its next checkpoint"""
+    control = request_controls.get(request_id)
+    if control is None:
+        logger.info(f"Cancel for ID {request_id} ignored: not in flight")
+        return
+    control.cancelled = True
+    logger.info(f"Cancellation requested for ID {request_id}")
+
+class TranscriptionJob:
+    """State for one 'transcribe' (or 'analyze') request as it moves through the worker"""
+
+    def __init__(self, command):
+        self.command = command
+        self.request_id = command.get('id')
+        self.input_type = None  # 'path' or 'buffer', as received
+        self.source = None      # File path or encoded bytes still to be decoded
+        self.audio = None       # 16kHz mono float32 samples once decoded
+        self.timings = {}       # Stage name -> milliseconds
+        self.cache_key = None   # Content hash of the decoded audio + settings
+        self.simulcast_entry = None  # Index entry copies of this call wait on
+        self.speech_chunks = None    # VAD speech timestamps (sample offsets), computed once
+        self.decoded_at = None       # perf_counter() when the decode stage handed the job on
+        self.quality_tier = None     # Name of the quality tier the transcription was produced with
+        self.partial_segments = 0    # Segments already streamed as partial responses
+        self.tone_analysis = None    # Future of the tone detection running beside an 'analyze' transcription
+        self.control = request_controls.get(self.request_id) or RequestControl()
+
+    def fail(self, error_detail):
+        """Send an error response for this job; returns False for early-exit convenience"""
+        send_error(self.request_id, error_detail)
+        return False
+
+    def send_transcription(self, transcription, **extra):
+        """Send the final transcription with the recorded stage timings"""
+        if self.quality_tier:
+            extra['quality_tier'] = self.quality_tier
+        if self.tone_analysis is not None:
+            extra.update(self.tone_results())
+        send_response({"id": self.request_id, "transcription": transcription, "timings": self.timings, **extra})
+
+    def tone_results(self):
+        """Response fields of the concurrent tone detection, waiting for it if it is still running"""
+        try:
+            return tone_fields(self.tone_analysis.result(timeout=TONE_ANALYSIS_WAIT_S))
+        except concurrent.futures.TimeoutError:
+            error_detail = f"Tone detection did not finish within {TONE_ANALYSIS_WAIT_S}s"
+        except Exception as e:
+            error_detail = f"Error during tone detection: {str(e)}"
+        logger.warning(f"{error_detail} (ID {self.request_id})")
+        return {"has_two_tone": False, "tone_error": error_detail}
+
+    def complete(self, transcription, **extra):
+        """Cache a freshly computed transcription and send it"""
+        # Only full-quality results are cached, so a degraded one is never served once load drops
+        if self.cache_key and self.quality_tier in (None, 'full'):
+            transcription_cache.put(self.cache_key, transcription)
+        if self.simulcast_entry:
+            self.simulcast_entry.resolve(transcription)
+        self.send_transcription(transcription, **extra)
+
+def serve_from_cache(job):
+    """
+    Answer a decoded job from the result cache
+
+    The cache holds text only, so a 'details' request is always transcribed
+    (its result is still cached for plain requests of the same audio).
+
+    Returns:
+        True if a cached transcription was sent
+    """
+    if not transcription_cache.enabled:
+        return False
+    job.cache_key = make_cache_key(job.audio, CACHE_SETTINGS)
+    if job.command.get('details'):
+        return False
+    cached = transcription_cache.get(job.cache_key)
+    if cached is None:
+        return False
+    logger.info(f"Transcription cache hit for ID: {job.request_id} (length: {len(cached)} chars)")
+    job.send_transcription(cached, cached=True)
+    return True
+
+def serve_simulcast_duplicate(job, wait=True):
+    """
+    Answer a decoded job with the transcription of the same transmission from another site
+
+    Calls carrying a 'talkgroup' are fingerprinted; the first copy is registered
+    and transcribed, later copies reuse its text.
+
+    Args:
+        job: Decoded job
+        wait: Block until the original finishes (at most until the job's deadline);
+            batches pass False since the original may be waiting in the same batch
+
+    Returns:
+        True if the job was answered: with the original's transcription, or with
+        the usual abort error if it was cancelled or ran out of time while waiting
+    """
+    talkgroup = job.command.get('talkgroup')
+    if simulcast_index is None or talkgroup is None:
+        return False
+
+    fingerprint_start = time.perf_counter()
+    fingerprint = compute_fingerprint(job.audio, SAMPLE_RATE)
+    entry, is_original = simulcast_index.match_or_register(str(talkgroup), job.request_id, fingerprint)
+    job.timings['fingerprint_ms'] = elapsed_ms(fingerprint_start)
+    if is_original:
+        job.simulcast_entry = entry
+        return False
+
+    if wait:
+        remaining = job.control.remaining()
+        entry.done.wait(SIMULCAST_WAIT_SECONDS if remaining is None else max(0, min(SIMULCAST_WAIT_SECONDS, remaining)))
+        if not entry.done.is_set() and skip_if_aborted(job.request_id):
+            return True
+    if entry.transcription is None:
+        failure = f" ({entry.error})" if entry.error else ""
+        logger.info(f"Simulcast copy {job.request_id} of {entry.request_id} has no transcription to reuse{failure}, transcribing")
+        return False
+
+    logger.info(f"Simulcast duplicate ID: {job.request_id} reuses transcription of ID: {entry.request_id}")
+    if job.cache_key:
+        transcription_cache.put(job.cache_key, entry.transcription)
+    job.send_transcription(entry.transcription, simulcast_duplicate=True, duplicate_of=entry.request_id)
+    return True
+
+def release_simulcast_copies(job, error=None):
+    """Resolve a failed original's simulcast entry, if still open, so copies waiting on it transcribe themselves"""
+    if job.simulcast_entry and not job.simulcast_entry.done.is_set():
+        job.simulcast_entry.resolve(None, error)
+
+def pcm_to_samples(buffer, audio_format, offset=0, length=None):
+    """Wrap raw PCM in a float32 array (no copy for pcm_f32le)"""
+    dtype = np.dtype(PCM_FORMATS[audio_format])
+    if length is None:
+        length = len(buffer) - offset
+    samples = np.frombuffer(buffer, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+    if audio_format == 'pcm_s16le':
+        samples = samples.astype(np.float32) / 32768.0
+    return samples
+
+def resolve_audio_frame(job):
+    """
+    Take the binary audio frame that followed the command header on stdin
+
+    The frame is either an encoded audio file ('encoded', the default) or raw
+    16kHz mono PCM ('pcm_s16le' / 'pcm_f32le'), selected by 'audio_format'.
+    """
+    audio_bytes = job.command.pop('audio_bytes')
+    audio_format = job.command.get('audio_format', 'encoded')
+    if not audio_bytes:
+        return job.fail("Received audio frame is empty.")
+
+    if audio_format in PCM_FORMATS:
+        try:
+            job.audio = pcm_to_samples(audio_bytes, audio_format)
+        except ValueError as e:
+            return job.fail(f"Error processing audio buffer: {str(e)}")
+    elif audio_format == 'encoded':
+        job.source = audio_bytes
+    else:
+        return job.fail(f"Unsupported audio_format: {audio_format}")
+    return True
+
+def resolve_shared_audio(job):
+    """
+    Map audio the sender placed in a named shared-memory segment
+
+    The command carries only 'shm_name', 'shm_offset' and 'shm_length'; the
+    segment lives in TRANSCRIPTION_SHM_DIR and is owned (and unlinked) by the
+    sender. PCM segments are wrapped in place with np.frombuffer.
+    """
+    shm_name = job.command['shm_name']
+    if not shm_name or os.path.basename(shm_name) != shm_name or shm_name in ('.', '..'):
+        return job.fail(f"Invalid shared memory segment name: {shm_name}")
+
+    segment_path = os.path.join(TRANSCRIPTION_SHM_DIR, shm_name)
+    audio_format = job.command.get('audio_format', 'encoded')
+    if audio_format not in PCM_FORMATS and audio_format != 'encoded':
+        return job.fail(f"Unsupported audio_format: {audio_format}")
+    try:
+        offset = int(job.command.get('shm_offset', 0))
+        with open(segment_path, 'rb') as segment_file:
+            segment = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+        length = int(job.command.get('shm_length', len(segment) - offset))
+        if offset < 0 or length <= 0 or offset + length > len(segment):
+            return job.fail(f"Shared memory range out of bounds: offset {offset}, length {length}, segment {len(segment)} bytes")
+
+        if audio_format in PCM_FORMATS:
+            # The array keeps the mapping alive; it is released with the array
+            job.audio = pcm_to_samples(segment, audio_format, offset, length)
+        elif offset == 0 and length == len(segment):
+            # Whole segment is one file - let the decoder read the tmpfs file directly
+            job.source = segment_path
+        else:
+            job.source = memoryview(segment)[offset:offset + length]
+        return True
+    except FileNotFoundError:
+        return job.fail(f"Shared memory segment does not exist: {shm_name}")
+    except Exception as e:
+        return job.fail(f"Error mapping shared memory audio: {str(e)}")
+
+def resolve_audio_source(job):
+    """
+    Work out where the audio for a 'transcribe' command comes from
+
+    Sets job.audio for raw PCM, or job.source for anything that still needs decoding.
+
+    Returns:
+        True if the job can continue, False if an error response was sent
+    """
+    command = job.command
+    if 'audio_bytes' in command:
+        job.input_type = 'buffer'
+        return resolve_audio_frame(job)
+
+    if 'shm_name' in command:
+        job.input_type = 'buffer'
+        return resolve_shared_audio(job)
+
+    if 'path' in command:
+        audio_file_path = command['path']
+        if not os.path.isfile(audio_file_path):
+            return job.fail(f"Audio file does not exist: {audio_file_path}")
+        job.input_type = 'path'
+        job.source = audio_file_path
+        return True
+
+    if 'audio_data_base64' in command:
+        job.input_type = 'buffer'
+        try:
+            job.source = base64.b64decode(command['audio_data_base64'])
+        except base64.binascii.Error:
+            return job.fail("Invalid Base64 data received.")
+        if not job.source:
+            return job.fail("Decoded audio data is empty.")
+        return True
+
+    return job.fail("Invalid command format: missing 'path', 'audio_length', 'shm_name' or 'audio_data_base64'.")
+
+def check_audio_file_size(job):
+    """
+    Cheap stat-based sanity check for path-based requests
+
+    Returns:
+        True if the file can be decoded, False if an error response was sent
+    """
+    audio_path = job.source
+    # First check if file exists and is readable
+    if not os.path.isfile(audio_path):
+        return job.fail(f"Audio file not found: {audio_path}")
+
+    # Check file size (basic validation)
+    file_size = os.path.getsize(audio_path)
+    if file_size < 1000:  # Less than 1KB
+        return job.fail(f"Audio file too small: {file_size} bytes")
+    elif file_size > 100 * 1024 * 1024:  # More than 100MB
+        return job.fail(f"Audio file too large: {file_size} bytes")
+    return True
+
+def probe_audio_file(job):
+    """
+    Optional ffprobe integrity check (TRANSCRIPTION_FFPROBE_CHECK=true)
+
+    Returns:
+        True if transcription should proceed, False if an error response was sent
+    """
+    import subprocess
+    audio_path = job.source
+    try:
+        # Quick ffprobe check for file integrity
+        result = subprocess.run(
+            ['ffprobe', '-v', 'quiet', '-show_format', audio_path],
+            stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            timeout=15  # Increased timeout
+        )
+        if result.returncode != 0:
+            return job.fail(f"Corrupt audio file (ffprobe check): {audio_path}")
+    except subprocess.TimeoutExpired:
+        logger.warning(f"FFprobe timeout for file: {audio_path}")
+        return job.fail(f"File validation timeout: {audio_path}")
+    except Exception as probe_err:
+        logger.warning(f"FFprobe check failed for {audio_path}: {str(probe_err)}")
+        # Continue with transcription attempt anyway
+    return True
+
+# Calls longer than this are rejected after decoding, like oversized files
+MAX_AUDIO_SECONDS = 30 * 60
+
+def validate_decoded_audio(job, report):
+    """
+    Integrity checks on what the decode revealed, replacing the per-call ffprobe run
+
+    The header must parse and contain an audio stream (ffmpeg fails otherwise),
+    and a stream that decodes to much less than its header duration while the
+    decoder reports errors is treated as corrupt.
+
+    Returns:
+        True if transcription should proceed, False if an error response was sent
+    """
+    source_name = job.command.get('path', 'audio buffer')
+    header_duration = report.get('header_duration')
+    if report.get('decode_errors') and header_duration and report['duration'] < header_duration * 0.5:
+        logger.warning(f"Truncated stream for ID {job.request_id}: decoded {report['duration']:.1f}s of {header_duration:.1f}s "
+                       f"({report['decode_errors']} decoder errors, codec {report.get('codec')})")
+        return job.fail(f"Corrupt audio file (decode check): {source_name}")
+    if report['duration'] > MAX_AUDIO_SECONDS:
+        return job.fail(f"Audio file too large: {report['duration']:.0f} seconds")
+    return True
+
+def decode_job_audio(job):
+    """
+    Decode job.source to 16kHz mono float32 via an ffmpeg pipe, timing the stage
+
+    Returns:
+        True if job.audio is ready, False if an error response was sent
+    """
+    if job.audio is not None:
+        return True  # Raw PCM needs no decoding
+
+    decode_start = time.perf_counter()
+    report = {}
+    try:
+        size_hint = os.path.getsize(job.source) if isinstance(job.source, str) else len(job.source)
+        job.audio = decode_to_float32(job.source, sample_rate=SAMPLE_RATE, size_hint=size_hint, report=report,
+                                      timeout=job.control.remaining())
+    except FileNotFoundError:
+        # No ffmpeg binary on PATH - fall back to faster-whisper's PyAV decoder
+        source = job.source if isinstance(job.source, str) else io.BytesIO(job.source)
+        try:
+            job.audio = decode_audio(source, sampling_rate=SAMPLE_RATE)
+            report = {'duration': len(job.audio) / SAMPLE_RATE}
+        except Exception as e:
+            return fail_decode(job, e)
+    except Exception as e:
+        return fail_decode(job, e)
+    finally:
+        job.timings['decode_ms'] = elapsed_ms(decode_start)
+
+    job.source = None  # Encoded bytes are no longer needed
+    if not validate_decoded_audio(job, report):
+        job.audio = None
+        return False
+    logger.info(f"Decoded audio for ID {job.request_id}: {report['duration']:.1f}s "
+                f"({report.get('codec') or 'unknown codec'}) in {job.timings['decode_ms']}ms")
+    return True
+
+def fail_decode(job, error):
+    """Report a decode failure with the same errors the ffprobe check and transcription step used"""
+    reason = job.control.abort_reason()
+    if reason:
+        send_aborted(job.request_id, reason)  # ffmpeg was stopped by the deadline, not by bad audio
+        return False
+    logger.warning(f"Audio decode failed for ID {job.request_id}: {error}")
+    if job.input_type == 'path':
+        if isinstance(error, AudioDecodeError):
+            return job.fail(f"Corrupt audio file (decode check): {job.command['path']}")
+        return job.fail(f"Corrupt audio data for ID {job.request_id}.")
+    return job.fail(f"Error processing audio buffer: {str(error)}")
+
+def prepare_job(job):
+    """
+    Resolve, validate and decode the audio for a job
+
+    Returns:
+        True if job.audio is ready for inference, False if an error response was sent
+    """
+    if not resolve_audio_source(job):
+        return False
+
+    # File checks ONLY if input is a path; integrity is validated while decoding
+    if job.input_type == 'path':
+        if not check_audio_file_size(job):
+            return False
+        if TRANSCRIPTION_FFPROBE_CHECK and not probe_audio_file(job):
+            return False
+
+    return decode_job_audio(job)
+
+# VAD runs once per call here rather than inside model.transcribe(), so a retry never repeats it
+VAD_OPTIONS = {tier.name: VadOptions(**tier.vad_parameters) for tier in quality_controller.tiers}
+
+# How often calls had no usable speech and needed the no-VAD fallback (reported in the heartbeat)
+vad_stats = {'calls': 0, 'no_speech': 0, 'fallback': 0, 'fallback_recovered': 0}
+vad_stats_lock = threading.Lock()
+
+def detect_speech(job, tier):
+    """Run VAD over the decoded audio once and keep the speech timestamps on the job"""
+    if job.speech_chunks is None:
+        vad_start = time.perf_counter()
+        job.speech_chunks = get_speech_timestamps(job.audio, VAD_OPTIONS[tier.name])
+        job.timings['vad_ms'] = elapsed_ms(vad_start)
+    return job.speech_chunks
+
+def compression_ratio(text):
+    """gzip-style compression ratio of a transcription; repetitive hallucinations compress well"""
+    text_bytes = text.encode('utf-8')
+    return len(text_bytes) / len(zlib.compress(text_bytes)) if text_bytes else 0.0
+
+def transcribe_segments(audio, params, whisper_model, on_segment=None):
+    """
+    Run a model over an audio array, returning (segments, info) with the segments fully decoded
+
+    faster-whisper decodes lazily; on_segment, if given, is called with each
+    segment as soon as it is decoded rather than after the whole call, and
+    may raise to stop decoding the remaining audio.
+    """
+    segments, info = whisper_model.transcribe(audio, **params)
+    decoded = []
+    for segment in segments:
+        decoded.append(segment)
+        if on_segment:
+            on_segment(segment)
+    return decoded, info
+
+def join_segments(segments):
+    """Transcription text of a list of segments"""
+    return " ".join(segment.text for segment in segments).strip()
+
+def segment_confidence(segments):
+    """Worst segment's avg_logprob, no_speech_prob and compression_ratio, or None without segments"""
+    if not segments:
+        return None
+    return {
+        'avg_logprob': min(segment.avg_logprob for segment in segments),
+        'no_speech_prob': max(segment.no_speech_prob for segment in segments),
+        'compression_ratio': max(segment.compression_ratio for segment in segments)
+    }
+
+def transcribe_text(audio, params, whisper_model):
+    """
+    Run a model over an audio array and join the segment texts
+
+    Returns:
+        Tuple of (text, confidence) - see segment_confidence()
+    """
+    segments, info = transcribe_segments(audio, params, whisper_model)
+    return join_segments(segments), segment_confidence(segments)
+
+def round_confidence(confidence):
+    """Confidence values rounded for the response"""
+    return {key: round(float(value), 3) for key, value in confidence.items()} if confidence else None
+
+def transcription_details(job, segments, language=None, language_probability=None):
+    """
+    Opt-in response metadata for a request sent with 'details': true
+
+    Args:
+        job: The job, with its audio still attached
+        segments: Dicts with start/end (seconds in the original audio), text and confidence values
+        language: Detected or configured language
+        language_probability: Language detection probability
+
+    Returns:
+        Dict merged into the response next to the transcription and timings
+    """
+    worst = None
+    if segments:
+        worst = {
+            'avg_logprob': min(segment['avg_logprob'] for segment in segments),
+            'no_speech_prob': max(segment['no_speech_prob'] for segment in segments),
+            'compression_ratio': max(segment['compression_ratio'] for segment in segments)
+        }
+    return {
+        'audio_duration': round(len(job.audio) / SAMPLE_RATE, 2),
+        'language': language,
+        'language_probability': round(language_probability, 3) if language_probability is not None else None,
+        'confidence': worst,
+        'segments': segments
+    }
+
+def call_times(segment, time_map=None):
+    """Start and end of a segment in the original call, mapping back through the VAD speech map"""
+    if time_map:
+        return time_map.get_original_time(segment.start), time_map.get_original_time(segment.end)
+    return segment.start, segment.end
+
+def send_partial_segment(job, segment, time_map=None):
+    """Send one decoded segment ahead of the final transcription (requests sent with 'stream': true)"""
+    start, end = call_times(segment, time_map)
+    send_response({
+        "id": job.request_id,
+        "partial": True,
+        "segment": {'index': job.partial_segments, 'start': round(start, 2), 'end': round(end, 2), 'text': segment.text.strip()}
+    })
+    job.partial_segments += 1
+
+def describe_segments(segments, time_map=None):
+    """Segment dicts for transcription_details(), mapping times back through the VAD speech map"""
+    described = []
+    for segment in segments:
+        start, end = call_times(segment, time_map)
+        described.append({
+            'start': round(start, 2),
+            'end': round(end, 2),
+            'text': segment.text.strip(),
+            **round_confidence({
+                'avg_logprob': segment.avg_logprob,
+                'no_speech_prob': segment.no_speech_prob,
+                'compression_ratio': segment.compression_ratio
+            })
+        })
+    return described
+
+def build_transcription_params(beam_size):
+    """model.transcribe() arguments for audio that VAD has already been applied to"""
+    params = {key: value for key, value in TRANSCRIPTION_PARAMS.items() if key != 'vad_parameters'}
+    params['vad_filter'] = False
+    params['beam_size'] = beam_size
+    # Add prompt if available (helps with scanner audio context)
+    if OPENAI_TRANSCRIPTION_PROMPT:
+        params['initial_prompt'] = OPENAI_TRANSCRIPTION_PROMPT
+    return params
+
+def record_vad_outcome(has_speech, fallback, recovered):
+    """Update the VAD/fallback counters"""
+    with vad_stats_lock:
+        vad_stats['calls'] += 1
+        vad_stats['no_speech'] += not has_speech
+        vad_stats['fallback'] += fallback
+        vad_stats['fallback_recovered'] += recovered
+
+def get_vad_stats():
+    """VAD counters plus the fallback rate, for the heartbeat"""
+    with vad_stats_lock:
+        stats = dict(vad_stats)
+    stats['fallback_rate'] = round(stats['fallback'] / stats['calls'], 3) if stats['calls'] else 0.0
+    return stats
+
+# Draft transcriptions waiting for the large model; when full, drafts are kept as final
+refine_queue = queue.Queue(maxsize=TRANSCRIPTION_REFINE_QUEUE)
+refine_stats = {'drafts': 0, 'queued': 0, 'skipped': 0, 'revised': 0}
+refine_stats_lock = threading.Lock()
+
+def needs_refinement(job, transcription, confidence):
+    """Whether a draft transcription should be re-decoded with the large model"""
+    if str(job.command.get('talkgroup')) in TRANSCRIPTION_REFINE_TALKGROUPS:
+        return True
+    if confidence is None:
+        # No segments at all - only worth a second look if VAD heard speech
+        return bool(job.speech_chunks)
+    return (confidence['avg_logprob'] < TRANSCRIPTION_REFINE_MIN_LOGPROB
+            or confidence['no_speech_prob'] > TRANSCRIPTION_REFINE_MAX_NO_SPEECH
+            or confidence['compression_ratio'] > TRANSCRIPTION_REFINE_MAX_COMPRESSION)
+
+def finish_draft(job, transcription, draft_confidence, **extra):
+    """
+    Send a first-pass transcription, queueing it for the large model if the cascade says so
+
+    Without a draft model the first pass is already WHISPER_MODEL and this is just job.complete().
+    `extra` may carry the response's own 'confidence' field ('details' requests), so the
+    value the cascade decides on is passed as draft_confidence.
+    """
+    if draft_model is None:
+        job.complete(transcription, **extra)
+        return
+
+    refine = needs_refinement(job, transcription, draft_confidence) and job.quality_tier != 'minimal'
+    with refine_stats_lock:
+        refine_stats['drafts'] += 1
+        if refine and refine_queue.full():
+            refine_stats['skipped'] += 1
+            refine = False
+        elif refine:
+            refine_stats['queued'] += 1
+
+    # The revision goes to the same client even after the request's route is dropped
+    channel = response_routes.get(job.request_id, stdout_channel)
+    audio = job.audio  # Kept for the large model after the first pass frees the job's buffer
+    job.complete(transcription, refining=refine, **extra)
+    if refine:
+        logger.info(f"Queued ID {job.request_id} for re-decode with {WHISPER_MODEL} (confidence: {draft_confidence})")
+        try:
+            refine_queue.put_nowait((job, audio, channel, transcription))
+        except queue.Full:
+            logger.warning(f"Refine queue filled up, keeping the draft for ID {job.request_id}")
+
+def refine_transcription(job, audio, channel, draft):
+    """Re-decode a draft with WHISPER_MODEL and send a 'revision' if the text changes"""
+    refine_start = time.perf_counter()
+    speech_chunks = job.speech_chunks
+    if speech_chunks is None:
+        speech_chunks = get_speech_timestamps(audio, VAD_OPTIONS['full'])
+    if speech_chunks:
+        audio = np.concatenate([audio[chunk['start']:chunk['end']] for chunk in speech_chunks])
+    else:
+        audio = audio[:int(TRANSCRIPTION_NO_SPEECH_WINDOW_S * SAMPLE_RATE)]
+
+    transcription, confidence = transcribe_text(audio, build_transcription_params(TRANSCRIPTION_PARAMS['beam_size']), model)
+    refine_ms = elapsed_ms(refine_start)
+    if not transcription or transcription == draft:
+        logger.info(f"Re-decode of ID {job.request_id} kept the draft ({refine_ms}ms)")
+        return
+
+    with refine_stats_lock:
+        refine_stats['revised'] += 1
+    if job.cache_key:
+        transcription_cache.put(job.cache_key, transcription)
+    logger.info(f"Revised transcription for ID: {job.request_id} (length: {len(transcription)} chars, {refine_ms}ms)")
+    channel.send({
+        "id": job.request_id,
+        "transcription": transcription,
+        "revision": 1,
+        "model": WHISPER_MODEL,
+        "timings": {'refine_ms': refine_ms}
+    })
+
+def refine_worker_loop(refine_queue):
+    """Large-model stage of the cascade: upgrade uncertain drafts in the background"""
+    while True:
+        item = refine_queue.get()
+        if item is None:
+            break
+        # The draft has been answered already - failures are only logged
+        run_safely([], refine_transcription, *item)
+
+def select_quality_tier():
+    """Quality tier for the next call, from the calls still waiting in either pipeline stage"""
+    depths = queue_depths()
+    return quality_controller.select(depths['decode'] + depths['inference'])
+
+def run_transcription(job):
+    """Transcribe a decoded job and send the result"""
+    request_id = job.request_id
+    transcribe_start = time.perf_counter()
+    try:
+        # Add memory cleanup before transcription for large buffers
+        if job.input_type == 'buffer':
+            gc.collect()  # Force garbage collection before processing large audio
+
+        # Prepare transcription parameters; VAD has already been applied to the audio
+        tier = select_quality_tier()
+        job.quality_tier = tier.name
+        transcription_params = build_transcription_params(tier.beam_size)
+        if OPENAI_TRANSCRIPTION_PROMPT:
+            logger.info(f"Using custom transcription prompt for ID {request_id}")
+
+        # Transcribe only the speech regions - optimized for high-volume systems
+        speech_chunks = detect_speech(job, tier)
+        segments, info, time_map = [], None, None
+
+        # Between segments: stop decoding once the request is cancelled or past its deadline, and in
+        # streaming mode send each segment as soon as it is decoded so keyword alerts can fire early
+        def on_segment(segment):
+            reason = job.control.abort_reason()
+            if reason:
+                raise RequestAborted(reason)
+            if job.command.get('stream'):
+                send_partial_segment(job, segment, time_map)
+
+        if speech_chunks:
+            speech_audio = np.concatenate([job.audio[chunk['start']:chunk['end']] for chunk in speech_chunks])
+            time_map = SpeechTimestampsMap(speech_chunks, SAMPLE_RATE)  # Speech-only times -> call times
+            segments, info = transcribe_segments(speech_audio, transcription_params, first_pass_model, on_segment)
+        transcription = join_segments(segments)
+
+        # Nothing found in the speech regions (or no speech at all): one cheap pass without VAD
+        # over the start of the already-decoded audio instead of re-running the whole clip
+        fallback = not transcription and tier.no_speech_fallback and TRANSCRIPTION_NO_SPEECH_WINDOW_S > 0
+        if fallback:
+            logger.info(f"Retrying transcription for ID {request_id} without VAD filter "
+                        f"(first {TRANSCRIPTION_NO_SPEECH_WINDOW_S:.0f}s, {len(speech_chunks)} speech regions).")
+            window = job.audio[:int(TRANSCRIPTION_NO_SPEECH_WINDOW_S * SAMPLE_RATE)]
+            segments, info = transcribe_segments(window, {**transcription_params, 'beam_size': 1}, first_pass_model, on_segment)
+            time_map = None  # The window starts at 0 - times are already call times
+            transcription = join_segments(segments)
+        record_vad_outcome(bool(speech_chunks), fallback, fallback and bool(transcription))
+
+        job.timings['transcribe_ms'] = elapsed_ms(transcribe_start)
+        quality_controller.observe(len(job.audio) / SAMPLE_RATE, job.timings['transcribe_ms'] / 1000)
+        logger.info(f"Transcription successful for ID: {request_id} (length: {len(transcription)} chars, tier: {tier.name})")
+        extra = {'vad': {
+            'speech_seconds': round(sum(chunk['end'] - chunk['start'] for chunk in speech_chunks) / SAMPLE_RATE, 2),
+            'fallback': fallback
+        }}
+        if job.command.get('details'):
+            extra.update(transcription_details(
+                job, describe_segments(segments, time_map),
+                info.language if info else None, info.language_probability if info else None
+            ))
+        finish_draft(job, transcription, segment_confidence(segments), **extra)
+
+    except RequestAborted as e:
+        send_aborted(request_id, e.reason)
+
+    except Exception as e:
+        error_str = str(e)
+        # Detect specific FFmpeg/audio processing errors
+        if "[Errno 1094995529]" in error_str or "Invalid data found" in error_str or "corrupt" in error_str.lower():
+            error_detail = f"Corrupt audio data for ID {request_id}."
+        elif "out of memory" in error_str.lower() or "memory" in error_str.lower():
+            error_detail = f"Out of memory during transcription for ID {request_id}."
+        else:
+            error_detail = f"Error during transcription for ID {request_id}: {error_str}"
+        logger.error(f"Transcription failed for ID {request_id}: {error_detail}")
+        send_error(request_id, error_detail)
+
+    finally:
+        # Release simulcast copies waiting on a call that failed
+        release_simulcast_copies(job)
+        # Clean up memory for buffer-based transcriptions
+        if job.input_type == 'buffer':
+            job.audio = None  # Free the numpy array
+            gc.collect()
+
+# Whisper's encoder sees fixed 30 second windows; shorter calls are padded, so any
+# call that fits in one window can share a single batched encode/decode pass
+BATCH_MAX_SAMPLES = 30 * SAMPLE_RATE
+
+def transcribe_batch(jobs, beam_size, whisper_model):
+    """
+    Transcribe several short calls in one batched pass over the loaded model
+
+    faster-whisper's BatchedInferencePipeline only batches chunks of a single
+    file, so the batch is built here: each call's speech regions (as found by
+    VAD, like the single-call path) are joined and padded to one 30 second
+    window, encoded together, and decoded with one CTranslate2 generate() call.
+
+    Args:
+        jobs: Decoded jobs with speech_chunks set, each with no more than BATCH_MAX_SAMPLES of speech
+        beam_size: Beam width of the current quality tier
+        whisper_model: Model to run (the draft model in cascade mode)
+
+    Returns:
+        List of (transcription, confidence) tuples in job order
+    """
+    feature_extractor = whisper_model.feature_extractor
+    speech = [np.concatenate([job.audio[chunk['start']:chunk['end']] for chunk in job.speech_chunks]) for job in jobs]
+    features = np.stack([
+        feature_extractor(np.pad(audio, (0, BATCH_MAX_SAMPLES - len(audio))))[:, :feature_extractor.nb_max_frames]
+        for audio in speech
+    ])
+
+    tokenizer = Tokenizer(whisper_model.hf_tokenizer, whisper_model.model.is_multilingual, task='transcribe', language='en')
+    previous_tokens = tokenizer.encode(" " + OPENAI_TRANSCRIPTION_PROMPT.strip()) if OPENAI_TRANSCRIPTION_PROMPT else []
+    prompt = whisper_model.get_prompt(tokenizer, previous_tokens, without_timestamps=True)
+
+    encoder_output = whisper_model.encode(features)
+    results = whisper_model.model.generate(
+        encoder_output,
+        [prompt] * len(jobs),
+        beam_size=beam_size,  # Same beam width as the single-call path
+        max_length=getattr(whisper_model, 'max_length', 448),
+        return_scores=True,
+        return_no_speech_prob=True,
+        suppress_blank=True,
+        suppress_tokens=[-1]
+    )
+
+    transcriptions = []
+    for result in results:
+        tokens = result.sequences_ids[0]
+        text = tokenizer.decode(tokens).strip()
+        # Same silence rule faster-whisper applies per segment (no_speech_threshold / log_prob_threshold)
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+        if result.no_speech_prob > 0.6 and avg_logprob < -1.0:
+            text = ""
+        confidence = {
+            'avg_logprob': avg_logprob,
+            'no_speech_prob': result.no_speech_prob,
+            'compression_ratio': compression_ratio(text)
+        }
+        transcriptions.append((text, confidence))
+    return transcriptions
+
+def collect_batch(first_job, ready_queue):
+    """
+    Gather further decoded calls that reach the inference stage within the batch window
+
+    Returns:
+        Tuple of (batch jobs, other commands pulled off the queue meanwhile)
+    """
+    batch = [first_job]
+    deferred = []
+    window_end = time.monotonic() + TRANSCRIPTION_BATCH_WINDOW_MS / 1000.0
+    while len(batch) < TRANSCRIPTION_BATCH_SIZE:
+        remaining = window_end - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = ready_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if item is None:
+            ready_queue.put(None)  # Leave the shutdown signal for the worker loop
+            break
+        if isinstance(item, TranscriptionJob):
+            batch.append(item)
+        else:
+            deferred.append(item)
+    return batch, deferred
+
+def admit_to_batch(job, tier):
+    """
+    First step of a batched job: answer it from elsewhere or send it down the single-call path if it cannot share
+
+    VAD runs here, as in the single-call path, so the batched pass only sees speech.
+
+    Returns:
+        True to join the batched pass, False for the single-call path (run once the
+        batch is done, so it never holds up the short calls), None if already answered
+    """
+    job.timings['inference_queue_ms'] = elapsed_ms(job.decoded_at)
+    logger.info(f"Processing transcription request ID: {job.request_id} (batched)")
+    if skip_if_aborted(job.request_id) or serve_simulcast_duplicate(job, wait=False):
+        return None
+
+    # Streamed calls emit segments as they decode, calls without speech need the no-VAD fallback,
+    # and speech longer than one window needs the segmented single-call path
+    speech_chunks = None if job.command.get('stream') else detect_speech(job, tier)
+    return bool(speech_chunks) and sum(chunk['end'] - chunk['start'] for chunk in speech_chunks) <= BATCH_MAX_SAMPLES
+
+def finish_batched_job(job, transcription, confidence, tier, batch_ms, batch_size):
+    """Answer one call of a finished batched pass; its simulcast copies are released even if this fails"""
+    error = None
+    try:
+        send_batched_job(job, transcription, confidence, tier, batch_ms, batch_size)
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        release_simulcast_copies(job, error)
+
+def send_batched_job(job, transcription, confidence, tier, batch_ms, batch_size):
+    """Send one call's result from a batched pass, or hand an empty one to the single-call path"""
+    if not transcription:
+        # Empty after the batched pass - the single-call path retries without VAD, as it would for one call
+        run_transcription(job)
+        return
+    job.timings['transcribe_ms'] = batch_ms
+    job.timings['batch_size'] = batch_size
+    job.quality_tier = tier.name
+    record_vad_outcome(True, False, False)
+    quality_controller.observe(len(job.audio) / SAMPLE_RATE, batch_ms / 1000 / batch_size)
+    logger.info(f"Transcription successful for ID: {job.request_id} (length: {len(transcription)} chars, batched)")
+    speech_chunks = job.speech_chunks
+    extra = {'vad': {
+        'speech_seconds': round(sum(chunk['end'] - chunk['start'] for chunk in speech_chunks) / SAMPLE_RATE, 2),
+        'fallback': False
+    }}
+    if job.command.get('details'):
+        # One batched window per call - its speech is a single segment
+        segment = {'start': round(speech_chunks[0]['start'] / SAMPLE_RATE, 2), 'end': round(speech_chunks[-1]['end'] / SAMPLE_RATE, 2),
+                   'text': transcription, **round_confidence(confidence)}
+        extra.update(transcription_details(job, [segment], 'en', 1.0))
+    finish_draft(job, transcription, confidence, **extra)
+
+def process_batch(jobs):
+    """
+    Transcribe a batch of decoded calls, the short ones together
+
+    Each call's own steps run under run_safely(), so an unexpected failure is
+    reported for that call only and never duplicates a batch-mate's answer.
+    """
+    tier = select_quality_tier()
+    routes = [run_safely([job.request_id], admit_to_batch, job, tier) for job in jobs]
+    for job, route in zip(jobs, routes):
+        if route is None:
+            release_simulcast_copies(job, "failed before transcription")  # No-op unless admission failed after registering
+    ready = [job for job, route in zip(jobs, routes) if route is True]
+    # Calls that cannot share a window run one at a time after the batched pass, not in its way
+    single = [job for job, route in zip(jobs, routes) if route is False]
+
+    if len(ready) > 1:
+        logger.info(f"Starting batched transcription of {len(ready)} calls (tier: {tier.name})")
+        batch_start = time.perf_counter()
+        try:
+            results = transcribe_batch(ready, tier.beam_size, first_pass_model)
+        except Exception as e:
+            logger.warning(f"Batched transcription failed, falling back to single calls: {e}")
+            single = ready + single
+        else:
+            batch_ms = elapsed_ms(batch_start)
+            for job, (transcription, confidence) in zip(ready, results):
+                run_safely([job.request_id], finish_batched_job, job, transcription, confidence, tier, batch_ms, len(ready))
+    else:
+        single = ready + single
+
+    for job in single:
+        run_safely([job.request_id], run_transcription, job)
+
+def start_tone_analysis(job):
+    """
+    Queue tone detection for an 'analyze' request, over the buffer decoded for transcription
+
+    The file is decoded (and read) once for both; the tone workers run the
+    detection while the call is transcribed, and the result joins the
+    transcription in one response via TranscriptionJob.send_transcription().
+    """
+    job.tone_analysis = concurrent.futures.Future()
+    # The audio goes with the job: a buffer job's samples are released once it is transcribed
+    tone_queue.put((job, job.audio))
+
+def run_tone_analysis(job, audio):
+    """Tone stage of an 'analyze' request: detect tones in its decoded audio and settle job.tone_analysis"""
+    path = job.command.get('path')
+    try:
+        if not TONE_DETECTION_AVAILABLE or not tone_detector:
+            raise RuntimeError("Tone detection is not available. Please install icad-tone-detection.")
+        tone_start = time.perf_counter()
+        if tone_detector.engine == 'native':
+            result = tone_detector.detect_tones_in_audio(audio, path)
+        elif path:
+            result = tone_detector.detect_tones_in_file(path)  # icad engine reads the file itself
+        else:
+            raise RuntimeError("icad-tone-detection needs a file path; use the native tone engine for buffers")
+        job.timings['tone_ms'] = elapsed_ms(tone_start)
+        job.tone_analysis.set_result(result)
+    except Exception as e:
+        job.tone_analysis.set_exception(e)
+
+def prepare_transcription(command):
+    """
+    Decode stage for a 'transcribe' or 'analyze' command: resolve, validate, decode and check the cache
+
+    Returns:
+        The decoded job for the inference stage, or None if the request was already answered
+    """
+    job = TranscriptionJob(command)
+    if not prepare_job(job):
+        return None
+    if command.get('command') == 'analyze':
+        start_tone_analysis(job)
+    if serve_from_cache(job):
+        return None
+    job.decoded_at = time.perf_counter()
+    return job
+
+def process_job(job):
+    """Inference stage for a decoded job"""
+    job.timings['inference_queue_ms'] = elapsed_ms(job.decoded_at)
+    if skip_if_aborted(job.request_id) or serve_simulcast_duplicate(job):
+        return
+
+    # --- Start Transcription ---
+    logger.info(f"Starting transcription for ID: {job.request_id} (type: {job.input_type})")
+    run_transcription(job)
+    # --- End Transcription ---
+
+def process_command(command):
+    """Handle a single parsed command from start to finish"""
+    request_id = command.get('id')
+    command_name = command.get('command')
+
+    if skip_if_aborted(request_id):
+        return
+    if command_name == 'detect_tones':
+        handle_tone_detection(request_id, command)
+        return
+    if command_name not in ('transcribe', 'analyze'):
+        send_error(request_id, f"Invalid command: {command_name}")
+        return
+
+    job = prepare_transcription(command)
+    if job:
+        process_job(job)
+
+def read_commands(stream, request_queue, channel):
+    """
+    Read commands from a client stream and feed them to the worker queue
+
+    Each command is one JSON line. A command carrying 'audio_length' is
+    followed by exactly that many raw audio bytes (binary protocol), which
+    avoids base64-encoding the audio inside the JSON line. Once a worker
+    takes a request off the queues it answers {"id": ..., "started": true}
+    ahead of the final response.
+    """
+    while True:
+        raw_line = stream.readline()
+        if not raw_line:
+            break
+        line = raw_line.strip()
         if not line:
             continue
 
-        command = json.loads(line)
-        request_id = command.get('id')
+        try:
+            command = json.loads(line)
+        except json.JSONDecodeError as json_err:
+            logger.error(f"Failed to decode JSON command: {line[:200].decode('utf-8', 'replace')} - Error: {json_err}")
+            continue  # Skip this invalid command
+        if not isinstance(command, dict):
+            logger.error(f"Command is not a JSON object: {line[:200].decode('utf-8', 'replace')}")
+            continue
+
+        # Binary protocol: the raw audio frame follows the header line
+        if 'audio_length' in command:
+            try:
+                audio_length = int(command['audio_length'])
+            except (TypeError, ValueError):
+                audio_length = -1
+            if audio_length < 0:
+                # The frame's extent is unknown, so the stream cannot be resynchronised - answer and stop reading
+                logger.error(f"Invalid audio_length {command['audio_length']!r} from {channel.name}, closing its command stream")
+                channel.send({"id": command.get('id'), "error": f"Invalid audio_length: {command['audio_length']!r}"})
+                break
+            audio_bytes = stream.read(audio_length)
+            if len(audio_bytes) < audio_length:
+                logger.error(f"{channel.name} closed mid-frame ({len(audio_bytes)} of {audio_length} bytes)")
+                break
+            command['audio_bytes'] = audio_bytes
 
-        if not request_id:
-            logger.error(f"Command missing 'id': {line}")
+        if not command.get('id'):
+            logger.error(f"Command missing 'id': {line[:200].decode('utf-8', 'replace')}")
             continue
-        
+
+        # Cancellation takes effect immediately rather than queueing behind the request it cancels
+        if command.get('command') == 'cancel':
+            cancel_request(command['id'])
+            continue
+
+        try:
+            control = RequestControl.for_command(command)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid request fields for ID {command['id']}: {e}")
+            channel.send({"id": command['id'], "error": f"Invalid request: {e}"})
+            continue
+        if channel is not stdout_channel:
+            if command['id'] in response_routes:
+                logger.warning(f"Request ID {command['id']} is already in flight for another client")
+            response_routes[command['id']] = channel
+        request_controls[command['id']] = control
+        channel.in_flight.add(command['id'])
+        if command.get('command') == 'detect_tones':
+            # Tone checks decide whether a call is geocoded - they skip the transcription queues
+            tone_queue.put(command)
+            logger.info(f"Queued tone detection ID: {command['id']} from {channel.name} (tone queue: {tone_queue.qsize()})")
+            continue
+        request_queue.put(command)
+        depths = queue_depths()
+        logger.info(f"Queued request ID: {command['id']} from {channel.name} (priority class {control.priority}, "
+                    f"decode queue: {depths['decode']}, inference queue: {depths['inference']})")
+
+def read_stdin_commands(request_queue):
+    """Serve the parent process over stdin/stdout until stdin closes"""
+    read_commands(sys.stdin.buffer, request_queue, stdout_channel)
+    # stdin closed - the parent process is gone, let the workers drain and exit
+    logger.info("stdin closed, shutting down transcription workers")
+    for _ in range(TRANSCRIPTION_DECODE_WORKERS):
+        request_queue.put(None)
+    # The tone workers are stopped by the last inference worker: decoding may still queue 'analyze' tone work
+
+def open_server_socket():
+    """Create the listening socket for server mode"""
+    if TRANSCRIPTION_SERVER_SOCKET:
+        # Remove a stale socket file left by a previous run
+        if os.path.exists(TRANSCRIPTION_SERVER_SOCKET):
+            os.unlink(TRANSCRIPTION_SERVER_SOCKET)
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server_socket.bind(TRANSCRIPTION_SERVER_SOCKET)
+        os.chmod(TRANSCRIPTION_SERVER_SOCKET, 0o660)
+        logger.info(f"Transcription server listening on unix:{TRANSCRIPTION_SERVER_SOCKET}")
+    else:
+        server_socket = socket.create_server((TRANSCRIPTION_SERVER_HOST, TRANSCRIPTION_SERVER_PORT))
+        logger.info(f"Transcription server listening on {TRANSCRIPTION_SERVER_HOST}:{TRANSCRIPTION_SERVER_PORT}")
+    server_socket.listen()
+    return server_socket
+
+def serve_connection(connection, channel, request_queue):
+    """Read commands from one socket client until it disconnects"""
+    try:
+        read_commands(connection.makefile('rb'), request_queue, channel)
+    except OSError as e:
+        logger.warning(f"Connection error from {channel.name}: {e}")
+    finally:
+        with clients_lock:
+            client_channels.discard(channel)
+        channel.closed = True
+        connection.close()
+        logger.info(f"{channel.name} disconnected")
+
+def accept_clients(server_socket, request_queue):
+    """Accept socket clients; every client shares the same worker pool and model"""
+    client_number = 0
+    while True:
+        connection, _ = server_socket.accept()
+        client_number += 1
+        channel = ResponseChannel(connection.makefile('wb'), f"client {client_number}")
+        with clients_lock:
+            client_channels.add(channel)
+        logger.info(f"{channel.name} connected")
+        # The model is already warm - each client gets its own ready signal
+        channel.send({"ready": True, "startup": startup_timings, **credit_message(channel)})
+        threading.Thread(
+            target=serve_connection, args=(connection, channel, request_queue),
+            name=f"client-{client_number}", daemon=True
+        ).start()
+
+def memory_available_mb():
+    """MemAvailable from /proc/meminfo in MB, or None where it cannot be read"""
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def credit_message(channel):
+    """
+    Capacity advertisement for one client
+
+    Each connected client gets an equal share of TRANSCRIPTION_MAX_IN_FLIGHT and
+    is counted against its own requests only, so one busy client cannot use up
+    the slots another was told it had. Credits are the unused share, lowered
+    when the pipeline as a whole is full or memory headroom would not cover that
+    many more calls; a client keeps at most in_flight + credits requests outstanding.
+    """
+    with clients_lock:
+        clients = len(client_channels) if SERVER_MODE else 1
+    in_flight = len(channel.in_flight)
+    credits = min(max(1, TRANSCRIPTION_MAX_IN_FLIGHT // max(1, clients)) - in_flight,
+                  TRANSCRIPTION_MAX_IN_FLIGHT - len(request_controls))
+    available_mb = memory_available_mb()
+    if available_mb is not None:
+        credits = min(credits, int((available_mb - TRANSCRIPTION_MEMORY_RESERVE_MB) // TRANSCRIPTION_CALL_MEMORY_MB))
+    return {"credits": max(0, credits), "in_flight": in_flight}
+
+def finish_request(request_id):
+    """Forget a request that has been answered and tell its client how much it may send now"""
+    channel = response_routes.pop(request_id, stdout_channel)
+    request_controls.pop(request_id, None)
+    channel.in_flight.discard(request_id)
+    channel.send(credit_message(channel))
+
+def decode_worker_loop(request_queue, ready_queue):
+    """Decode stage: prepare upcoming calls while the inference workers run the model"""
+    global decode_workers_running
+    while True:
+        command = request_queue.get()
+        if command is None:
+            break
+
+        request_id = command.get('id')
         # Log that we're starting to process this request
         logger.info(f"Processing transcription request ID: {request_id}")
+        if command.get('command') not in ('transcribe', 'analyze'):
+            ready_queue.put(command)  # Unknown commands are answered by the inference workers
+            continue
 
-        # Determine input type: path or base64 data
-        audio_input = None
-        input_type = None
-        error_detail = None
-
-        if command.get('command') == 'transcribe':
-            if 'path' in command:
-                audio_file_path = command['path']
-                if not os.path.isfile(audio_file_path):
-                    error_detail = f"Audio file does not exist: {audio_file_path}"
-                else:
-                    audio_input = audio_file_path
-                    input_type = 'path'
-            elif 'audio_data_base64' in command:
-                try:
-                    base64_data = command['audio_data_base64']
-                    audio_bytes = base64.b64decode(base64_data)
-                    if not audio_bytes:
-                        error_detail = "Decoded audio data is empty."
-                    else:
-                        # Load audio from bytes using pydub
-                        audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
-                        # Convert to mono and set frame rate for Whisper (16kHz)
-                        audio_segment = audio_segment.set_frame_rate(16000).set_channels(1)
-                        # Convert to numpy array of floats
-                        samples = np.array(audio_segment.get_array_of_samples()).astype(np.float32) / 32768.0
-                        audio_input = samples
-                        input_type = 'buffer'
-                except base64.binascii.Error:
-                    error_detail = "Invalid Base64 data received."
-                except Exception as e:
-                    error_detail = f"Error processing audio buffer: {str(e)}"
-            else:
-                error_detail = "Invalid command format: missing 'path' or 'audio_data_base64'."
-        elif command.get('command') == 'detect_tones':
-            # Handle tone detection command
-            if not TONE_DETECTION_AVAILABLE or not tone_detector:
-                error_detail = "Tone detection is not available. Please install icad-tone-detection."
-            elif 'path' in command:
-                audio_file_path = command['path']
-                if not os.path.isfile(audio_file_path):
-                    error_detail = f"Audio file does not exist: {audio_file_path}"
-                else:
-                    # Process tone detection immediately and return result
-                    logger.info(f"Processing tone detection request ID: {request_id} for file: {audio_file_path}")
-                    try:
-                        detection_result = tone_detector.detect_tones_in_file(audio_file_path)
-                        detected_tones = tone_detector.get_detected_tones(detection_result)
-                        
-                        response = {
-                            "id": request_id,
-                            "has_two_tone": detection_result.get('has_two_tone', False),
-                            "detected_tones": detected_tones,
-                            "file_path": audio_file_path
-                        }
-                        
-                        if 'error' in detection_result:
-                            response['error'] = detection_result['error']
-                        
-                        logger.info(f"Tone detection completed for ID {request_id}: {response['has_two_tone']}")
-                        print(json.dumps(response))
-                        sys.stdout.flush()
-                        continue  # Skip the transcription processing section
-                        
-                    except Exception as e:
-                        error_detail = f"Error during tone detection: {str(e)}"
+        # A request cancelled or overdue while queued is answered without being decoded
+        job = None if skip_if_aborted(request_id) else run_safely([request_id], prepare_transcription, command)
+        if job is None:
+            finish_request(request_id)
+        else:
+            # Blocks while TRANSCRIPTION_PREFETCH decoded calls are already waiting, bounding memory
+            job.control.leave_stage()
+            ready_queue.put(job)
+
+    # The last decode worker to stop tells the inference workers to stop
+    with decode_workers_lock:
+        decode_workers_running -= 1
+        if decode_workers_running == 0:
+            for _ in range(TRANSCRIPTION_WORKERS):
+                ready_queue.put(None)
+
+def worker_loop(ready_queue):
+    """Inference stage: run the model over decoded calls until shutdown"""
+    while True:
+        item = ready_queue.get()
+        if item is None:
+            break
+
+        if isinstance(item, TranscriptionJob):
+            if TRANSCRIPTION_BATCH_SIZE > 1:
+                batch, deferred = collect_batch(item, ready_queue)
+                send_started([job.request_id for job in batch])
+                run_safely([job.request_id for job in batch], process_batch, batch)
+                for other_command in deferred:
+                    send_started([other_command.get('id')])
+                    run_safely([other_command.get('id')], process_command, other_command)
+                finished = [job.request_id for job in batch] + [other.get('id') for other in deferred]
             else:
-                error_detail = "Tone detection requires 'path' parameter."
+                send_started([item.request_id])
+                run_safely([item.request_id], process_job, item)
+                finished = [item.request_id]
         else:
-             error_detail = f"Invalid command: {command.get('command')}"
+            send_started([item.get('id')])
+            run_safely([item.get('id')], process_command, item)
+            finished = [item.get('id')]
 
-        if error_detail:
-            error_response = {"id": request_id, "error": error_detail}
-            print(json.dumps(error_response))
-            sys.stdout.flush()
-            continue
+        for request_id in finished:
+            finish_request(request_id)
 
-        # --- Start Transcription ---
-        logger.info(f"Starting transcription for ID: {request_id} (type: {input_type})")
+    # The last inference worker to stop tells the tone workers to stop; by then every
+    # 'analyze' request has been decoded and its tone work queued
+    global inference_workers_running
+    with inference_workers_lock:
+        inference_workers_running -= 1
+        if inference_workers_running == 0:
+            for _ in range(TONE_DETECTION_WORKERS):
+                tone_queue.put(None)
+
+def tone_worker_loop(tone_queue):
+    """Tone stage: 'detect_tones' commands and the tone half of 'analyze' requests, beside the transcription pipeline"""
+    while True:
+        item = tone_queue.get()
+        if item is None:
+            break
+        if isinstance(item, tuple):
+            run_tone_analysis(*item)  # Answered with its transcription
+            continue
+        send_started([item.get('id')])
+        run_safely([item.get('id')], process_command, item)
+        finish_request(item.get('id'))
 
-        # File integrity check ONLY if input is a path
-        if input_type == 'path':
+def run_safely(request_ids, handler, *args):
+    """Run a request handler, reporting unexpected errors instead of killing the worker"""
+    try:
+        return handler(*args)
+    except Exception as e:
+        # Catch broader exceptions so one bad request never kills the worker
+        logger.error(f"Unexpected error in worker: {str(e)}", exc_info=True)
+        for request_id in request_ids:
             try:
-                import subprocess
-                # First check if file exists and is readable
-                if not os.path.isfile(audio_input):
-                    error_response = {"id": request_id, "error": f"Audio file not found: {audio_input}"}
-                    print(json.dumps(error_response))
-                    sys.stdout.flush()
-                    continue
-                    
-                # Check file size (basic validation)
-                file_size = os.path.getsize(audio_input)
-                if file_size < 1000:  # Less than 1KB
-                    error_response = {"id": request_id, "error": f"Audio file too small: {file_size} bytes"}
-                    print(json.dumps(error_response))
-                    sys.stdout.flush()
-                    continue
-                elif file_size > 100 * 1024 * 1024:  # More than 100MB
-                    error_response = {"id": request_id, "error": f"Audio file too large: {file_size} bytes"}
-                    print(json.dumps(error_response))
-                    sys.stdout.flush()
-                    continue
-                
-                # Quick ffprobe check for file integrity
-                result = subprocess.run(
-                    ['ffprobe', '-v', 'quiet', '-show_format', audio_input],
-                    stderr=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    text=True,
-                    timeout=15  # Increased timeout
-                )
-                if result.returncode != 0:
-                    error_response = {"id": request_id, "error": f"Corrupt audio file (ffprobe check): {audio_input}"}
-                    print(json.dumps(error_response))
-                    sys.stdout.flush()
-                    continue
-            except subprocess.TimeoutExpired:
-                logger.warning(f"FFprobe timeout for file: {audio_input}")
-                error_response = {"id": request_id, "error": f"File validation timeout: {audio_input}"}
-                print(json.dumps(error_response))
-                sys.stdout.flush()
-                continue
-            except Exception as probe_err:
-                logger.warning(f"FFprobe check failed for {audio_input}: {str(probe_err)}")
-                # Continue with transcription attempt anyway
-
-        # Transcribe the audio (from path or buffer) with English as the specified language
-        try:
-            # Add memory cleanup before transcription for large buffers
-            if input_type == 'buffer':
-                import gc
-                gc.collect()  # Force garbage collection before processing large audio
-            
-            # Prepare transcription parameters
-            transcription_params = {
-                'audio': audio_input,  # Can be path string or numpy array
-                'language': 'en',
-                'beam_size': 3,  # Reduced from 5 to 3 for faster processing
-                'vad_filter': True,
-                'vad_parameters': {"min_silence_duration_ms": 750},  # Increased threshold for busy systems
-                'word_timestamps': False,  # Disable word timestamps for speed
-                'condition_on_previous_text': False  # Disable for better performance
-            }
-            
-            # Add prompt if available (helps with scanner audio context)
-            if OPENAI_TRANSCRIPTION_PROMPT:
-                transcription_params['initial_prompt'] = OPENAI_TRANSCRIPTION_PROMPT
-                logger.info(f"Using custom transcription prompt for ID {request_id}")
-                
-            # Try with VAD filtering first - optimized for high-volume systems
-            segments, info = model.transcribe(**transcription_params)
-
-            segments_text = [segment.text for segment in segments]
-            transcription = " ".join(segments_text).strip()
-
-            # If transcription is empty after VAD filtering, try without VAD
-            if not transcription:
-                logger.info(f"Retrying transcription for ID {request_id} without VAD filter.")
-                
-                # Retry without VAD but keep other parameters including prompt
-                retry_params = transcription_params.copy()
-                retry_params['vad_filter'] = False
-                
-                segments, info = model.transcribe(**retry_params)
-                segments_text = [segment.text for segment in segments]
-                transcription = " ".join(segments_text).strip()
-
-            logger.info(f"Transcription successful for ID: {request_id} (length: {len(transcription)} chars)")
-            success_response = {"id": request_id, "transcription": transcription}
-            print(json.dumps(success_response))
-            sys.stdout.flush()
-            
-            # Clean up memory for buffer-based transcriptions
-            if input_type == 'buffer':
-                del audio_input  # Free the numpy array
-                gc.collect()
+                send_error(request_id, f"Unexpected server error: {str(e)}")
+            except Exception:
+                pass  # Ignore errors trying to report errors
+        return None
 
-        except Exception as e:
-            error_str = str(e)
-            # Detect specific FFmpeg/audio processing errors
-            if "[Errno 1094995529]" in error_str or "Invalid data found" in error_str or "corrupt" in error_str.lower():
-                 error_response = {"id": request_id, "error": f"Corrupt audio data for ID {request_id}."}
-            elif "out of memory" in error_str.lower() or "memory" in error_str.lower():
-                 error_response = {"id": request_id, "error": f"Out of memory during transcription for ID {request_id}."}
-            else:
-                 error_response = {"id": request_id, "error": f"Error during transcription for ID {request_id}: {error_str}"}
-            logger.error(f"Transcription failed for ID {request_id}: {error_response['error']}")
-            print(json.dumps(error_response))
-            sys.stdout.flush()
-            
-            # Clean up memory on error for buffer-based transcriptions
-            if input_type == 'buffer' and 'audio_input' in locals():
-                try:
-                    del audio_input
-                    import gc
-                    gc.collect()
-                except:
-                    pass
-            # --- End Transcription ---
-
-    except json.JSONDecodeError as json_err:
-        logger.error(f"Failed to decode JSON command: {line} - Error: {json_err}")
-        continue # Skip this invalid command
+# Whisper hallucinates freely on tones; the text is discarded, only the code paths matter
+WARMUP_SECONDS = 3
+
+def warm_up_models():
+    """
+    Run a short synthetic call through VAD and every loaded model before signalling ready
+
+    Otherwise the first real call pays for CTranslate2's lazy initialisation,
+    allocator growth and the Silero VAD model load.
+    """
+    t = np.arange(WARMUP_SECONDS * SAMPLE_RATE) / SAMPLE_RATE
+    # Voice-band harmonics with a syllable-rate envelope so VAD and the decoder both do real work
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    audio = (0.2 * envelope * sum(np.sin(2 * np.pi * f * t) for f in (220, 440, 880, 1320))).astype(np.float32)
+
+    get_speech_timestamps(audio, VAD_OPTIONS['full'])
+    params = build_transcription_params(TRANSCRIPTION_PARAMS['beam_size'])
+    for whisper_model in ([model, draft_model] if draft_model else [model]):
+        transcribe_segments(audio, params, whisper_model)
+    if TRANSCRIPTION_BATCH_SIZE > 1:
+        jobs = [TranscriptionJob({'id': 'warmup'}) for _ in range(2)]
+        for job in jobs:
+            job.audio = audio
+            job.speech_chunks = [{'start': 0, 'end': len(audio)}]
+        transcribe_batch(jobs, TRANSCRIPTION_PARAMS['beam_size'], first_pass_model)
+
+if TRANSCRIPTION_WARMUP:
+    try:
+        warm_up_models()
     except Exception as e:
-        # Catch broader exceptions in the loop to prevent crashing
-        logger.error(f"Unexpected error in main loop: {str(e)}", exc_info=True)
-        # Optionally send an error back if we can identify the ID
-        if 'request_id' in locals() and request_id:
-             error_response = {"id": request_id, "error": f"Unexpected server error: {str(e)}"}
-             try:
-                 print(json.dumps(error_response))
-                 sys.stdout.flush()
-             except Exception:
-                 pass # Ignore errors trying to report errors
-        continue
\ No newline at end of file
+        logger.warning(f"Model warm-up failed, first call may be slow: {e}")
+    stage_start = record_startup_stage('warmup', stage_start)
+startup_timings['total_ms'] = round((time.perf_counter() - STARTUP_BEGIN) * 1000, 1)
+logger.info("Startup profile: " + ", ".join(f"{name[:-3]} {ms:.0f}ms" for name, ms in startup_timings.items()))
+
+def queue_depths():
+    """Items waiting in front of each pipeline stage - the deeper queue marks the bottleneck"""
+    return {
+        'decode': request_queue.qsize(),
+        'inference': ready_queue.qsize(),
+        'inference_capacity': TRANSCRIPTION_PREFETCH,
+        'tone': tone_queue.qsize()
+    }
+
+def scheduling_key(item):
+    """Scheduler key of a queued command or decoded job; decoded jobs use their measured length"""
+    if isinstance(item, TranscriptionJob):
+        audio_seconds = len(item.audio) / SAMPLE_RATE if item.audio is not None else None
+        return item.control.scheduling_key(audio_seconds)
+    control = request_controls.get(item.get('id')) or RequestControl()
+    return control.scheduling_key()
+
+def tone_scheduling_key(item):
+    """Tone queue key: the tone half of an 'analyze' request goes first, its transcription is waiting on it"""
+    return (0,) if isinstance(item, tuple) else (1,)
+
+# Start the pipeline: command readers -> decode workers -> bounded queue of decoded calls
+# -> inference workers. faster-whisper releases the GIL inside CTranslate2, and ffmpeg
+# decodes in its own process, so decoding the next calls overlaps running the model.
+# Both queues hand out the most urgent call first rather than the oldest.
+request_queue = SchedulingQueue(scheduling_key)
+ready_queue = SchedulingQueue(scheduling_key, maxsize=TRANSCRIPTION_PREFETCH)
+decode_workers_running = TRANSCRIPTION_DECODE_WORKERS
+decode_workers_lock = threading.Lock()
+decode_threads = [
+    threading.Thread(target=decode_worker_loop, args=(request_queue, ready_queue), name=f"decode-worker-{i + 1}", daemon=True)
+    for i in range(TRANSCRIPTION_DECODE_WORKERS)
+]
+inference_workers_running = TRANSCRIPTION_WORKERS
+inference_workers_lock = threading.Lock()
+worker_threads = [
+    threading.Thread(target=worker_loop, args=(ready_queue,), name=f"transcribe-worker-{i + 1}", daemon=True)
+    for i in range(TRANSCRIPTION_WORKERS)
+]
+# Tone detection has its own queue and threads: a tone check never waits behind transcriptions, and
+# the native engine is NumPy work that releases the GIL in its FFTs. 'analyze' tone work is served
+# before queued 'detect_tones' commands, since a decoded transcription is held until it finishes
+tone_queue = SchedulingQueue(tone_scheduling_key)
+tone_threads = [
+    threading.Thread(target=tone_worker_loop, args=(tone_queue,), name=f"tone-worker-{i + 1}", daemon=True)
+    for i in range(TONE_DETECTION_WORKERS)
+]
+for pipeline_thread in decode_threads + worker_threads + tone_threads:
+    pipeline_thread.start()
+logger.info(f"Started {TRANSCRIPTION_DECODE_WORKERS} decode worker(s), {TRANSCRIPTION_WORKERS} transcription worker(s) "
+            f"and {TONE_DETECTION_WORKERS} tone detection worker(s)")
+if draft_model:
+    threading.Thread(target=refine_worker_loop, args=(refine_queue,), name="refine-worker", daemon=True).start()
+
+if SERVER_MODE:
+    # Long-lived shared worker: clients come and go, stdin is not used
+    try:
+        server_socket = open_server_socket()
+    except OSError as e:
+        print(f"FATAL: Could not open transcription server socket: {e}", file=sys.stderr)
+        sys.exit(1)
+    threading.Thread(target=accept_clients, args=(server_socket, request_queue), name="socket-acceptor", daemon=True).start()
+else:
+    threading.Thread(target=read_stdin_commands, args=(request_queue,), name="stdin-reader", daemon=True).start()
+
+# Signal that the model is loaded and ready
+send_response({"ready": True, "startup": startup_timings, **credit_message(stdout_channel)})
+last_heartbeat = time.time()
+
+# Main thread only keeps the heartbeat going until the workers exit
+while any(worker_thread.is_alive() for worker_thread in worker_threads + tone_threads):
+    time.sleep(1)
+    answer_aborted_queued_requests()
+    # Send periodic heartbeat to show process is alive during quiet periods
+    current_time = time.time()
+    if current_time - last_heartbeat > 300:  # 5 minutes
+        heartbeat = {"heartbeat": True, "timestamp": current_time, "cache": transcription_cache.stats()}
+        heartbeat['vad'] = get_vad_stats()
+        heartbeat['queues'] = queue_depths()
+        heartbeat['aborted'] = dict(abort_stats)
+        if TRANSCRIPTION_ADAPTIVE_QUALITY:
+            heartbeat['quality'] = quality_controller.stats()
+        if draft_model:
+            with refine_stats_lock:
+                heartbeat['cascade'] = {**refine_stats, 'backlog': refine_queue.qsize()}
+        if simulcast_index:
+            heartbeat['simulcast'] = simulcast_index.stats()
+        broadcast(heartbeat, with_credits=True)
+        last_heartbeat = current_time
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+transcription_cache.py - Content-addressed cache of transcription results
+Bounded in-memory LRU tier with an optional on-disk SQLite tier
+"""
+
+import hashlib
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(audio: np.ndarray, settings: str) -> str:
+    """
+    Hash decoded PCM together with everything that affects the transcription
+
+    Args:
+        audio: Decoded 16kHz mono float32 samples
+        settings: Model, prompt and decoding parameters as a stable string
+
+    Returns:
+        Hex digest identifying this audio/settings combination
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(settings.encode('utf-8'))
+    digest.update(memoryview(np.ascontiguousarray(audio)).cast('B'))
+    return digest.hexdigest()
+
+class TranscriptionCache:
+    """Two-tier (memory LRU + optional SQLite) cache of transcription text"""
+
+    def __init__(self, max_entries: int = 1000, db_path: Optional[str] = None):
+        """Initialize the cache; max_entries bounds the memory tier, db_path enables the disk tier"""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS transcriptions ('
+                    'key TEXT PRIMARY KEY, transcription TEXT NOT NULL, created_at REAL NOT NULL)'
+                )
+                self._db.commit()
+                logger.info(f"Transcription cache disk tier: {db_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open transcription cache database {db_path}: {e}")
+                self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    def _remember(self, key: str, transcription: str) -> None:
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._memory_bytes -= sys.getsizeof(key) + sys.getsizeof(self._entries.pop(key))
+        self._entries[key] = transcription
+        self._memory_bytes += sys.getsizeof(key) + sys.getsizeof(transcription)
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= sys.getsizeof(evicted_key) + sys.getsizeof(evicted)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached transcription for a key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute('SELECT transcription FROM transcriptions WHERE key = ?', (key,)).fetchone()
+                if row:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, transcription: str) -> None:
+        """Store a transcription in both tiers"""
+        with self._lock:
+            self._remember(key, transcription)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO transcriptions (key, transcription, created_at) VALUES (?, ?, ?)',
+                        (key, transcription, time.time())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write transcription cache entry: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and memory use, for the heartbeat"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_bytes': self._memory_bytes + sys.getsizeof(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'disk_tier': self._db is not None
+            }